@@ -0,0 +1,153 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from disk_cache import DiskCache, DEFAULT_CACHE_DIR, hash_key
+
+DEFAULT_ANALYSIS_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "analysis")
+
+# Part of every key: bump whenever audio_analyzer.extract_features changes its output
+ANALYZER_VERSION = 2
+
+def content_hash(path: str, block_size: int = 1 << 20) -> str:
+    """BLAKE2b digest of a file's bytes, read in blocks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class AnalysisCache(DiskCache):
+    """
+    Local feature store for per-file analysis results.
+
+    Features are keyed by (content hash, duration_limit, ANALYZER_VERSION), so
+    a renamed or copied file still hits and an analyzer change never serves
+    stale features. Hashing is skipped on the fast path: a small index maps
+    (path, size, mtime) to the file's content hash, and is refreshed by
+    re-hashing whenever the file changes (or on every lookup with verify=True).
+
+    Entries are written atomically, so worker processes can share one cache
+    directory; eviction (LRU by last use, plus a size cap) runs every
+    evict_every writes.
+    """
+
+    def __init__(self, directory: str = DEFAULT_ANALYSIS_CACHE_DIR, max_entries: int = 100000,
+                 max_bytes: int = 200 * 1024 * 1024, max_age_seconds: float = None, verify: bool = False,
+                 evict_every: int = 64):
+        """
+        Args:
+            directory: Cache directory; the path index lives next to it in <directory>_index.
+            max_entries: Maximum number of feature entries (and index entries).
+            max_bytes: Size cap of the feature entries.
+            max_age_seconds: Drop entries not used for this many seconds.
+            verify: Always hash the file instead of trusting (path, size, mtime).
+            evict_every: Apply the limits on every Nth write.
+        """
+        super().__init__(directory, max_entries=max_entries, max_bytes=max_bytes, max_age_seconds=max_age_seconds,
+                         evict_every=evict_every)
+        self.verify = verify
+        self.index = DiskCache(f"{directory.rstrip(os.sep)}_index", max_entries=max_entries,
+                               max_age_seconds=max_age_seconds, evict_every=evict_every)
+
+    @staticmethod
+    def _stat_key(path: str) -> str:
+        stat = os.stat(path)
+        return hash_key("analysis-path", os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def key_for(digest: str, duration_limit: float) -> str:
+        limit = None if duration_limit is None else float(duration_limit)
+        return hash_key("analysis", digest, limit, ANALYZER_VERSION)
+
+    def content_key(self, path: str, hash_on_miss: bool = True) -> str:
+        """
+        Returns the file's content hash, via the path index when possible.
+
+        Returns None when the index misses and hash_on_miss is False.
+        """
+        stat_key = self._stat_key(path)
+        if not self.verify:
+            entry = self.index.get(stat_key)
+            if entry is not None:
+                return entry["content_hash"]
+        if not hash_on_miss:
+            return None
+        digest = content_hash(path)
+        self.index.put(stat_key, {"content_hash": digest})
+        return digest
+
+    def lookup(self, path: str, duration_limit: float = 30.0, hash_on_miss: bool = True):
+        """
+        Returns the cached features for a file, or None.
+
+        Args:
+            hash_on_miss: Hash the file when the path index misses; with False
+                only the cheap (path, size, mtime) fast path is tried.
+        """
+        try:
+            digest = self.content_key(path, hash_on_miss)
+        except OSError:
+            return None
+        if digest is None:
+            return None
+        return self.get(self.key_for(digest, duration_limit))
+
+    def store(self, path: str, duration_limit: float, features: dict) -> None:
+        self.put(self.key_for(self.content_key(path), duration_limit), features)
+
+def _analyze_file(path: str, duration_limit: float, cache: AnalysisCache = None) -> tuple:
+    if cache is not None:
+        hit = cache.lookup(path, duration_limit)
+        if hit is not None:
+            return hit, True
+
+    from audio_analyzer import analyze_audio
+    features = analyze_audio(path, duration_limit)
+    if cache is not None and "error" not in features:
+        cache.store(path, duration_limit, features)
+    return features, False
+
+def analyze_files(paths: list, cache: AnalysisCache = None, workers: int = None, duration_limit: float = 30.0) -> dict:
+    """
+    Analyzes many files in parallel, skipping those already in the cache.
+
+    The parent only tries the cheap path index; files it misses go to the
+    workers, which hash them, check the feature store and analyze and store
+    on a real miss. Failed analyses (an 'error' key) are never cached.
+
+    Args:
+        paths: Audio file paths.
+        cache: Optional AnalysisCache.
+        workers: Number of worker processes (default: CPU count).
+        duration_limit: Seconds analyzed per file.
+
+    Returns:
+        dict: path -> features dict.
+    """
+    results = {}
+    misses = {}
+    for path in dict.fromkeys(paths):
+        hit = None
+        if cache is not None:
+            counted = cache.misses
+            hit = cache.lookup(path, duration_limit, hash_on_miss=False)
+            counted = cache.misses > counted
+        if hit is not None:
+            results[path] = hit
+        else:
+            misses[path] = cache is not None and counted
+
+    if misses:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {path: pool.submit(_analyze_file, path, duration_limit, cache) for path in misses}
+            for path, future in futures.items():
+                try:
+                    results[path], cached = future.result()
+                except Exception as e:
+                    results[path], cached = {"error": str(e)}, False
+                # Fold the workers' outcomes into this process's hit/miss counters
+                if cache is not None and cached:
+                    cache.count(hits=1, misses=-misses[path])
+                elif cache is not None and not misses[path]:
+                    cache.count(misses=1)
+    return results
@@ -1,72 +1,206 @@
 import librosa
 import numpy as np
 import os
+from audio_buffer import AudioBuffer
+from instrumentation import span
 
-def analyze_audio(file_path: str, duration_limit: float = 30.0) -> dict:
+# Framing shared by every feature (librosa defaults)
+N_FFT = 2048
+HOP_LENGTH = 512
+
+def _framed_rms_zcr(y: np.ndarray) -> tuple:
+    """
+    Computes per-frame RMS and zero crossing rate on the STFT frame grid.
+
+    Both use centred frames of N_FFT samples every HOP_LENGTH samples and are
+    evaluated with running sums instead of materialising the framed signal.
+    Padding matches librosa: zeros for RMS, edge values for ZCR (which never
+    add crossings, so the padded region contributes nothing).
+    """
+    pad = N_FFT // 2
+    n_frames = 1 + len(y) // HOP_LENGTH
+    starts = np.arange(n_frames) * HOP_LENGTH
+
+    # RMS: sum of squares over each frame of the zero-padded signal
+    energy = np.zeros(len(y) + 2 * pad + 1)
+    np.cumsum(np.square(y, dtype=np.float64), out=energy[pad + 1:pad + 1 + len(y)])
+    energy[pad + 1 + len(y):] = energy[pad + len(y)]
+    rms = np.sqrt(np.maximum(energy[starts + N_FFT] - energy[starts], 0.0) / N_FFT)
+
+    # ZCR: librosa ignores the crossing into the first sample of each frame
+    crossings = np.zeros(len(y) + 2 * pad + 1)
+    np.cumsum(librosa.zero_crossings(y, pad=False), dtype=np.float64, out=crossings[pad + 1:pad + 1 + len(y)])
+    crossings[pad + 1 + len(y):] = crossings[pad + len(y)]
+    zcr = (crossings[starts + N_FFT] - crossings[starts + 1]) / N_FFT
+
+    return rms, zcr
+
+def loudest_window(y: np.ndarray, sr: int, seconds: float) -> float:
+    """
+    Finds the start time of the loudest `seconds`-long window by frame RMS.
+
+    Args:
+        y: Mono audio signal.
+        sr: Sample rate of y.
+        seconds: Window length.
+
+    Returns:
+        float: Start of the window in seconds (0.0 if y is shorter than the window).
+    """
+    window_frames = max(1, int(seconds * sr / HOP_LENGTH))
+    if len(y) <= seconds * sr:
+        return 0.0
+    rms, _ = _framed_rms_zcr(y)
+    energy = np.concatenate([[0.0], np.cumsum(rms ** 2)])
+    window_energy = energy[window_frames:] - energy[:-window_frames]
+    start = int(np.argmax(window_energy)) * HOP_LENGTH / sr
+    return min(start, len(y) / sr - seconds)
+
+def extract_features(y: np.ndarray, sr: int) -> dict:
+    """
+    Computes the analysis feature dict for a mono signal in a single pass.
+
+    One magnitude STFT feeds the centroid, bandwidth and the mel onset
+    envelope used for tempo; RMS and ZCR use the same frame grid.
+
+    Args:
+        y: Mono audio signal.
+        sr: Sample rate of y.
+
+    Returns:
+        dict: A dictionary containing extracted audio features.
+    """
+    # 1. Basic Info
+    duration = librosa.get_duration(y=y, sr=sr)
+
+    # One magnitude STFT shared by every spectral feature
+    S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+
+    # 2. Loudness (RMS) and 4. Zero Crossing Rate from the same framing
+    # High ZCR often indicates noise or unvoiced speech
+    rms, zcr = _framed_rms_zcr(y)
+    avg_rms = float(np.mean(rms))
+    avg_zcr = float(np.mean(zcr))
+
+    # 3. Brightness (Spectral Centroid)
+    # High centroid = brighter/sharper sound (e.g., speech sibilance, cymbals)
+    # Low centroid = darker/muffled sound (e.g., bass, hum)
+    cent = librosa.feature.spectral_centroid(S=S, sr=sr)
+    avg_centroid = float(np.mean(cent))
+
+    # 5. Tempo (BPM) from the mel onset envelope of the same STFT
+    mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr)
+    onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr)
+    # librosa 0.10+ returns a scalar for tempo
+    tempo = librosa.feature.tempo(onset_envelope=onset_env, sr=sr)
+    if isinstance(tempo, np.ndarray):
+        tempo = tempo[0]
+    tempo = float(tempo)
+
+    # 6. Spectral Bandwidth (reuses the centroid)
+    spec_bw = librosa.feature.spectral_bandwidth(S=S, sr=sr, centroid=cent)
+    avg_bw = float(np.mean(spec_bw))
+
+    return feature_summary(duration, sr, tempo, avg_rms, avg_centroid, avg_zcr, avg_bw)
+
+def feature_summary(duration: float, sr: int, tempo: float, avg_rms: float, avg_centroid: float, avg_zcr: float,
+                    avg_bw: float) -> dict:
+    """Builds the analysis feature dict from the averaged features."""
+    # Basic Classification Heuristic (Very rough)
+    # Music often has stable rhythm and harmonic content. Speech has high variability.
+    content_hint = "Unknown"
+    if avg_zcr > 0.1:
+        content_hint = "High Noise/Unvoiced Speech"
+    elif avg_centroid < 1000:
+        content_hint = "Low Frequency/Dark"
+    else:
+        content_hint = "Balanced/Tonal"
+
+    return {
+        "duration_seconds": round(duration, 2),
+        "sample_rate": sr,
+        "tempo_bpm": round(tempo, 1),
+        "avg_loudness_rms": round(avg_rms, 4),
+        "spectral_centroid_brightness": round(avg_centroid, 1),
+        "zero_crossing_rate": round(avg_zcr, 4),
+        "spectral_bandwidth": round(avg_bw, 1),
+        "content_descriptor": content_hint
+    }
+
+def analyze_buffer(buffer: AudioBuffer, duration_limit: float = 30.0, cache=None) -> dict:
+    """
+    Analyzes an already-decoded AudioBuffer and returns a dictionary of features.
+
+    Args:
+        buffer: Decoded audio (down-mixed to mono for analysis).
+        duration_limit: Limit analysis to the first N seconds to speed up processing
+            (None analyzes the whole buffer window by window).
+        cache: Optional AnalysisCache, used when the buffer was decoded from a file.
+
+    Returns:
+        dict: A dictionary containing extracted audio features.
+    """
+    if cache is not None and buffer.path:
+        cached = cache.lookup(buffer.path, duration_limit)
+        if cached is not None:
+            return cached
+
+    try:
+        with span("analysis"):
+            if duration_limit is None:
+                from feature_timeline import timeline_from_buffer
+                features = timeline_from_buffer(buffer).summary()
+            else:
+                features = extract_features(buffer.mono(duration_limit), buffer.sample_rate)
+    except Exception as e:
+        print(f"Warning: Audio analysis failed: {e}")
+        return {"error": str(e)}
+
+    if cache is not None and buffer.path:
+        try:
+            cache.store(buffer.path, duration_limit, features)
+        except OSError as e:
+            print(f"Warning: Could not cache analysis: {e}")
+    return features
+
+def analyze_audio(file_path: str, duration_limit: float = 30.0, cache=None) -> dict:
     """
     Analyzes an audio file and returns a dictionary of features.
-    
+
     Args:
         file_path: Path to the audio file.
-        duration_limit: Limit analysis to the first N seconds to speed up processing.
-        
+        duration_limit: Limit analysis to the first N seconds to speed up processing
+            (None streams the whole file through the timeline analyzer).
+        cache: Optional AnalysisCache; a hit skips decoding and analysis entirely.
+
     Returns:
         dict: A dictionary containing extracted audio features.
     """
+    if cache is not None:
+        cached = cache.lookup(file_path, duration_limit)
+        if cached is not None:
+            return cached
+
+    if duration_limit is None:
+        from feature_timeline import analyze_timeline
+        try:
+            with span("analysis"):
+                features = analyze_timeline(file_path).summary()
+        except Exception as e:
+            print(f"Warning: Audio analysis failed: {e}")
+            return {"error": str(e)}
+        if cache is not None:
+            try:
+                cache.store(file_path, duration_limit, features)
+            except OSError as e:
+                print(f"Warning: Could not cache analysis: {e}")
+        return features
+
     try:
         # Load audio (load only the first few seconds for speed)
-        y, sr = librosa.load(file_path, sr=None, duration=duration_limit)
-        
-        # 1. Basic Info
-        duration = librosa.get_duration(y=y, sr=sr)
-        
-        # 2. Loudness (RMS)
-        rms = librosa.feature.rms(y=y)
-        avg_rms = float(np.mean(rms))
-        
-        # 3. Brightness (Spectral Centroid)
-        # High centroid = brighter/sharper sound (e.g., speech sibilance, cymbals)
-        # Low centroid = darker/muffled sound (e.g., bass, hum)
-        cent = librosa.feature.spectral_centroid(y=y, sr=sr)
-        avg_centroid = float(np.mean(cent))
-        
-        # 4. Zero Crossing Rate (Noise/Percussiveness vs Tonal)
-        # High ZCR often indicates noise or unvoiced speech
-        zcr = librosa.feature.zero_crossing_rate(y)
-        avg_zcr = float(np.mean(zcr))
-        
-        # 5. Tempo (BPM)
-        # librosa 0.10+ returns a scalar for tempo
-        tempo = librosa.feature.tempo(y=y, sr=sr)
-        if isinstance(tempo, np.ndarray):
-            tempo = tempo[0]
-        tempo = float(tempo)
-        
-        # 6. Spectral Bandwidth
-        spec_bw = librosa.feature.spectral_bandwidth(y=y, sr=sr)
-        avg_bw = float(np.mean(spec_bw))
-
-        # Basic Classification Heuristic (Very rough)
-        # Music often has stable rhythm and harmonic content. Speech has high variability.
-        content_hint = "Unknown"
-        if avg_zcr > 0.1:
-            content_hint = "High Noise/Unvoiced Speech"
-        elif avg_centroid < 1000:
-            content_hint = "Low Frequency/Dark"
-        else:
-            content_hint = "Balanced/Tonal"
-
-        return {
-            "duration_seconds": round(duration, 2),
-            "sample_rate": sr,
-            "tempo_bpm": round(tempo, 1),
-            "avg_loudness_rms": round(avg_rms, 4),
-            "spectral_centroid_brightness": round(avg_centroid, 1),
-            "zero_crossing_rate": round(avg_zcr, 4),
-            "spectral_bandwidth": round(avg_bw, 1),
-            "content_descriptor": content_hint
-        }
-        
+        with span("decode"):
+            buffer = AudioBuffer.from_file(file_path, duration=duration_limit)
     except Exception as e:
         print(f"Warning: Audio analysis failed: {e}")
         return {"error": str(e)}
+    return analyze_buffer(buffer, duration_limit, cache=cache)
@@ -0,0 +1,92 @@
+import soundfile as sf
+import numpy as np
+
+class AudioBuffer:
+    """
+    Decoded audio shared between analysis and processing.
+
+    Samples are float32 in soundfile's (frames, channels) layout. The analyzer
+    takes a mono view via mono() and the processor a (channels, frames) view
+    via channels_first(), so one decode serves the whole pipeline.
+    """
+
+    def __init__(self, samples: np.ndarray, sample_rate: int, subtype: str = None, path: str = None):
+        """
+        Args:
+            samples: float32 array shaped (frames, channels).
+            sample_rate: Sample rate in Hz.
+            subtype: Subtype of the source file (e.g. 'PCM_24'), used to pick the output subtype.
+            path: Source path, if any.
+        """
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        self.samples = samples
+        self.sample_rate = int(sample_rate)
+        self.subtype = subtype
+        self.path = path
+
+    @classmethod
+    def from_file(cls, path: str, duration: float = None, mmap: bool = True) -> "AudioBuffer":
+        """
+        Decodes an audio file once.
+
+        Float32 WAV files are memory-mapped instead of read, so pages are only
+        loaded as they are touched and never copied.
+
+        Args:
+            path: Path to the audio file.
+            duration: Only decode the first N seconds.
+            mmap: Allow memory-mapping float32 WAV files.
+        """
+        info = sf.info(path)
+        frames = -1 if duration is None else int(duration * info.samplerate)
+
+        if mmap and info.format == 'WAV' and info.subtype == 'FLOAT':
+            import warnings
+            from scipy.io import wavfile
+            try:
+                # soundfile writes a PEAK chunk in float WAVs, which scipy skips with a warning
+                with warnings.catch_warnings():
+                    warnings.filterwarnings("ignore", message="Chunk .* not understood", category=wavfile.WavFileWarning)
+                    sample_rate, data = wavfile.read(path, mmap=True)
+                if data.dtype == np.float32:
+                    if frames >= 0:
+                        data = data[:frames]
+                    return cls(data, sample_rate, info.subtype, path)
+            except ValueError:
+                # Header variants scipy cannot map fall back to a normal decode
+                pass
+
+        data, sample_rate = sf.read(path, frames=frames, dtype='float32', always_2d=True)
+        return cls(data, sample_rate, info.subtype, path)
+
+    @property
+    def frames(self) -> int:
+        return self.samples.shape[0]
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[1]
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.sample_rate
+
+    def mono(self, duration_limit: float = None) -> np.ndarray:
+        """
+        Returns a mono float32 signal (a view when the source is mono).
+
+        Args:
+            duration_limit: Only return the first N seconds.
+        """
+        samples = self.samples
+        if duration_limit is not None:
+            samples = samples[:int(duration_limit * self.sample_rate)]
+        if self.channels == 1:
+            return samples[:, 0]
+        # Same down-mix as librosa.to_mono
+        return np.mean(samples, axis=1, dtype=np.float32)
+
+    def channels_first(self) -> np.ndarray:
+        """Returns a (channels, frames) view, the layout pedalboard prefers."""
+        return self.samples.T
@@ -1,128 +1,452 @@
 from pedalboard import (
-    Pedalboard, 
-    Reverb, 
-    Compressor, 
-    HighShelfFilter, 
-    LowShelfFilter, 
-    PeakFilter, 
+    Pedalboard,
+    Reverb,
+    Compressor,
+    HighShelfFilter,
+    LowShelfFilter,
+    PeakFilter,
     Gain,
     Delay,
     Chorus,
     Distortion,
     Phaser
 )
+from collections import namedtuple
+from functools import lru_cache
+import os
+import threading
 import soundfile as sf
 import numpy as np
+from audio_buffer import AudioBuffer
+from chain_optimizer import SOSCascade, optimize_stages
+from instrumentation import recorder, span
 
-def apply_pedalboard_effects(input_path: str, output_path: str, effects_config: dict):
+# Frames per block for the streaming render path (~1.5s at 44.1kHz)
+DEFAULT_BLOCK_SIZE = 65536
+
+# Registry of supported effects: plugin class, default params and the param
+# ranges advertised to the LLM in prompt_manager.SYSTEM_INSTRUCTION
+EffectSpec = namedtuple("EffectSpec", ["plugin_class", "defaults", "ranges"])
+
+EFFECT_REGISTRY = {
+    'reverb': EffectSpec(
+        Reverb,
+        {'room_size': 0.5, 'damping': 0.5, 'wet_level': 0.33, 'dry_level': 0.6, 'width': 1.0, 'freeze_mode': 0.0},
+        {'room_size': (0.0, 1.0), 'damping': (0.0, 1.0), 'wet_level': (0.0, 1.0), 'dry_level': (0.0, 1.0),
+         'width': (0.0, 1.0), 'freeze_mode': (0.0, 1.0)}
+    ),
+    'compressor': EffectSpec(
+        Compressor,
+        {'threshold_db': -10.0, 'ratio': 2.0, 'attack_ms': 10.0, 'release_ms': 100.0},
+        {'threshold_db': (-60.0, 0.0), 'ratio': (1.0, 20.0), 'attack_ms': (0.1, 100.0), 'release_ms': (10.0, 1000.0)}
+    ),
+    'high_shelf': EffectSpec(
+        HighShelfFilter,
+        {'cutoff_frequency_hz': 4000.0, 'gain_db': 0.0, 'q': 0.707},
+        {'cutoff_frequency_hz': (20.0, 20000.0), 'gain_db': (-24.0, 24.0), 'q': (0.1, 10.0)}
+    ),
+    'low_shelf': EffectSpec(
+        LowShelfFilter,
+        {'cutoff_frequency_hz': 400.0, 'gain_db': 0.0, 'q': 0.707},
+        {'cutoff_frequency_hz': (20.0, 20000.0), 'gain_db': (-24.0, 24.0), 'q': (0.1, 10.0)}
+    ),
+    'peak': EffectSpec(
+        PeakFilter,
+        {'cutoff_frequency_hz': 1000.0, 'gain_db': 0.0, 'q': 0.707},
+        {'cutoff_frequency_hz': (20.0, 20000.0), 'gain_db': (-24.0, 24.0), 'q': (0.1, 10.0)}
+    ),
+    'delay': EffectSpec(
+        Delay,
+        {'delay_seconds': 0.5, 'feedback': 0.2, 'mix': 0.5},
+        {'delay_seconds': (0.0, 2.0), 'feedback': (0.0, 1.0), 'mix': (0.0, 1.0)}
+    ),
+    'chorus': EffectSpec(
+        Chorus,
+        {'rate_hz': 1.0, 'depth': 0.25, 'centre_delay_ms': 7.0, 'feedback': 0.0, 'mix': 0.5},
+        {'rate_hz': (0.1, 10.0), 'depth': (0.0, 1.0), 'centre_delay_ms': (1.0, 20.0), 'feedback': (0.0, 1.0), 'mix': (0.0, 1.0)}
+    ),
+    'distortion': EffectSpec(
+        Distortion,
+        {'drive_db': 25.0},
+        {'drive_db': (0.0, 50.0)}
+    ),
+    'phaser': EffectSpec(
+        Phaser,
+        {'rate_hz': 1.0, 'depth': 0.5, 'centre_frequency_hz': 1300.0, 'feedback': 0.0, 'mix': 0.5},
+        {'rate_hz': (0.01, 10.0), 'depth': (0.0, 1.0), 'centre_frequency_hz': (100.0, 5000.0), 'feedback': (0.0, 1.0), 'mix': (0.0, 1.0)}
+    ),
+    'gain': EffectSpec(
+        Gain,
+        {'gain_db': 0.0},
+        {'gain_db': (-60.0, 24.0)}
+    ),
+}
+
+# Alternative spellings (including the plugin names used in the system prompt)
+EFFECT_ALIASES = {
+    'peaking': 'peak',
+    'peakfilter': 'peak',
+    'peak_filter': 'peak',
+    'highshelf': 'high_shelf',
+    'highshelffilter': 'high_shelf',
+    'high_shelf_filter': 'high_shelf',
+    'lowshelf': 'low_shelf',
+    'lowshelffilter': 'low_shelf',
+    'low_shelf_filter': 'low_shelf',
+}
+
+# Extensions soundfile cannot map to a major format on its own
+_FORMAT_BY_EXTENSION = {'AIF': 'AIFF', 'OGA': 'OGG', 'OPUS': 'OGG'}
+
+def output_subtype(input_subtype: str, output_path: str) -> str:
     """
-    Applies audio effects using Pedalboard based on the provided configuration.
-    
+    Chooses the output subtype explicitly so it matches the input where possible.
+
+    PCM_16/PCM_24/FLOAT inputs keep their subtype when the output format
+    supports it; otherwise float sources fall back to FLOAT and everything
+    else to the format's default subtype.
+
     Args:
-        input_path: Path to the input audio file.
-        output_path: Path to save the processed audio.
-        effects_config: Dictionary containing 'effect_chain' list of effect definitions.
+        input_subtype: Subtype of the source file (e.g. 'PCM_24'), or None.
+        output_path: Destination path; its extension selects the format.
     """
-    # Load audio
-    audio, sample_rate = sf.read(input_path)
-    
-    # Define the board
-    board = Pedalboard()
-    
-    # Parse effects from config
+    ext = os.path.splitext(output_path)[1][1:].upper()
+    fmt = _FORMAT_BY_EXTENSION.get(ext, ext)
+    if fmt not in sf.available_formats():
+        return None
+    if input_subtype and sf.check_format(fmt, input_subtype):
+        return input_subtype
+    if input_subtype in ('FLOAT', 'DOUBLE') and sf.check_format(fmt, 'FLOAT'):
+        return 'FLOAT'
+    return sf.default_subtype(fmt)
+
+def _chain_items(effects_config: dict) -> list:
     # Expecting effects_config to be like: {'effect_chain': [{'type': 'reverb', 'params': {...}}, ...]}
     # OR for backward compatibility with the simple plan: {'effect': 'reverb', 'parameters': {...}}
-    
-    chain_data = []
     if 'effect_chain' in effects_config:
-        chain_data = effects_config['effect_chain']
+        return effects_config['effect_chain']
     elif 'effect' in effects_config:
         # Single effect mode
-        chain_data = [{'type': effects_config['effect'], 'params': effects_config.get('parameters', {})}]
-        
-    for effect_item in chain_data:
-        effect_type = effect_item.get('type', '').lower()
-        params = effect_item.get('params', {})
-        
-        plugin = None
-        
+        return [{'type': effects_config['effect'], 'params': effects_config.get('parameters', {})}]
+    return []
+
+def validate_chain(effects_config: dict, strict: bool = False) -> tuple:
+    """
+    Normalises an effects configuration against EFFECT_REGISTRY.
+
+    Effect types are lower-cased and de-aliased, params are converted to
+    float, defaulted and clamped to the registry ranges.
+
+    Args:
+        effects_config: Dictionary containing 'effect_chain' list of effect definitions.
+        strict: Raise ValueError on unknown effects or non-numeric params
+            instead of dropping the effect with a warning.
+
+    Returns:
+        tuple: (stages, warnings) where stages is a tuple of
+            (effect_type, ((param, value), ...)) and warnings a tuple of strings.
+    """
+    stages = []
+    warnings = []
+    for effect_item in _chain_items(effects_config):
+        raw_type = str(effect_item.get('type', ''))
+        effect_type = raw_type.lower()
+        effect_type = EFFECT_ALIASES.get(effect_type, effect_type)
+        spec = EFFECT_REGISTRY.get(effect_type)
+        if spec is None:
+            message = f"Unknown effect type '{raw_type}'"
+            if strict:
+                raise ValueError(message)
+            warnings.append(message)
+            continue
+
+        params = dict(spec.defaults)
         try:
-            if effect_type == 'reverb':
-                plugin = Reverb(
-                    room_size=float(params.get('room_size', 0.5)),
-                    damping=float(params.get('damping', 0.5)),
-                    wet_level=float(params.get('wet_level', 0.33)),
-                    dry_level=float(params.get('dry_level', 0.6)),
-                    width=float(params.get('width', 1.0)),
-                    freeze_mode=float(params.get('freeze_mode', 0.0))
-                )
-            elif effect_type == 'compressor':
-                plugin = Compressor(
-                    threshold_db=float(params.get('threshold_db', -10)),
-                    ratio=float(params.get('ratio', 2.0)),
-                    attack_ms=float(params.get('attack_ms', 10)),
-                    release_ms=float(params.get('release_ms', 100))
-                )
-            elif effect_type == 'high_shelf':
-                plugin = HighShelfFilter(
-                    cutoff_frequency_hz=float(params.get('cutoff_frequency_hz', 4000)),
-                    gain_db=float(params.get('gain_db', 0)),
-                    q=float(params.get('q', 0.707))
-                )
-            elif effect_type == 'low_shelf':
-                plugin = LowShelfFilter(
-                    cutoff_frequency_hz=float(params.get('cutoff_frequency_hz', 400)),
-                    gain_db=float(params.get('gain_db', 0)),
-                    q=float(params.get('q', 0.707))
-                )
-            elif effect_type == 'peaking' or effect_type == 'peak':
-                plugin = PeakFilter(
-                    cutoff_frequency_hz=float(params.get('cutoff_frequency_hz', 1000)),
-                    gain_db=float(params.get('gain_db', 0)),
-                    q=float(params.get('q', 0.707))
-                )
-            elif effect_type == 'delay':
-                plugin = Delay(
-                    delay_seconds=float(params.get('delay_seconds', 0.5)),
-                    feedback=float(params.get('feedback', 0.2)),
-                    mix=float(params.get('mix', 0.5))
-                )
-            elif effect_type == 'chorus':
-                 plugin = Chorus(
-                    rate_hz=float(params.get('rate_hz', 1.0)),
-                    depth=float(params.get('depth', 0.25)),
-                    centre_delay_ms=float(params.get('centre_delay_ms', 7.0)),
-                    feedback=float(params.get('feedback', 0.0)),
-                    mix=float(params.get('mix', 0.5))
-                 )
-            elif effect_type == 'distortion':
-                plugin = Distortion(
-                    drive_db=float(params.get('drive_db', 25.0))
-                )
-            elif effect_type == 'phaser':
-                plugin = Phaser(
-                    rate_hz=float(params.get('rate_hz', 1.0)),
-                    depth=float(params.get('depth', 0.5)),
-                    centre_frequency_hz=float(params.get('centre_frequency_hz', 1300.0)),
-                    feedback=float(params.get('feedback', 0.0)),
-                    mix=float(params.get('mix', 0.5))
-                )
-            elif effect_type == 'gain':
-                plugin = Gain(
-                    gain_db=float(params.get('gain_db', 0.0))
-                )
-
-            if plugin:
-                board.append(plugin)
-            else:
-                print(f"Warning: Unknown effect type '{effect_type}'")
-                
-        except Exception as e:
-            print(f"Error creating effect '{effect_type}': {e}")
-
-    # Run the audio through the board
-    processed_audio = board(audio, sample_rate)
-    
-    # Save output
-    sf.write(output_path, processed_audio, sample_rate)
-    return True
+            for key, value in (effect_item.get('params') or {}).items():
+                if key not in spec.ranges:
+                    warnings.append(f"Ignoring unknown param '{key}' for '{effect_type}'")
+                    continue
+                value = float(value)
+                low, high = spec.ranges[key]
+                if not low <= value <= high:
+                    clamped = min(max(value, low), high)
+                    warnings.append(f"Clamped {effect_type}.{key} from {value} to {clamped}")
+                    value = clamped
+                params[key] = value
+        except (TypeError, ValueError) as e:
+            message = f"Error creating effect '{effect_type}': {e}"
+            if strict:
+                raise ValueError(message)
+            warnings.append(message)
+            continue
+
+        stages.append((effect_type, tuple(sorted(params.items()))))
+    return tuple(stages), tuple(warnings)
+
+class CompiledChain:
+    """
+    A validated, immutable effect chain that can render many times.
+
+    Chains compare and hash by their stages, so they can be memoized and used
+    as dict keys. Plugins are allocated once per thread on first use.
+    Like pedalboard's, process(reset=True) clears plugin state *before*
+    processing and leaves the tail of that render behind, so block-wise use
+    (reset=False) must start with reset(); render_file_streaming does so.
+
+    With optimize=True the stages are rendered through the segments chosen
+    by chain_optimizer.optimize_stages (no-ops dropped, EQ runs fused into
+    one biquad cascade); the report is kept in .optimization.
+    """
+
+    def __init__(self, stages: tuple, warnings: tuple = (), optimize: bool = True):
+        self.stages = stages
+        self.warnings = warnings
+        self.segments, self.optimization = optimize_stages(stages) if optimize else (None, None)
+        self._local = threading.local()
+
+    def __eq__(self, other):
+        return isinstance(other, CompiledChain) and self.stages == other.stages
+
+    def __hash__(self):
+        return hash(self.stages)
+
+    def __len__(self):
+        return len(self.stages)
+
+    def __repr__(self):
+        return f"CompiledChain({[effect_type for effect_type, _ in self.stages]})"
+
+    def to_config(self) -> dict:
+        """Returns the normalised chain as an effects_config dict."""
+        return {'effect_chain': [{'type': t, 'params': dict(p)} for t, p in self.stages]}
+
+    def build_board(self) -> Pedalboard:
+        """Returns a new Pedalboard with fresh plugin instances."""
+        with span("chain_build"):
+            return Pedalboard([EFFECT_REGISTRY[t].plugin_class(**dict(p)) for t, p in self.stages])
+
+    @property
+    def board(self) -> Pedalboard:
+        """This thread's Pedalboard instance (created on first use)."""
+        board = getattr(self._local, 'board', None)
+        if board is None:
+            board = self._local.board = self.build_board()
+        return board
+
+    def build_processors(self) -> list:
+        """
+        Returns fresh processors, one Pedalboard or SOSCascade per segment.
+
+        Each takes (channels, frames) audio as processor(audio, sample_rate,
+        reset=...). Unoptimized chains get a single Pedalboard.
+        """
+        if self.segments is None:
+            return [self.build_board()]
+        with span("chain_build"):
+            return [
+                SOSCascade(segment.stages) if segment.kind == 'sos'
+                else Pedalboard([EFFECT_REGISTRY[t].plugin_class(**dict(p)) for t, p in segment.stages])
+                for segment in self.segments
+            ]
+
+    def _processors(self) -> list:
+        """This thread's processors (created on first use)."""
+        processors = getattr(self._local, 'processors', None)
+        if processors is None:
+            processors = self._local.processors = self.build_processors()
+        return processors
+
+    def reset(self):
+        """Clears plugin state (reverb/delay tails, LFO phase)."""
+        if self.segments is None:
+            self.board.reset()
+            return
+        for processor in self._processors():
+            processor.reset()
+
+    def _process_segments(self, audio: np.ndarray, sample_rate: float, reset: bool) -> np.ndarray:
+        # The biquad cascade needs an explicit layout: like pedalboard, trust
+        # the previous call's channel count, else the smaller dimension
+        x = audio[None, :] if audio.ndim == 1 else audio
+        channels = getattr(self._local, 'channels', None)
+        if x.shape[0] == channels:
+            transposed = False
+        elif x.shape[1] == channels:
+            transposed = True
+        else:
+            transposed = x.shape[0] > x.shape[1]
+        if transposed:
+            x = x.T
+        self._local.channels = x.shape[0]
+
+        processors = self._processors()
+        if not processors:
+            # Every stage was a no-op; still return a new float32 array like pedalboard
+            x = x.astype(np.float32)
+        for processor in processors:
+            x = processor(x, sample_rate, reset=reset)
+        if transposed:
+            x = x.T
+        return x[0] if audio.ndim == 1 else x
+
+    def process(self, audio: np.ndarray, sample_rate: float, reset: bool = True) -> np.ndarray:
+        """
+        Runs audio through the chain.
+
+        Args:
+            audio: Samples as (channels, frames), (frames, channels) or mono.
+            sample_rate: Sample rate of audio.
+            reset: Clear plugin state before processing. Pass False to carry
+                tails over from the previous call (streaming; call reset()
+                before the first block).
+        """
+        if self.segments is None:
+            return self.board(audio, sample_rate, reset=reset)
+        return self._process_segments(audio, sample_rate, reset)
+
+    __call__ = process
+
+    def render_buffer(self, buffer: AudioBuffer, output_path: str):
+        """
+        Renders an already-decoded AudioBuffer and writes the result.
+
+        The float32 samples are handed to pedalboard as a (channels, frames)
+        view, so there is no float64 round trip and no intermediate copy
+        before pedalboard's own buffer.
+        """
+        # Run the audio through the board
+        with span("dsp"):
+            processed_audio = self.process(buffer.channels_first(), buffer.sample_rate)
+        recorder.add("audio_seconds", buffer.duration)
+
+        # Save output
+        with span("encode"):
+            sf.write(output_path, processed_audio.T, buffer.sample_rate,
+                     subtype=output_subtype(buffer.subtype, output_path))
+        return True
+
+    def render_file(self, input_path: str, output_path: str):
+        """Renders a whole file in one go."""
+        with span("decode"):
+            buffer = AudioBuffer.from_file(input_path)
+        return self.render_buffer(buffer, output_path)
+
+    def render_file_streaming(self, input_path: str, output_path: str, block_size: int = DEFAULT_BLOCK_SIZE):
+        """
+        Renders a file block by block so memory stays flat regardless of its length.
+
+        Every block, the last one included, is pushed through the board with
+        reset=False, so reverb/delay tails and modulation state carry across
+        block boundaries. (reset=True clears state before processing, so it
+        would cut the carried tail off the final block.) The board is reset
+        after the loop. The output matches render_file to within float
+        tolerance.
+        """
+        # The memoized chain may still hold the tail of a previous render
+        self.reset()
+        with sf.SoundFile(input_path) as infile:
+            sample_rate = infile.samplerate
+            subtype = output_subtype(infile.subtype, output_path)
+            with sf.SoundFile(output_path, 'w', samplerate=sample_rate, channels=infile.channels, subtype=subtype) as outfile:
+                # One reusable read buffer for every block
+                buffer = np.empty((block_size, infile.channels), dtype=np.float32)
+                while True:
+                    with span("decode"):
+                        block = infile.read(block_size, dtype='float32', always_2d=True, out=buffer)
+                    if len(block) == 0:
+                        break
+                    is_last = infile.tell() >= infile.frames
+
+                    # soundfile gives (frames, channels); hand pedalboard an explicit
+                    # (channels, frames) view so short final blocks are never misread
+                    with span("dsp"):
+                        processed = self.process(block.T, sample_rate, reset=False)
+                    recorder.add("audio_seconds", len(block) / sample_rate)
+                    with span("encode"):
+                        outfile.write(processed.T)
+
+                    if is_last:
+                        break
+        self.reset()
+        return True
+
+@lru_cache(maxsize=256)
+def _compiled(stages: tuple, warnings: tuple, optimize: bool) -> CompiledChain:
+    return CompiledChain(stages, warnings, optimize)
+
+def compile_chain(effects_config: dict, strict: bool = False, optimize: bool = True) -> CompiledChain:
+    """
+    Validates an effects configuration and returns a reusable CompiledChain.
+
+    Identical configurations return the same (memoized) object, so its
+    plugins are only allocated once.
+
+    Args:
+        effects_config: Dictionary containing 'effect_chain' list of effect definitions.
+        strict: Raise ValueError instead of dropping invalid effects.
+        optimize: Render through the optimized segments (see chain_optimizer).
+    """
+    with span("chain_build"):
+        return _compiled(*validate_chain(effects_config, strict=strict), optimize)
+
+def build_board(effects_config: dict) -> Pedalboard:
+    """
+    Builds a Pedalboard from the provided effects configuration.
+
+    Args:
+        effects_config: Dictionary containing 'effect_chain' list of effect definitions.
+
+    Returns:
+        Pedalboard: The board with one plugin per recognised effect.
+    """
+    chain = compile_chain(effects_config)
+    for warning in chain.warnings:
+        print(f"Warning: {warning}")
+    return chain.build_board()
+
+def apply_pedalboard_effects(input_path: str, output_path: str, effects_config: dict, optimize: bool = True):
+    """
+    Applies audio effects using Pedalboard based on the provided configuration.
+
+    Args:
+        input_path: Path to the input audio file.
+        output_path: Path to save the processed audio.
+        effects_config: Dictionary containing 'effect_chain' list of effect definitions.
+        optimize: Drop no-op stages and fuse EQ runs before rendering.
+    """
+    chain = compile_chain(effects_config, optimize=optimize)
+    for warning in chain.warnings:
+        print(f"Warning: {warning}")
+    return chain.render_file(input_path, output_path)
+
+def apply_pedalboard_effects_to_buffer(buffer: AudioBuffer, output_path: str, effects_config: dict, optimize: bool = True):
+    """
+    Applies audio effects to an already-decoded AudioBuffer.
+
+    Args:
+        buffer: Decoded input audio (shared with the analyzer).
+        output_path: Path to save the processed audio.
+        effects_config: Dictionary containing 'effect_chain' list of effect definitions.
+        optimize: Drop no-op stages and fuse EQ runs before rendering.
+    """
+    chain = compile_chain(effects_config, optimize=optimize)
+    for warning in chain.warnings:
+        print(f"Warning: {warning}")
+    return chain.render_buffer(buffer, output_path)
+
+def apply_pedalboard_effects_streaming(input_path: str, output_path: str, effects_config: dict, block_size: int = DEFAULT_BLOCK_SIZE,
+                                       optimize: bool = True):
+    """
+    Applies audio effects block by block so memory stays flat regardless of input length.
+
+    Args:
+        input_path: Path to the input audio file.
+        output_path: Path to save the processed audio.
+        effects_config: Dictionary containing 'effect_chain' list of effect definitions.
+        block_size: Number of frames read, processed and written per block.
+        optimize: Drop no-op stages and fuse EQ runs before rendering.
+    """
+    chain = compile_chain(effects_config, optimize=optimize)
+    for warning in chain.warnings:
+        print(f"Warning: {warning}")
+    return chain.render_file_streaming(input_path, output_path, block_size=block_size)
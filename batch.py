@@ -0,0 +1,276 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+from chain_generator import configs_for_prompts
+from prompt_manager import build_messages
+from llm_cache import LLMCache, DEFAULT_LLM_CACHE_DIR, quantize_features
+from analysis_cache import AnalysisCache
+from audio_processor import apply_pedalboard_effects
+from audio_analyzer import analyze_audio
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".ogg", ".aif", ".aiff", ".mp3"}
+
+def collect_jobs(args) -> list:
+    """
+    Builds the list of (input, text, output) jobs from the CLI arguments.
+
+    Supports a directory of audio files, a manifest (one path per line) or a
+    CSV with 'file' and 'text' columns (and an optional 'output' column).
+
+    Raises:
+        ValueError: If two jobs would write the same output file.
+    """
+    entries = []
+    if args.csv:
+        base_dir = os.path.dirname(os.path.abspath(args.csv))
+        with open(args.csv, newline="") as f:
+            for row in csv.DictReader(f):
+                path = row["file"]
+                if not os.path.isabs(path):
+                    path = os.path.join(base_dir, path)
+                entries.append((path, row["text"], row.get("output") or None))
+    elif args.manifest:
+        base_dir = os.path.dirname(os.path.abspath(args.manifest))
+        with open(args.manifest) as f:
+            for line in f:
+                path = line.strip()
+                if not path or path.startswith("#"):
+                    continue
+                if not os.path.isabs(path):
+                    path = os.path.join(base_dir, path)
+                entries.append((path, args.text, None))
+    else:
+        for name in sorted(os.listdir(args.input_dir)):
+            if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                entries.append((os.path.join(args.input_dir, name), args.text, None))
+
+    # Default outputs are named after the input; inputs sharing a basename
+    # (one file with several texts, or same-named files from different
+    # directories) get the text slug, then the row number, appended
+    defaults = [(os.path.basename(path), _slug(text)) for path, text, output in entries if not output]
+    name_counts = Counter(name for name, _ in defaults)
+    slug_counts = Counter(defaults)
+    jobs = []
+    for row, (path, text, output) in enumerate(entries, start=1):
+        if not output:
+            name = os.path.basename(path)
+            if name_counts[name] > 1:
+                stem, ext = os.path.splitext(name)
+                slug = _slug(text)
+                name = f"{stem}_{slug}{ext}" if slug and slug_counts[(name, slug)] == 1 else f"{stem}_{row}{ext}"
+            output = os.path.join(args.output_dir, name)
+        jobs.append({"input": path, "text": text, "output": output})
+
+    seen = {}
+    for job in jobs:
+        key = os.path.abspath(job["output"])
+        if key in seen:
+            raise ValueError(f"Jobs for '{seen[key]}' and '{job['input']}' would both write '{job['output']}'")
+        seen[key] = job["input"]
+    return jobs
+
+def _slug(text: str, max_length: int = 40) -> str:
+    """Filename-safe short form of a description ('' for none)."""
+    return re.sub(r"[^a-z0-9]+", "-", (text or "").lower()).strip("-")[:max_length].rstrip("-")
+
+def analysis_bucket(features: dict, scale: float = 1.0):
+    """
+    Hashable bucket key for an analysis dict; files in the same bucket share one LLM chain.
+    """
+    if not features:
+        return None
+    return tuple(sorted(quantize_features(features, scale=scale).items()))
+
+def _analyze_job(input_path: str, analysis_cache=None) -> tuple:
+    start = time.perf_counter()
+    features = analyze_audio(input_path, cache=analysis_cache)
+    return features, time.perf_counter() - start
+
+def _render_job(input_path: str, output_path: str, effects_config: dict) -> float:
+    start = time.perf_counter()
+    apply_pedalboard_effects(input_path, output_path, effects_config)
+    return time.perf_counter() - start
+
+def run_batch(jobs: list, workers: int = None, verbose: bool = False, cache=None, refresh: bool = False,
+              bucket_scale: float = 1.0, compact: bool = False, few_shot: int = None, analysis_cache=None) -> tuple:
+    """
+    Runs analysis, chain generation and rendering for a list of jobs.
+
+    Analysis and rendering fan out across a process pool; the LLM is queried
+    concurrently, once per unique (text, analysis bucket) pair, with the
+    bucketed features in the prompt so the chain represents the whole bucket.
+
+    Args:
+        jobs: List of dicts with 'input', 'text' and 'output' keys.
+        workers: Number of worker processes (default: CPU count).
+        verbose: Print per-job progress.
+        cache: Optional LLMCache consulted before every LLM call.
+        refresh: Ignore cached answers but store the fresh ones.
+        bucket_scale: Multiplier on the feature bucket widths (0 disables bucketing).
+        compact: Use the compact few-shot encoding in prompts.
+        few_shot: Send only the k most similar examples (None sends all).
+        analysis_cache: Optional AnalysisCache shared by the worker processes.
+
+    Returns:
+        tuple: (results, llm) with one result dict per job (status, analysis
+            and render timings, any error) and the batch-level LLM figures
+            {"llm_seconds", "chains_generated"}. The chains are generated in
+            one concurrent round, so its wall time is not split per file.
+    """
+    results = []
+    for job in jobs:
+        results.append({
+            "input": job["input"],
+            "output": job["output"],
+            "text": job["text"],
+            "status": "pending",
+            "error": None,
+            "chain_reused": False,
+            "timings": {},
+        })
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 1. Analyze every file in parallel
+        print(f"Analyzing {len(jobs)} files...")
+        futures = {}
+        for i, job in enumerate(jobs):
+            if not os.path.exists(job["input"]):
+                results[i]["status"] = "failed"
+                results[i]["error"] = "Input file not found"
+                continue
+            futures[i] = pool.submit(_analyze_job, job["input"], analysis_cache)
+
+        features_by_job = {}
+        for i, future in futures.items():
+            try:
+                features, elapsed = future.result()
+            except Exception as e:
+                features, elapsed = {"error": str(e)}, 0.0
+            results[i]["timings"]["analysis"] = round(elapsed, 4)
+            if "error" in features:
+                print(f"Warning: Audio analysis failed for '{jobs[i]['input']}': {features['error']}")
+                features = None
+            features_by_job[i] = features
+
+        # 2. Query the LLM once per (text, bucket), overlapping the round-trips
+        prompts = {}
+        for i, features in features_by_job.items():
+            key = (jobs[i]["text"], analysis_bucket(features, bucket_scale))
+            if key in prompts:
+                results[i]["chain_reused"] = True
+                continue
+            prompts[key] = build_messages(jobs[i]["text"], quantize_features(features, scale=bucket_scale),
+                                          compact=compact, few_shot=few_shot)
+
+        print(f"Generating {len(prompts)} unique chains...")
+        start = time.perf_counter()
+        generated = configs_for_prompts(list(prompts.values()), cache=cache, refresh=refresh)
+        llm = {"llm_seconds": round(time.perf_counter() - start, 4), "chains_generated": len(prompts)}
+        chains = {}
+        for key, outcome in zip(prompts, generated):
+            chains[key] = outcome if isinstance(outcome, Exception) else outcome[0]
+
+        # 3. Render in parallel
+        print("Rendering...")
+        futures = {}
+        for i, features in features_by_job.items():
+            config = chains[(jobs[i]["text"], analysis_bucket(features, bucket_scale))]
+            if isinstance(config, Exception):
+                results[i]["status"] = "failed"
+                results[i]["error"] = f"Chain generation failed: {config}"
+                continue
+            os.makedirs(os.path.dirname(os.path.abspath(jobs[i]["output"])), exist_ok=True)
+            futures[i] = pool.submit(_render_job, jobs[i]["input"], jobs[i]["output"], config)
+
+        for i, future in futures.items():
+            try:
+                results[i]["timings"]["render"] = round(future.result(), 4)
+                results[i]["status"] = "done"
+            except Exception as e:
+                results[i]["status"] = "failed"
+                results[i]["error"] = f"Render failed: {e}"
+            if verbose:
+                print(f"  [{results[i]['status']}] {jobs[i]['input']} -> {jobs[i]['output']}")
+
+    return results, llm
+
+def main():
+    parser = argparse.ArgumentParser(description="Text-to-Audio FX batch mode: process many files in a worker pool.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input-dir", help="Directory of input audio files")
+    source.add_argument("--manifest", help="Text file with one input path per line")
+    source.add_argument("--csv", help="CSV with 'file' and 'text' columns (optional 'output')")
+    parser.add_argument("--text", help="Description applied to every file (with --input-dir/--manifest)")
+    parser.add_argument("--output-dir", default="outputs", help="Directory for rendered files")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--summary", default=None, help="Path of the JSON summary (default: <output-dir>/batch_summary.json)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk LLM response and analysis caches")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached LLM responses but store fresh ones")
+    parser.add_argument("--cache-dir", default=DEFAULT_LLM_CACHE_DIR, help="Directory of the LLM response cache")
+    parser.add_argument("--bucket-scale", type=float, default=1.0, help="Multiplier on feature bucket widths used to share chains (0 = exact features)")
+    parser.add_argument("--compact-prompt", action="store_true", help="Minified few-shot examples without their reasons")
+    parser.add_argument("--few-shot", type=int, default=None, help="Send only the K most similar few-shot examples (default: all, in the cached system prefix)")
+    parser.add_argument("--verbose", action="store_true", help="Print debug info")
+
+    args = parser.parse_args()
+
+    if not args.csv and not args.text:
+        parser.error("--text is required with --input-dir/--manifest")
+
+    # Check for API key
+    if not os.environ.get("GROQ_API_KEY") and os.environ.get("FX_LLM_BACKEND") != "mock":
+        print("Error: GROQ_API_KEY environment variable is not set.")
+        print("Please export GROQ_API_KEY='your_api_key'")
+        sys.exit(1)
+
+    try:
+        jobs = collect_jobs(args)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not jobs:
+        print("Error: No input files found.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    cache = None if args.no_cache else LLMCache(args.cache_dir)
+    analysis_cache = None if args.no_cache else AnalysisCache()
+    results, llm = run_batch(jobs, workers=args.workers, verbose=args.verbose, cache=cache, refresh=args.refresh,
+                        bucket_scale=args.bucket_scale, compact=args.compact_prompt, few_shot=args.few_shot,
+                        analysis_cache=analysis_cache)
+    wall_time = time.perf_counter() - start
+
+    summary = {
+        "wall_time_seconds": round(wall_time, 3),
+        "workers": args.workers or os.cpu_count(),
+        "total": len(results),
+        "done": sum(r["status"] == "done" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "chains_generated": llm["chains_generated"],
+        "llm_seconds": llm["llm_seconds"],
+        "llm_cache": cache.stats() if cache is not None else None,
+        "files": results,
+    }
+    summary_path = args.summary or os.path.join(args.output_dir, "batch_summary.json")
+    os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Processed {summary['done']}/{summary['total']} files in {wall_time:.1f}s ({summary['failed']} failed).")
+    print(f"Summary written to '{summary_path}'")
+    if summary["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,817 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+def synthetic_signal(seconds: float, sr: int = 44100, seed: int = 0) -> np.ndarray:
+    """Tone + noise + clicks at 120 BPM, so every feature has something to measure."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    y = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(len(t))
+    beat = int(0.5 * sr)
+    for start in range(0, len(y), beat):
+        y[start:start + 200] += 0.8 * np.exp(-np.arange(len(y[start:start + 200])) / 40)
+    return y.astype(np.float32)
+
+def _legacy_extract_features(y: np.ndarray, sr: int) -> dict:
+    """The pre-single-pass analyzer: one librosa call (and STFT) per feature."""
+    import librosa
+
+    duration = librosa.get_duration(y=y, sr=sr)
+    avg_rms = float(np.mean(librosa.feature.rms(y=y)))
+    avg_centroid = float(np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)))
+    avg_zcr = float(np.mean(librosa.feature.zero_crossing_rate(y)))
+    tempo = librosa.feature.tempo(y=y, sr=sr)
+    if isinstance(tempo, np.ndarray):
+        tempo = tempo[0]
+    tempo = float(tempo)
+    avg_bw = float(np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr)))
+
+    content_hint = "Unknown"
+    if avg_zcr > 0.1:
+        content_hint = "High Noise/Unvoiced Speech"
+    elif avg_centroid < 1000:
+        content_hint = "Low Frequency/Dark"
+    else:
+        content_hint = "Balanced/Tonal"
+
+    return {
+        "duration_seconds": round(duration, 2),
+        "sample_rate": sr,
+        "tempo_bpm": round(tempo, 1),
+        "avg_loudness_rms": round(avg_rms, 4),
+        "spectral_centroid_brightness": round(avg_centroid, 1),
+        "zero_crossing_rate": round(avg_zcr, 4),
+        "spectral_bandwidth": round(avg_bw, 1),
+        "content_descriptor": content_hint
+    }
+
+def _best_of(fn, repeats: int) -> tuple:
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def bench_analysis(lengths: list, sr: int, repeats: int) -> list:
+    """Times the legacy and single-pass analyzers on synthetic signals of each length."""
+    from audio_analyzer import extract_features
+
+    # Warm up numba-compiled paths so the first length is not penalised
+    extract_features(synthetic_signal(2.0, sr), sr)
+    _legacy_extract_features(synthetic_signal(2.0, sr), sr)
+
+    rows = []
+    for seconds in lengths:
+        y = synthetic_signal(seconds, sr)
+        legacy_time, legacy = _best_of(lambda: _legacy_extract_features(y, sr), repeats)
+        new_time, new = _best_of(lambda: extract_features(y, sr), repeats)
+        rows.append({
+            "seconds": seconds,
+            "legacy_s": round(legacy_time, 4),
+            "single_pass_s": round(new_time, 4),
+            "speedup": round(legacy_time / new_time, 2),
+            "identical": legacy == new,
+            "mismatches": {k: (legacy[k], new[k]) for k in legacy if legacy[k] != new.get(k)},
+        })
+    return rows
+
+BENCH_CHAIN = {
+    "effect_chain": [
+        {"type": "high_shelf", "params": {"cutoff_frequency_hz": 4000, "gain_db": -6.0}},
+        {"type": "compressor", "params": {"threshold_db": -15.0, "ratio": 4.0}},
+        {"type": "reverb", "params": {"room_size": 0.6, "wet_level": 0.3}}
+    ]
+}
+
+def write_synthetic_file(path: str, seconds: float, sr: int = 44100, channels: int = 2, subtype: str = "PCM_16"):
+    """Writes a synthetic test file in 10-second blocks so the parent stays small."""
+    import soundfile as sf
+
+    with sf.SoundFile(path, "w", samplerate=sr, channels=channels, subtype=subtype) as f:
+        remaining = seconds
+        seed = 0
+        while remaining > 0:
+            block = synthetic_signal(min(10.0, remaining), sr, seed=seed)
+            f.write(np.repeat(block[:, None], channels, axis=1) * 0.9)
+            remaining -= 10.0
+            seed += 1
+
+def _memory_child(mode: str, input_path: str, output_path: str) -> dict:
+    """Runs one render mode and reports its peak RSS and peak traced allocations."""
+    import resource
+    import tracemalloc
+    import soundfile as sf
+    from audio_processor import compile_chain
+
+    chain = compile_chain(BENCH_CHAIN, optimize=False)
+    chain.board  # allocate plugins before measuring
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == "legacy":
+        # The pre-float32 path: float64 decode, implicit conversions, default subtype
+        audio, sample_rate = sf.read(input_path)
+        processed = chain.build_board()(audio, sample_rate)
+        sf.write(output_path, processed, sample_rate)
+    elif mode == "float32":
+        chain.render_file(input_path, output_path)
+    elif mode == "stream":
+        chain.render_file_streaming(input_path, output_path)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        max_rss *= 1024
+    return {"mode": mode, "seconds": round(elapsed, 3), "peak_rss_mb": round(max_rss / 2 ** 20, 1),
+            "peak_traced_mb": round(traced_peak / 2 ** 20, 1)}
+
+def bench_memory(seconds: float, sr: int, channels: int, modes: list) -> list:
+    """Renders one long synthetic file with each mode in a fresh process."""
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "input.wav")
+        print(f"Writing {seconds:.0f}s {channels}-channel test file...")
+        write_synthetic_file(input_path, seconds, sr, channels)
+        for mode in modes:
+            output_path = os.path.join(tmp, f"output_{mode}.wav")
+            result = subprocess.run(
+                [sys.executable, __file__, "_memory-child", mode, input_path, output_path],
+                capture_output=True, text=True, check=True
+            )
+            rows.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return rows
+
+def _parse_importtime(stderr: str) -> list:
+    """Returns (cumulative_us, module) for top-level imports from -X importtime output."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            imports.append((int(cumulative), name.strip()))
+    return imports
+
+def time_entry_point(argv: list, env: dict = None) -> dict:
+    """
+    Runs one command under -X importtime and measures time to first output.
+
+    Returns:
+        dict: first_output_s, total_s, import_s and the slowest top-level imports.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), argv[0])
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-X", "importtime", "-u", script] + argv[1:], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True, env=env)
+    first_line = proc.stdout.readline()
+    first_output = time.perf_counter() - start if first_line else None
+    _, stderr = proc.communicate()
+    total = time.perf_counter() - start
+
+    imports = sorted(_parse_importtime(stderr), reverse=True)
+    return {
+        "command": " ".join(argv),
+        "first_output_s": round(first_output, 3) if first_output is not None else None,
+        "total_s": round(total, 3),
+        "import_s": round(sum(us for us, _ in imports) / 1e6, 3),
+        "slowest_imports": [{"module": name, "ms": round(us / 1000, 1)} for us, name in imports[:5]],
+    }
+
+def bench_startup() -> list:
+    """Times every entry point's fast paths: --help, a usage error and --chain-file."""
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "input.wav")
+        chain_path = os.path.join(tmp, "chain.json")
+        write_synthetic_file(input_path, 2.0, channels=1)
+        with open(chain_path, "w") as f:
+            json.dump(BENCH_CHAIN, f)
+
+        # No API key, so nothing can reach the network
+        env = {k: v for k, v in os.environ.items() if k != "GROQ_API_KEY"}
+        commands = [
+            ["main.py", "--help"],
+            ["main.py", "--input", os.path.join(tmp, "missing.wav"), "--text", "x", "--output", "out.wav"],
+            ["main.py", "--input", input_path, "--chain-file", chain_path, "--output", os.path.join(tmp, "out.wav")],
+            ["compare_audio.py", "--help"],
+            ["compare_audio.py", input_path, input_path],
+        ]
+        for argv in commands:
+            rows.append(time_entry_point(argv, env))
+    return rows
+
+def bench_timeline(lengths: list, sr: int, window_seconds: float, oneshot_max: float) -> list:
+    """
+    Times the streaming timeline analyzer on synthetic files from minutes to hours.
+
+    Files up to oneshot_max seconds are also analysed whole with
+    extract_features, to compare cost and check that the summaries match.
+    """
+    import tracemalloc
+    from audio_analyzer import extract_features
+    from audio_buffer import AudioBuffer
+    from feature_timeline import analyze_timeline
+
+    # Warm up numba-compiled paths so the first length is not penalised
+    extract_features(synthetic_signal(2.0, sr), sr)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for seconds in lengths:
+            path = os.path.join(tmp, f"input_{seconds:g}.wav")
+            write_synthetic_file(path, seconds, sr, channels=1)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            timeline = analyze_timeline(path, window_seconds)
+            elapsed = time.perf_counter() - start
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            row = {
+                "seconds": seconds,
+                "windows": len(timeline),
+                "timeline_s": round(elapsed, 3),
+                "ms_per_audio_min": round(1000 * elapsed / (seconds / 60), 1),
+                "peak_alloc_mb": round(traced_peak / 2 ** 20, 1),
+                "oneshot_s": None,
+                "mismatches": {},
+            }
+            if seconds <= oneshot_max:
+                buffer = AudioBuffer.from_file(path)
+                start = time.perf_counter()
+                oneshot = extract_features(buffer.mono(), sr)
+                row["oneshot_s"] = round(time.perf_counter() - start, 3)
+                summary = timeline.summary()
+                row["mismatches"] = {k: (oneshot[k], summary[k]) for k in oneshot if oneshot[k] != summary.get(k)}
+            rows.append(row)
+            os.remove(path)
+    return rows
+
+# EQ-heavy chain with removable stages, as LLM answers often look
+EQ_HEAVY_CHAIN = {
+    "effect_chain": [
+        {"type": "low_shelf", "params": {"cutoff_frequency_hz": 200, "gain_db": 3.0}},
+        {"type": "peak", "params": {"cutoff_frequency_hz": 800, "gain_db": -4.0, "q": 1.0}},
+        {"type": "peak", "params": {"cutoff_frequency_hz": 2500, "gain_db": 5.0, "q": 2.0}},
+        {"type": "peak", "params": {"cutoff_frequency_hz": 4000, "gain_db": 0.0}},
+        {"type": "high_shelf", "params": {"cutoff_frequency_hz": 6000, "gain_db": -8.0}},
+        {"type": "gain", "params": {"gain_db": 2.0}},
+        {"type": "gain", "params": {"gain_db": -1.0}},
+        {"type": "phaser", "params": {"mix": 0.0}},
+        {"type": "compressor", "params": {"threshold_db": -18.0, "ratio": 3.0}}
+    ]
+}
+
+def bench_optimizer(seconds: float, sr: int, channels: int, repeats: int, tolerance: float = 1e-4) -> list:
+    """
+    Renders every replay chain (and EQ_HEAVY_CHAIN) with and without the chain optimizer.
+
+    Each row has both render times, the eliminated passes, and the largest
+    sample difference of the optimized render, one-shot and block by block
+    (reset=False), from the unoptimized one-shot render.
+    """
+    from audio_processor import CompiledChain, validate_chain
+    from reference_cases import replay_cases
+
+    audio = np.ascontiguousarray(np.repeat(synthetic_signal(seconds, sr)[None, :], channels, axis=0) * 0.8)
+    block = len(audio[0]) // 3 + 1
+    rows = []
+    for name, config in [("eq_heavy", EQ_HEAVY_CHAIN)] + replay_cases():
+        stages, _ = validate_chain(config)
+        plain, optimized = CompiledChain(stages, optimize=False), CompiledChain(stages)
+        plain_time, reference = _best_of(lambda: plain.process(audio, sr), repeats)
+        optimized_time, result = _best_of(lambda: optimized.process(audio, sr), repeats)
+
+        # The one-shot renders above leave their tails in the plugins
+        optimized.reset()
+        streamed = np.concatenate([
+            optimized.process(audio[:, start:start + block], sr, reset=False)
+            for start in range(0, audio.shape[1], block)
+        ], axis=1)
+        diff = float(np.max(np.abs(result - reference))) if reference.size else 0.0
+        stream_diff = float(np.max(np.abs(streamed - reference))) if reference.size else 0.0
+        rows.append({
+            "chain": name,
+            "stages": optimized.optimization["stages"],
+            "passes": optimized.optimization["passes"],
+            "plain_s": round(plain_time, 4),
+            "optimized_s": round(optimized_time, 4),
+            "speedup": round(plain_time / optimized_time, 2) if optimized_time else None,
+            "max_abs_diff": diff,
+            "stream_max_abs_diff": stream_diff,
+            "equivalent": max(diff, stream_diff) <= tolerance,
+        })
+    return rows
+
+def bench_session(stems: int, seconds: float, sr: int, worker_counts: list) -> list:
+    """Renders one synthetic multi-stem session with each thread count (chains from files, no LLM)."""
+    from session import render_session
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = {"stems": [], "master": {"chain": {"effect_chain": [
+            {"type": "compressor", "params": {"threshold_db": -12.0, "ratio": 2.0}}]}}}
+        for i in range(stems):
+            path = os.path.join(tmp, f"stem_{i}.wav")
+            write_synthetic_file(path, seconds, sr, channels=2)
+            manifest["stems"].append({"name": f"stem_{i}", "file": path, "chain": BENCH_CHAIN, "gain_db": -6.0})
+
+        for workers in worker_counts:
+            summary = render_session(manifest, os.path.join(tmp, f"mix_{workers}.wav"), workers=workers)
+            rows.append({
+                "workers": workers,
+                "wall_s": summary["wall_seconds"],
+                "render_wall_s": summary["render_wall_seconds"],
+                "render_parallelism": summary["render_parallelism"],
+            })
+    for row in rows:
+        row["speedup"] = round(rows[0]["render_wall_s"] / row["render_wall_s"], 2) if row["render_wall_s"] else None
+    return rows
+
+SUITE_SIGNALS = ("sweep", "noise_burst", "clicks")
+
+def bench_realtime(seconds: float, sr: int, channels: int, block_sizes: list) -> list:
+    """
+    Streams a synthetic signal through realtime.run_stream at each block size.
+
+    Starts on BENCH_CHAIN and asks the background loader for EQ_HEAVY_CHAIN
+    halfway through, so the timings include a hot swap and its crossfade.
+    """
+    import io
+    from realtime import BlockStats, ChainLoader, ChainSwitcher, run_stream
+
+    audio = np.repeat(synthetic_signal(seconds, sr)[:, None], channels, axis=1) * 0.8
+    data = audio.astype("<f4").tobytes()
+
+    class SwapHalfway(io.BytesIO):
+        def __init__(self, payload, loader):
+            super().__init__(payload)
+            self.loader = loader
+
+        def read(self, n=-1):
+            if self.loader is not None and self.tell() >= len(data) // 2:
+                self.loader.submit(EQ_HEAVY_CHAIN)
+                self.loader = None
+            return super().read(n)
+
+    rows = []
+    for block_size in block_sizes:
+        switcher = ChainSwitcher(sr)
+        loader = ChainLoader(switcher, sr, channels, block_size)
+        loader.submit(BENCH_CHAIN)
+        while switcher._pending is None:
+            time.sleep(0.01)
+        stats = BlockStats(block_size, sr, recent=len(audio) // block_size + 1)
+        out = io.BytesIO()
+        run_stream(SwapHalfway(data, loader), out, sr, channels, "f32le", block_size, switcher, stats)
+        rows.append(dict(stats.summary(), block_size=block_size, swaps=switcher.swaps,
+                         complete=len(out.getvalue()) == len(data)))
+    return rows
+
+# Paraphrases of the seeded descriptions, with the seeds that count as a correct answer
+RETRIEVAL_PARAPHRASES = [
+    ("like a phone call", ("Make it sound like a telephone call.",)),
+    ("old telephone line", ("Make it sound like a telephone call.",)),
+    ("telephone voice", ("Make it sound like a telephone call.",)),
+    ("inside a huge cathedral", ("A large, empty cathedral.",)),
+    ("cathedral reverb", ("A large, empty cathedral.",)),
+    ("1950s radio", ("Radio broadcast from the 1950s.",)),
+    ("vintage radio broadcast", ("Radio broadcast from the 1950s.",)),
+    ("underwater", ("Deep underwater sound.", "An underwater announcement.")),
+    ("deep under water", ("Deep underwater sound.",)),
+    ("announcement from under water", ("An underwater announcement.",)),
+    ("a giant in an echoing cave", ("A giant speaking in a massive, echoing cave.",)),
+    ("broken radio transmission", ("A broken radio transmission from a spaceship.",)),
+    ("spaceship radio", ("A broken radio transmission from a spaceship.",)),
+    ("malfunctioning robot", ("A robot malfunction.",)),
+    ("robot malfunctioning voice", ("A robot malfunction.",)),
+]
+
+# Requests no seeded chain fits; any hit on these is a false positive
+RETRIEVAL_UNRELATED = [
+    "bright acoustic guitar with sparkle",
+    "make the vocals louder and warmer",
+    "lo-fi hip hop beat",
+    "stadium crowd cheering",
+    "dreamy shoegaze wall of sound",
+]
+
+def bench_retrieval(thresholds: list, repeats: int) -> list:
+    """
+    Scores the retrieval index on paraphrases of the seeded descriptions.
+
+    Per threshold: hit rate on the paraphrases, the share of those hits that
+    returned an acceptable seed, and the false hit rate on unrelated requests.
+    Also reports the seeded build time and the lookup latency.
+    """
+    from retrieval_index import RetrievalIndex
+
+    build_time, index = _best_of(lambda: RetrievalIndex(path=None), repeats)
+    queries = [text for text, _ in RETRIEVAL_PARAPHRASES] + RETRIEVAL_UNRELATED
+    latencies = []
+    best = {}
+    for text in queries:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            results = index.search(text)
+            latencies.append(time.perf_counter() - start)
+        best[text] = results[0] if results else (0.0, None)
+
+    rows = []
+    for threshold in thresholds:
+        hits = correct = 0
+        for text, expected in RETRIEVAL_PARAPHRASES:
+            score, entry = best[text]
+            if score >= threshold:
+                hits += 1
+                correct += entry["text"] in expected
+        false_hits = sum(best[text][0] >= threshold for text in RETRIEVAL_UNRELATED)
+        rows.append({
+            "threshold": threshold,
+            "hit_rate": round(hits / len(RETRIEVAL_PARAPHRASES), 3),
+            "precision": round(correct / hits, 3) if hits else None,
+            "false_hit_rate": round(false_hits / len(RETRIEVAL_UNRELATED), 3),
+            "entries": len(index),
+            "build_ms": round(build_time * 1000, 2),
+            "mean_lookup_ms": round(float(np.mean(latencies)) * 1000, 3),
+            "p99_lookup_ms": round(float(np.percentile(latencies, 99)) * 1000, 3),
+        })
+    return rows
+
+def suite_signal(kind: str, seconds: float, sr: int, channels: int, seed: int = 0) -> np.ndarray:
+    """
+    Generates a (frames, channels) float32 test signal.
+
+    Args:
+        kind: 'sweep' (log sine sweep 20 Hz -> 0.45 * sr), 'noise_burst' (decaying
+            100 ms noise bursts every 0.5 s) or 'clicks' (120 BPM click track).
+        seconds: Length of the signal.
+        sr: Sample rate.
+        channels: Channel count; later channels are slightly delayed copies.
+        seed: Noise seed.
+    """
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    if kind == "sweep":
+        f0, f1 = 20.0, 0.45 * sr
+        k = np.log(f1 / f0)
+        y = 0.5 * np.sin(2 * np.pi * f0 * seconds / k * (np.exp(t / seconds * k) - 1))
+    elif kind == "noise_burst":
+        rng = np.random.default_rng(seed)
+        envelope = np.exp(-(t % 0.5) / 0.03) * ((t % 0.5) < 0.1)
+        y = 0.7 * envelope * rng.standard_normal(n)
+    elif kind == "clicks":
+        y = np.zeros(n)
+        for start in range(0, n, int(0.5 * sr)):
+            click = y[start:start + int(0.005 * sr)]
+            y[start:start + len(click)] = 0.9 * np.exp(-np.arange(len(click)) / (0.001 * sr))
+    else:
+        raise ValueError(f"Unknown signal '{kind}'")
+
+    y = y.astype(np.float32)
+    return np.stack([np.roll(y, 7 * c) for c in range(channels)], axis=1)
+
+def bench_suite(lengths: list, sample_rates: list, channel_counts: list, repeats: int) -> dict:
+    """
+    Times analysis, chain build and render for every registry effect on every
+    synthetic signal, plus the offline (mock LLM) pipeline for each replay case.
+
+    Returns:
+        dict: Best-of-repeats seconds keyed by case id, e.g.
+            'render/reverb/sweep/30s/44100Hz/2ch'.
+    """
+    from audio_analyzer import extract_features
+    from audio_processor import EFFECT_REGISTRY, CompiledChain, compile_chain, validate_chain
+    from chain_generator import generate_effects_config
+    from llm_client import set_client
+    from mock_llm import MockLLMClient
+    from reference_cases import replay_cases
+
+    results = {}
+    extract_features(synthetic_signal(2.0, 22050), 22050)
+
+    # Chain build: validation plus plugin construction (bypasses the compile cache).
+    # Unoptimized, so default params that are no-ops (0 dB gain) still run the plugin
+    chains = {}
+    for effect_type in EFFECT_REGISTRY:
+        config = {"effect_chain": [{"type": effect_type, "params": {}}]}
+        build_time, chain = _best_of(lambda: CompiledChain(*validate_chain(config), optimize=False), repeats)
+        board_time, _ = _best_of(chain.build_board, repeats)
+        results[f"build/{effect_type}"] = build_time + board_time
+        chains[effect_type] = chain
+
+    for kind in SUITE_SIGNALS:
+        for seconds in lengths:
+            for sr in sample_rates:
+                mono = suite_signal(kind, seconds, sr, 1)[:, 0]
+                case = f"{kind}/{seconds:g}s/{sr}Hz"
+                results[f"analysis/{case}"] = _best_of(lambda: extract_features(mono, sr), repeats)[0]
+                for channels in channel_counts:
+                    audio = np.ascontiguousarray(suite_signal(kind, seconds, sr, channels).T)
+                    for effect_type, chain in chains.items():
+                        results[f"render/{effect_type}/{case}/{channels}ch"] = _best_of(
+                            lambda: chain.process(audio, sr), repeats)[0]
+
+    # End to end with the mock backend: prompt -> replayed response -> parse -> compile -> render
+    set_client(MockLLMClient())
+    try:
+        sr = 44100
+        audio = np.ascontiguousarray(suite_signal("sweep", 5.0, sr, 2).T)
+        for text, _ in replay_cases():
+            def run():
+                config, _ = generate_effects_config(text)
+                return compile_chain(config).process(audio, sr)
+            slug = "".join(c if c.isalnum() else "_" for c in text.lower()).strip("_")
+            results[f"pipeline/{slug}"] = _best_of(run, repeats)[0]
+    finally:
+        set_client(None)
+
+    return {case: round(seconds, 6) for case, seconds in results.items()}
+
+def save_baseline(path: str, results: dict):
+    """Writes suite results with enough environment info to judge comparability."""
+    import platform
+    import librosa
+    import pedalboard
+
+    baseline = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+        "pedalboard": pedalboard.__version__,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float = 0.25, min_delta: float = 0.002) -> list:
+    """
+    Compares suite results against a saved baseline.
+
+    A case regresses when it is more than `tolerance` (fractional) slower and
+    at least `min_delta` seconds slower, so sub-millisecond jitter is ignored.
+
+    Returns:
+        list: One row per case with baseline_s, current_s, ratio and status
+            ('ok', 'regression', 'faster', 'new' or 'missing').
+    """
+    old = baseline.get("results", baseline)
+    rows = []
+    for case in sorted(set(results) | set(old)):
+        before, after = old.get(case), results.get(case)
+        if before is None or after is None:
+            status = "new" if before is None else "missing"
+            rows.append({"case": case, "baseline_s": before, "current_s": after, "ratio": None, "status": status})
+            continue
+        ratio = after / before if before else float("inf")
+        if ratio > 1 + tolerance and after - before >= min_delta:
+            status = "regression"
+        elif ratio < 1 - tolerance and before - after >= min_delta:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append({"case": case, "baseline_s": before, "current_s": after, "ratio": round(ratio, 3), "status": status})
+    return rows
+
+PROMPT_LAYOUTS = {
+    "split": {},
+    "split+compact": {"compact": True},
+    "k=2": {"few_shot": 2},
+    "k=2+compact": {"few_shot": 2, "compact": True},
+}
+
+def bench_prompt(repeats: int = 200) -> list:
+    """
+    Compares prompt size and build time of the single-string prompt with the
+    split system/user layouts.
+
+    Token counts are estimates (prompt_manager.estimate_tokens); 'static' is the
+    byte-stable system prefix that provider-side prompt caching can reuse.
+    """
+    from prompt_manager import build_prompt, build_messages, estimate_tokens
+    from reference_cases import replay_cases
+
+    texts = [text for text, _ in replay_cases()]
+    features = {"duration_seconds": 12.5, "tempo_bpm": 120.0, "avg_loudness_rms": 0.05}
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        legacy = [build_prompt(text, features) for text in texts]
+    legacy_build = (time.perf_counter() - start) / (repeats * len(texts))
+    legacy_tokens = sum(estimate_tokens(p) for p in legacy) / len(texts)
+    rows = [{"layout": "single-string", "tokens": round(legacy_tokens, 1), "static_tokens": 0,
+             "variable_tokens": round(legacy_tokens, 1), "build_us": round(legacy_build * 1e6, 1), "saved_pct": 0.0}]
+
+    for name, options in PROMPT_LAYOUTS.items():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            prompts = [build_messages(text, features, **options) for text in texts]
+        build = (time.perf_counter() - start) / (repeats * len(texts))
+        tokens = sum(estimate_tokens(p) for p in prompts) / len(texts)
+        static = sum(estimate_tokens(p[0]["content"]) for p in prompts) / len(texts)
+        rows.append({"layout": name, "tokens": round(tokens, 1), "static_tokens": round(static, 1),
+                     "variable_tokens": round(tokens - static, 1), "build_us": round(build * 1e6, 1),
+                     "saved_pct": round(100 * (1 - tokens / legacy_tokens), 1)})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the Text-to-Audio FX pipeline.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("analysis", help="Legacy vs single-pass feature extraction time per file length")
+    p.add_argument("--lengths", type=float, nargs="+", default=[5, 15, 30, 60, 120], help="Signal lengths in seconds")
+    p.add_argument("--sr", type=int, default=44100, help="Sample rate")
+    p.add_argument("--repeats", type=int, default=3, help="Best-of repeats per measurement")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("memory", help="Peak RSS / allocations of the render paths on a long file")
+    p.add_argument("--seconds", type=float, default=600.0, help="Length of the synthetic input")
+    p.add_argument("--sr", type=int, default=44100, help="Sample rate")
+    p.add_argument("--channels", type=int, default=2, help="Channel count")
+    p.add_argument("--modes", nargs="+", default=["legacy", "float32", "stream"], help="Render paths to compare")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("startup", help="Time-to-first-output and import time of each entry point")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("suite", help="Offline suite: analysis, chain build and render per effect on synthetic signals")
+    p.add_argument("--lengths", type=float, nargs="+", default=[5, 30], help="Signal lengths in seconds")
+    p.add_argument("--sample-rates", type=int, nargs="+", default=[22050, 44100, 48000], help="Sample rates")
+    p.add_argument("--channels", type=int, nargs="+", default=[1, 2], help="Channel counts")
+    p.add_argument("--repeats", type=int, default=3, help="Best-of repeats per measurement")
+    p.add_argument("--save-baseline", help="Write the results as a baseline JSON file")
+    p.add_argument("--baseline", help="Compare against this baseline; exits non-zero on regressions")
+    p.add_argument("--tolerance", type=float, default=0.25, help="Allowed fractional slowdown before a case regresses")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("prompt", help="Prompt tokens and build time per prompt layout")
+    p.add_argument("--repeats", type=int, default=200, help="Builds per text for the timing")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("timeline", help="Streaming timeline analysis cost and memory from 1-minute to 2-hour files")
+    p.add_argument("--lengths", type=float, nargs="+", default=[60, 600, 1800, 3600, 7200], help="File lengths in seconds")
+    p.add_argument("--sr", type=int, default=22050, help="Sample rate")
+    p.add_argument("--window-seconds", type=float, default=10.0, help="Timeline window length")
+    p.add_argument("--oneshot-max", type=float, default=600.0, help="Also run the one-shot analyzer on files up to this length")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("optimizer", help="Render time and output difference with and without the chain optimizer")
+    p.add_argument("--seconds", type=float, default=30.0, help="Length of the synthetic input")
+    p.add_argument("--sr", type=int, default=44100, help="Sample rate")
+    p.add_argument("--channels", type=int, default=2, help="Channel count")
+    p.add_argument("--repeats", type=int, default=3, help="Best-of repeats per measurement")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("session", help="Multi-stem session render time per thread count")
+    p.add_argument("--stems", type=int, default=8, help="Number of synthetic stems")
+    p.add_argument("--seconds", type=float, default=60.0, help="Length of each stem")
+    p.add_argument("--sr", type=int, default=44100, help="Sample rate")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="Thread counts to compare")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("realtime", help="Per-block processing time against the deadline in real-time mode, with a hot swap")
+    p.add_argument("--seconds", type=float, default=30.0, help="Length of the synthetic stream")
+    p.add_argument("--sr", type=int, default=48000, help="Sample rate")
+    p.add_argument("--channels", type=int, default=2, help="Channel count")
+    p.add_argument("--block-sizes", type=int, nargs="+", default=[64, 128, 256, 512, 1024], help="Block sizes in frames")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("retrieval", help="Retrieval index hit rate, precision and lookup latency on paraphrased descriptions")
+    p.add_argument("--thresholds", type=float, nargs="+", default=[0.4, 0.5, 0.6, 0.7, 0.8], help="Similarity thresholds to compare")
+    p.add_argument("--repeats", type=int, default=20, help="Repeats per lookup")
+    p.add_argument("--json", help="Also write results to this JSON file")
+
+    p = sub.add_parser("_memory-child")
+    p.add_argument("mode")
+    p.add_argument("input")
+    p.add_argument("output")
+
+    args = parser.parse_args()
+
+    if args.command == "_memory-child":
+        print(json.dumps(_memory_child(args.mode, args.input, args.output)))
+        return
+
+    if args.command == "memory":
+        rows = bench_memory(args.seconds, args.sr, args.channels, args.modes)
+        print(f"{'Mode':<9} | {'Time (s)':<9} | {'Peak RSS (MB)':<14} | {'Peak alloc (MB)':<15}")
+        print("-" * 56)
+        for row in rows:
+            print(f"{row['mode']:<9} | {row['seconds']:<9} | {row['peak_rss_mb']:<14} | {row['peak_traced_mb']:<15}")
+
+    if args.command == "startup":
+        rows = bench_startup()
+        for row in rows:
+            print(f"{row['command']}")
+            print(f"    first output: {row['first_output_s']}s | total: {row['total_s']}s | imports: {row['import_s']}s")
+            print("    slowest imports: " + ", ".join(f"{i['module']} ({i['ms']}ms)" for i in row["slowest_imports"]))
+
+    if args.command == "suite":
+        results = bench_suite(args.lengths, args.sample_rates, args.channels, args.repeats)
+        if args.save_baseline:
+            save_baseline(args.save_baseline, results)
+            print(f"Baseline with {len(results)} cases written to '{args.save_baseline}'")
+
+        rows = [{"case": case, "current_s": seconds} for case, seconds in results.items()]
+        if args.baseline:
+            with open(args.baseline) as f:
+                rows = compare_to_baseline(results, json.load(f), args.tolerance)
+            print(f"{'Case':<52} | {'Baseline (s)':<12} | {'Current (s)':<11} | {'Ratio':<6} | {'Status':<10}")
+            print("-" * 104)
+            for row in rows:
+                if row["status"] != "ok":
+                    print(f"{row['case']:<52} | {str(row['baseline_s']):<12} | {str(row['current_s']):<11} | "
+                          f"{str(row['ratio']):<6} | {row['status']:<10}")
+            counts = {}
+            for row in rows:
+                counts[row["status"]] = counts.get(row["status"], 0) + 1
+            print("Summary: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+        else:
+            for row in rows:
+                print(f"{row['case']:<52} {row['current_s']:.4f}s")
+
+    if args.command == "prompt":
+        rows = bench_prompt(args.repeats)
+        print(f"{'Layout':<14} | {'Tokens':<7} | {'Static':<7} | {'Per-request':<11} | {'Build (us)':<10} | {'Saved %':<7}")
+        print("-" * 72)
+        for row in rows:
+            print(f"{row['layout']:<14} | {row['tokens']:<7} | {row['static_tokens']:<7} | {row['variable_tokens']:<11} | "
+                  f"{row['build_us']:<10} | {row['saved_pct']:<7}")
+
+    if args.command == "timeline":
+        rows = bench_timeline(args.lengths, args.sr, args.window_seconds, args.oneshot_max)
+        print(f"{'Length (s)':<11} | {'Windows':<8} | {'Timeline (s)':<13} | {'ms/audio min':<13} | {'Peak alloc (MB)':<15} | {'One-shot (s)':<12}")
+        print("-" * 87)
+        for row in rows:
+            print(f"{row['seconds']:<11} | {row['windows']:<8} | {row['timeline_s']:<13} | {row['ms_per_audio_min']:<13} | "
+                  f"{row['peak_alloc_mb']:<15} | {str(row['oneshot_s']):<12}")
+            for key, (old, new) in row["mismatches"].items():
+                print(f"    {key}: one-shot={old} timeline={new}")
+
+    if args.command == "optimizer":
+        rows = bench_optimizer(args.seconds, args.sr, args.channels, args.repeats)
+        print(f"{'Chain':<40} | {'Passes':<7} | {'Plain (s)':<9} | {'Optimized (s)':<13} | {'Speedup':<7} | {'Max diff':<9} | {'Equivalent':<10}")
+        print("-" * 111)
+        for row in rows:
+            passes = f"{row['stages']}->{row['passes']}"
+            diff = f"{max(row['max_abs_diff'], row['stream_max_abs_diff']):.1e}"
+            print(f"{row['chain'][:40]:<40} | {passes:<7} | {row['plain_s']:<9} | {row['optimized_s']:<13} | "
+                  f"{str(row['speedup']):<7} | {diff:<9} | {str(row['equivalent']):<10}")
+
+    if args.command == "session":
+        rows = bench_session(args.stems, args.seconds, args.sr, args.workers)
+        print(f"{'Threads':<8} | {'Wall (s)':<9} | {'Render wall (s)':<15} | {'Parallelism':<11} | {'Speedup':<7}")
+        print("-" * 62)
+        for row in rows:
+            print(f"{row['workers']:<8} | {row['wall_s']:<9} | {row['render_wall_s']:<15} | "
+                  f"{str(row['render_parallelism']):<11} | {str(row['speedup']):<7}")
+
+    if args.command == "realtime":
+        rows = bench_realtime(args.seconds, args.sr, args.channels, args.block_sizes)
+        print(f"{'Block':<6} | {'Deadline (ms)':<13} | {'Mean (ms)':<9} | {'p99 (ms)':<8} | {'Max (ms)':<8} | {'Load':<6} | {'Underruns':<9} | {'Swaps':<5}")
+        print("-" * 82)
+        for row in rows:
+            print(f"{row['block_size']:<6} | {row['deadline_ms']:<13} | {row['mean_ms']:<9} | {row['p99_ms']:<8} | "
+                  f"{row['max_ms']:<8} | {row['load']:<6} | {row['underruns']:<9} | {row['swaps']:<5}")
+
+    if args.command == "retrieval":
+        rows = bench_retrieval(args.thresholds, args.repeats)
+        print(f"Index: {rows[0]['entries']} entries built in {rows[0]['build_ms']} ms; "
+              f"lookup mean {rows[0]['mean_lookup_ms']} ms, p99 {rows[0]['p99_lookup_ms']} ms")
+        print(f"{'Threshold':<9} | {'Hit rate':<8} | {'Precision':<9} | {'False hits':<10}")
+        print("-" * 45)
+        for row in rows:
+            print(f"{row['threshold']:<9} | {row['hit_rate']:<8} | {str(row['precision']):<9} | {row['false_hit_rate']:<10}")
+
+    if args.command == "analysis":
+        rows = bench_analysis(args.lengths, args.sr, args.repeats)
+        print(f"{'Length (s)':<11} | {'Legacy (s)':<11} | {'Single-pass (s)':<16} | {'Speedup':<8} | {'Identical':<9}")
+        print("-" * 66)
+        for row in rows:
+            print(f"{row['seconds']:<11} | {row['legacy_s']:<11} | {row['single_pass_s']:<16} | {row['speedup']:<8} | {str(row['identical']):<9}")
+            for key, (old, new) in row["mismatches"].items():
+                print(f"    {key}: legacy={old} single-pass={new}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+    if args.command == "suite" and any(row.get("status") == "regression" for row in rows):
+        sys.exit(1)
+    if args.command == "optimizer" and not all(row["equivalent"] for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
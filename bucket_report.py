@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+from audio_analyzer import analyze_audio
+from chain_generator import config_for_prompt
+from llm_cache import LLMCache, DEFAULT_LLM_CACHE_DIR, quantize_features
+from llm_client import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+from prompt_manager import build_messages
+
+AUDIO_EXTENSIONS = {".wav", ".flac", ".ogg", ".aif", ".aiff", ".mp3"}
+
+def chain_distance(chain_a: list, chain_b: list) -> float:
+    """
+    Rough 0..1 distance between two effect chains.
+
+    Chains with a different sequence of effect types are maximally distant;
+    otherwise the distance is the mean relative difference of shared params.
+    """
+    types_a = [e.get("type", "").lower() for e in chain_a]
+    types_b = [e.get("type", "").lower() for e in chain_b]
+    if types_a != types_b:
+        return 1.0
+
+    diffs = []
+    for eff_a, eff_b in zip(chain_a, chain_b):
+        params_a = eff_a.get("params", {})
+        params_b = eff_b.get("params", {})
+        for key in set(params_a) | set(params_b):
+            try:
+                a = float(params_a.get(key, params_b.get(key)))
+                b = float(params_b.get(key, params_a.get(key)))
+            except (TypeError, ValueError):
+                continue
+            diffs.append(min(1.0, abs(a - b) / max(abs(a), abs(b), 1.0)))
+    return sum(diffs) / len(diffs) if diffs else 0.0
+
+def _lookup(cache: LLMCache, text: str, features: dict, query: bool):
+    prompt = build_messages(text, features)
+    if query:
+        return config_for_prompt(prompt, cache=cache)[0]
+    hit = cache.lookup(prompt, DEFAULT_MODEL, DEFAULT_TEMPERATURE)
+    return hit[0] if hit else None
+
+def bucket_report(features_by_file: dict, text: str, scales: list, cache: LLMCache, query: bool = False) -> list:
+    """
+    Measures cache hit rate versus chain divergence for several bucket scales.
+
+    Hit rate is the share of files that would reuse another file's bucket.
+    Divergence compares each file's own exact-feature chain with the chain its
+    bucket would serve; it only covers files whose chains are in the cache
+    (or fetched when query=True).
+
+    Returns:
+        list: One dict per scale with hit_rate, buckets and divergence stats.
+    """
+    exact_chains = {}
+    for path, features in features_by_file.items():
+        config = _lookup(cache, text, features, query)
+        if config is not None:
+            exact_chains[path] = config.get("effect_chain", [])
+
+    rows = []
+    for scale in scales:
+        buckets = {}
+        for path, features in features_by_file.items():
+            quantized = quantize_features(features, scale=scale)
+            buckets.setdefault(tuple(sorted(quantized.items())), []).append((path, quantized))
+
+        distances = []
+        for members in buckets.values():
+            rep_path, rep_features = members[0]
+            served = _lookup(cache, text, rep_features, query)
+            served_chain = served.get("effect_chain", []) if served else exact_chains.get(rep_path)
+            if served_chain is None:
+                continue
+            for path, _ in members:
+                if path in exact_chains:
+                    distances.append(chain_distance(exact_chains[path], served_chain))
+
+        n = len(features_by_file)
+        rows.append({
+            "scale": scale,
+            "files": n,
+            "buckets": len(buckets),
+            "hit_rate": round(1 - len(buckets) / n, 4) if n else 0.0,
+            "compared": len(distances),
+            "mean_divergence": round(sum(distances) / len(distances), 4) if distances else None,
+            "max_divergence": round(max(distances), 4) if distances else None,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Report LLM cache hit rate vs chain divergence for feature bucket widths.")
+    parser.add_argument("--input-dir", required=True, help="Directory of audio files to analyze")
+    parser.add_argument("--text", required=True, help="Description used for every file")
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.0, 0.5, 1.0, 2.0, 4.0], help="Bucket width multipliers to compare")
+    parser.add_argument("--cache-dir", default=DEFAULT_LLM_CACHE_DIR, help="Directory of the LLM response cache")
+    parser.add_argument("--query", action="store_true", help="Query the LLM for chains missing from the cache")
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    features_by_file = {}
+    for name in sorted(os.listdir(args.input_dir)):
+        if os.path.splitext(name)[1].lower() not in AUDIO_EXTENSIONS:
+            continue
+        path = os.path.join(args.input_dir, name)
+        print(f"Analyzing {path}...")
+        features = analyze_audio(path)
+        if "error" not in features:
+            features_by_file[path] = features
+
+    rows = bucket_report(features_by_file, args.text, args.scales, LLMCache(args.cache_dir), query=args.query)
+
+    print(f"\n{'Scale':<8} | {'Buckets':<8} | {'Hit rate':<9} | {'Compared':<9} | {'Mean div.':<10} | {'Max div.':<10}")
+    print("-" * 68)
+    for row in rows:
+        print(f"{row['scale']:<8} | {row['buckets']:<8} | {row['hit_rate']:<9} | {row['compared']:<9} | "
+              f"{str(row['mean_divergence']):<10} | {str(row['max_divergence']):<10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
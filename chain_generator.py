@@ -0,0 +1,163 @@
+import json
+from llm_client import query_llama, query_llama_stream, query_many, DEFAULT_MODEL, DEFAULT_TEMPERATURE
+from prompt_manager import build_messages
+from instrumentation import recorder, span
+from response_parser import extract_json, parse_stream, repair_prompt
+
+def parse_llm_response(response_text: str) -> dict:
+    """
+    Parses the effects configuration out of a raw LLM response.
+
+    Markdown fences, leading prose and trailing text around the JSON object
+    are tolerated.
+
+    Args:
+        response_text: The raw content returned by the model.
+
+    Returns:
+        dict: The decoded effects configuration.
+
+    Raises:
+        json.JSONDecodeError: If the response contains no JSON object.
+    """
+    with span("parse"):
+        return extract_json(response_text)
+
+def parse_or_repair(prompt, response_text: str, model: str = DEFAULT_MODEL,
+                    temperature: float = DEFAULT_TEMPERATURE) -> tuple:
+    """
+    Parses a response, asking the model once to re-emit bare JSON if that fails.
+
+    Returns:
+        tuple: (effects_config, response_text), where response_text is the
+            repaired response if a repair was needed.
+
+    Raises:
+        json.JSONDecodeError: If the repaired response cannot be parsed either.
+    """
+    try:
+        return parse_llm_response(response_text), response_text
+    except json.JSONDecodeError:
+        recorder.add("llm_repairs")
+    repaired = query_llama(repair_prompt(prompt, response_text), model=model, temperature=temperature)
+    return parse_llm_response(repaired), repaired
+
+def config_for_prompt(prompt, cache=None, refresh: bool = False,
+                      model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE) -> tuple:
+    """
+    Returns the effects config for a prompt, consulting the cache first.
+
+    Args:
+        prompt: The full prompt string or message list.
+        cache: Optional LLMCache; None disables caching.
+        refresh: Skip the cache lookup but still store the fresh answer.
+        model: The model identifier.
+        temperature: Sampling temperature.
+
+    Returns:
+        tuple: (effects_config, raw_response_text)
+    """
+    if cache is not None and not refresh:
+        cached = cache.lookup(prompt, model, temperature)
+        if cached is not None:
+            return cached
+
+    response_text = query_llama(prompt, model=model, temperature=temperature)
+    effects_config, response_text = parse_or_repair(prompt, response_text, model, temperature)
+    if cache is not None:
+        cache.store(prompt, model, temperature, response_text, effects_config)
+    return effects_config, response_text
+
+def config_for_prompt_streaming(prompt, cache=None, refresh: bool = False, model: str = DEFAULT_MODEL,
+                                temperature: float = DEFAULT_TEMPERATURE, on_chain=None) -> tuple:
+    """
+    Like config_for_prompt, but streams the response and parses it as it arrives.
+
+    Args:
+        on_chain: Optional callback receiving the effect_chain list as soon as it
+            has streamed in (not called on cache hits). The final config can
+            still carry a different chain (see parse_stream), so callers must
+            compare it with what they received before reusing early work.
+
+    Returns:
+        tuple: (effects_config, raw_response_text)
+    """
+    if cache is not None and not refresh:
+        cached = cache.lookup(prompt, model, temperature)
+        if cached is not None:
+            return cached
+
+    chunks = query_llama_stream(prompt, model=model, temperature=temperature)
+    try:
+        effects_config, response_text, early_chain_final = parse_stream(chunks, on_chain=on_chain)
+    except json.JSONDecodeError as e:
+        effects_config, response_text = parse_or_repair(prompt, e.doc, model, temperature)
+    else:
+        if early_chain_final is False:
+            print("Warning: The final effect chain differs from the one streamed early.")
+    if cache is not None:
+        cache.store(prompt, model, temperature, response_text, effects_config)
+    return effects_config, response_text
+
+def configs_for_prompts(prompts: list, cache=None, refresh: bool = False,
+                        model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE) -> list:
+    """
+    Batch version of config_for_prompt: cache misses are sent concurrently.
+
+    Returns:
+        list: (effects_config, raw_response_text) per prompt, or the Exception
+            raised for that prompt.
+    """
+    results = [None] * len(prompts)
+    misses = []
+    for i, prompt in enumerate(prompts):
+        if cache is not None and not refresh:
+            results[i] = cache.lookup(prompt, model, temperature)
+        if results[i] is None:
+            misses.append(i)
+
+    responses = []
+    if misses:
+        responses = query_many([prompts[i] for i in misses], model=model, temperature=temperature, return_exceptions=True)
+    for i, response_text in zip(misses, responses):
+        if isinstance(response_text, Exception):
+            results[i] = response_text
+            continue
+        try:
+            effects_config, response_text = parse_or_repair(prompts[i], response_text, model, temperature)
+        except Exception as e:
+            results[i] = e
+            continue
+        if cache is not None:
+            cache.store(prompts[i], model, temperature, response_text, effects_config)
+        results[i] = (effects_config, response_text)
+    return results
+
+def generate_effects_config(user_text: str, audio_features: dict = None, cache=None, refresh: bool = False,
+                            compact: bool = False, few_shot: int = None, index=None) -> tuple:
+    """
+    Runs the prompt -> LLM -> parse steps for one description.
+
+    Args:
+        user_text: Description of the desired effect.
+        audio_features: Optional analysis dict from analyze_audio.
+        cache: Optional LLMCache; None disables caching.
+        refresh: Skip the cache lookup but still store the fresh answer.
+        compact: Use the compact example encoding (see build_messages).
+        few_shot: None for every example in the system prefix, or k to send
+            only the k most similar examples.
+        index: Optional RetrievalIndex; a close enough stored description
+            answers without an LLM call (audio features are not considered).
+
+    Returns:
+        tuple: (effects_config, raw_response_text)
+    """
+    if index is not None:
+        with span("retrieval"):
+            hit = index.lookup(user_text)
+        if hit is not None:
+            recorder.add("retrieval_hits")
+            return hit[0], json.dumps(hit[0])
+    with span("prompt_build"):
+        prompt = build_messages(user_text, audio_features, compact=compact, few_shot=few_shot)
+    return config_for_prompt(prompt, cache=cache, refresh=refresh)
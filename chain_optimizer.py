@@ -0,0 +1,198 @@
+from collections import namedtuple
+import numpy as np
+
+# A run of consecutive stages rendered together: 'board' runs become one
+# Pedalboard, 'sos' runs one biquad cascade (see SOSCascade)
+Segment = namedtuple("Segment", ["kind", "stages"])
+
+# Linear time-invariant stages that fold into a biquad cascade
+LINEAR_STAGES = {"high_shelf", "low_shelf", "peak", "gain"}
+
+# Frames filtered per sosfilt call, so the float64 working copy stays small
+SOS_BLOCK_SIZE = 65536
+
+def _noop_reason(effect_type: str, params: dict) -> str:
+    """Returns why a stage provably leaves the audio unchanged, or None."""
+    if effect_type in ("gain", "high_shelf", "low_shelf", "peak") and params["gain_db"] == 0.0:
+        return "0 dB gain"
+    if effect_type in ("delay", "chorus", "phaser") and params["mix"] == 0.0:
+        return "mix 0"
+    if effect_type == "compressor" and params["ratio"] == 1.0:
+        return "ratio 1"
+    return None
+
+def biquad(effect_type: str, params: dict, sample_rate: float) -> np.ndarray:
+    """
+    Returns the normalised [b0, b1, b2, 1, a1, a2] section of an EQ stage.
+
+    Uses the same formulas as JUCE's IIR::Coefficients (makeHighShelf,
+    makeLowShelf, makePeakFilter), which pedalboard's filter plugins wrap.
+    """
+    A = np.sqrt(10.0 ** (params["gain_db"] / 20.0))
+    omega = 2.0 * np.pi * max(params["cutoff_frequency_hz"], 2.0) / sample_rate
+    cos_w, sin_w = np.cos(omega), np.sin(omega)
+    q = params["q"]
+
+    if effect_type == "peak":
+        alpha = sin_w / (q * 2.0)
+        c2 = -2.0 * cos_w
+        coeffs = (1.0 + alpha * A, c2, 1.0 - alpha * A, 1.0 + alpha / A, c2, 1.0 - alpha / A)
+    else:
+        aminus1, aplus1 = A - 1.0, A + 1.0
+        beta = sin_w * np.sqrt(A) / q
+        if effect_type == "high_shelf":
+            coeffs = (A * (aplus1 + aminus1 * cos_w + beta), A * -2.0 * (aminus1 + aplus1 * cos_w),
+                      A * (aplus1 + aminus1 * cos_w - beta), aplus1 - aminus1 * cos_w + beta,
+                      2.0 * (aminus1 - aplus1 * cos_w), aplus1 - aminus1 * cos_w - beta)
+        elif effect_type == "low_shelf":
+            coeffs = (A * (aplus1 - aminus1 * cos_w + beta), A * 2.0 * (aminus1 - aplus1 * cos_w),
+                      A * (aplus1 - aminus1 * cos_w - beta), aplus1 + aminus1 * cos_w + beta,
+                      -2.0 * (aminus1 + aplus1 * cos_w), aplus1 + aminus1 * cos_w - beta)
+        else:
+            raise ValueError(f"No biquad for '{effect_type}'")
+
+    b0, b1, b2, a0, a1, a2 = coeffs
+    return np.array([b0 / a0, b1 / a0, b2 / a0, 1.0, a1 / a0, a2 / a0])
+
+class SOSCascade:
+    """
+    Several linear stages rendered as one second-order-sections filter.
+
+    Each EQ stage becomes one biquad and gain stages scale the first
+    section, so the whole run is a single scipy sosfilt pass per block.
+    State handling matches a pedalboard plugin's: reset=True starts from
+    silence, and the filter state after every call is kept, so reset=False
+    continues from where the previous call ended.
+    """
+
+    def __init__(self, stages: tuple):
+        self.stages = stages
+        self._sos = {}
+        self._zi = None
+
+    def sos(self, sample_rate: float) -> np.ndarray:
+        """The (sections, 6) coefficient array for a sample rate (cached)."""
+        sos = self._sos.get(sample_rate)
+        if sos is None:
+            gain = 1.0
+            sections = []
+            for effect_type, params in self.stages:
+                params = dict(params)
+                if effect_type == "gain":
+                    gain *= 10.0 ** (params["gain_db"] / 20.0)
+                else:
+                    sections.append(biquad(effect_type, params, sample_rate))
+            if not sections:
+                sections.append(np.array([1.0, 0.0, 0.0, 1.0, 0.0, 0.0]))
+            sos = np.array(sections)
+            sos[0, :3] *= gain
+            self._sos[sample_rate] = sos
+        return sos
+
+    def reset(self):
+        self._zi = None
+
+    def __call__(self, audio: np.ndarray, sample_rate: float, reset: bool = True) -> np.ndarray:
+        """
+        Filters (channels, frames) audio.
+
+        Returns:
+            np.ndarray: float32 (channels, frames) output.
+        """
+        from scipy.signal import sosfilt
+
+        sos = self.sos(sample_rate)
+        zi = None if reset else self._zi
+        if zi is None or zi.shape[1] != audio.shape[0]:
+            zi = np.zeros((len(sos), audio.shape[0], 2))
+        out = np.empty(audio.shape, dtype=np.float32)
+        for start in range(0, audio.shape[1], SOS_BLOCK_SIZE):
+            block, zi = sosfilt(sos, audio[:, start:start + SOS_BLOCK_SIZE], axis=-1, zi=zi)
+            out[:, start:start + SOS_BLOCK_SIZE] = block
+        self._zi = zi
+        return out
+
+def optimize_stages(stages: tuple) -> tuple:
+    """
+    Rewrites validated stages into fewer rendering passes.
+
+    1. Drops stages that provably do nothing (0 dB gain or EQ gain, mix 0
+       modulation/delay, ratio-1 compressor).
+    2. Merges adjacent gain stages into one.
+    3. Groups runs of two or more linear stages (shelves, peaks, gains)
+       into one 'sos' segment; everything else stays in 'board' segments.
+
+    Args:
+        stages: Stages as returned by audio_processor.validate_chain.
+
+    Returns:
+        tuple: (segments, report) where segments is a tuple of Segment and
+            report a dict with the removed stages, merged gains, fused runs
+            and the number of eliminated passes.
+    """
+    removed = []
+    kept = []
+    merged_gains = 0
+    for effect_type, params in stages:
+        param_dict = dict(params)
+        reason = _noop_reason(effect_type, param_dict)
+        if reason:
+            removed.append(f"{effect_type} ({reason})")
+            continue
+        if effect_type == "gain" and kept and kept[-1][0] == "gain":
+            total = dict(kept[-1][1])["gain_db"] + param_dict["gain_db"]
+            kept[-1] = ("gain", (("gain_db", total),))
+            merged_gains += 1
+            continue
+        kept.append((effect_type, params))
+    # A merge can cancel out (e.g. +6 dB then -6 dB)
+    for i in reversed(range(len(kept))):
+        if kept[i][0] == "gain" and kept[i][1][0][1] == 0.0:
+            removed.append("gain (merged to 0 dB)")
+            del kept[i]
+
+    segments = []
+    run = []
+    fused = []
+    for stage in kept + [None]:
+        if stage is not None and stage[0] in LINEAR_STAGES:
+            run.append(stage)
+            continue
+        if len(run) >= 2:
+            segments.append(Segment("sos", tuple(run)))
+            fused.append(len(run))
+        elif run:
+            segments.append(Segment("board", tuple(run)))
+        run = []
+        if stage is not None:
+            segments.append(Segment("board", (stage,)))
+
+    # Consecutive plugin stages share one Pedalboard
+    merged = []
+    for segment in segments:
+        if merged and merged[-1].kind == segment.kind == "board":
+            merged[-1] = Segment("board", merged[-1].stages + segment.stages)
+        else:
+            merged.append(segment)
+
+    passes = sum(len(s.stages) if s.kind == "board" else 1 for s in merged)
+    report = {
+        "stages": len(stages),
+        "passes": passes,
+        "eliminated": len(stages) - passes,
+        "removed": removed,
+        "merged_gains": merged_gains,
+        "fused": fused,
+    }
+    return tuple(merged), report
+
+def describe(report: dict) -> str:
+    """One-line summary of an optimize_stages() report."""
+    parts = [f"{report['stages']} stages -> {report['passes']} passes ({report['eliminated']} eliminated)"]
+    if report["removed"]:
+        parts.append("removed " + ", ".join(report["removed"]))
+    if report["merged_gains"]:
+        parts.append(f"merged {report['merged_gains']} gain stages into their neighbours")
+    if report["fused"]:
+        parts.append(f"fused {sum(report['fused'])} linear stages into {len(report['fused'])} biquad cascade(s)")
+    return "; ".join(parts)
@@ -1,28 +1,227 @@
 import argparse
-from audio_analyzer import analyze_audio
+import csv
 import json
+import os
+import sys
 
-def main():
-    parser = argparse.ArgumentParser(description="Compare audio analysis of two files.")
-    parser.add_argument("file1", help="First audio file")
-    parser.add_argument("file2", help="Second audio file")
-    args = parser.parse_args()
+AUDIO_EXTENSIONS = {".wav", ".flac", ".ogg", ".aif", ".aiff", ".mp3"}
+
+# Numeric analysis features compared in batch mode (column order of the results)
+FEATURES = (
+    "duration_seconds",
+    "sample_rate",
+    "tempo_bpm",
+    "avg_loudness_rms",
+    "spectral_centroid_brightness",
+    "zero_crossing_rate",
+    "spectral_bandwidth",
+)
+
+def pair_files(before_dir: str, after_dir: str) -> list:
+    """
+    Pairs audio files of two directory trees by relative path, ignoring the extension.
+
+    Returns:
+        list: (name, before_path, after_path) tuples sorted by name.
+    """
+    def index(root):
+        files = {}
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                stem, ext = os.path.splitext(name)
+                if ext.lower() in AUDIO_EXTENSIONS:
+                    rel = os.path.relpath(os.path.join(dirpath, stem), root)
+                    files.setdefault(rel, os.path.join(dirpath, name))
+        return files
+
+    before, after = index(before_dir), index(after_dir)
+    return [(name, before[name], after[name]) for name in sorted(set(before) & set(after))]
+
+def compare_features(pairs: list, features: dict) -> dict:
+    """
+    Stacks the features of each pair into arrays and computes the deltas.
+
+    Pairs where either analysis failed are left out and listed under 'failed'.
+
+    Returns:
+        dict: names, before_paths, after_paths, features, and (pairs x features)
+            arrays before, after, delta and rel_delta, plus failed.
+    """
+    import numpy as np
+
+    rows, failed = [], []
+    for name, before_path, after_path in pairs:
+        a, b = features[before_path], features[after_path]
+        if "error" in a or "error" in b:
+            failed.append({"name": name, "error": a.get("error") or b.get("error")})
+            continue
+        rows.append((name, before_path, after_path,
+                     [a.get(f, np.nan) for f in FEATURES], [b.get(f, np.nan) for f in FEATURES]))
+
+    before = np.array([r[3] for r in rows], dtype=np.float64).reshape(len(rows), len(FEATURES))
+    after = np.array([r[4] for r in rows], dtype=np.float64).reshape(len(rows), len(FEATURES))
+    delta = after - before
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rel_delta = np.where(before != 0, delta / np.abs(before), np.nan)
+
+    return {
+        "names": [r[0] for r in rows],
+        "before_paths": [r[1] for r in rows],
+        "after_paths": [r[2] for r in rows],
+        "features": list(FEATURES),
+        "before": before,
+        "after": after,
+        "delta": delta,
+        "rel_delta": rel_delta,
+        "failed": failed,
+    }
+
+def summarize(result: dict) -> dict:
+    """Per-feature summary statistics of the deltas (NaNs ignored)."""
+    import numpy as np
+
+    delta, rel = result["delta"], result["rel_delta"]
+    if len(delta) == 0:
+        return {}
+    with np.errstate(all="ignore"):
+        stats = {
+            "mean": np.nanmean(delta, axis=0),
+            "std": np.nanstd(delta, axis=0),
+            "min": np.nanmin(delta, axis=0),
+            "median": np.nanmedian(delta, axis=0),
+            "p95": np.nanpercentile(delta, 95, axis=0),
+            "max": np.nanmax(delta, axis=0),
+            "mean_rel": np.nanmean(rel, axis=0),
+        }
+    return {feature: {name: round(float(values[j]), 6) for name, values in stats.items()}
+            for j, feature in enumerate(result["features"])}
+
+def write_results(path: str, result: dict, summary: dict) -> None:
+    """Writes the comparison as CSV (one row per pair) or as columnar arrays in a .npz."""
+    import numpy as np
+
+    if path.lower().endswith(".npz"):
+        stat_names = list(next(iter(summary.values())).keys()) if summary else []
+        np.savez_compressed(
+            path,
+            names=np.array(result["names"]),
+            before_paths=np.array(result["before_paths"]),
+            after_paths=np.array(result["after_paths"]),
+            features=np.array(result["features"]),
+            before=result["before"],
+            after=result["after"],
+            delta=result["delta"],
+            rel_delta=result["rel_delta"],
+            summary_stats=np.array(stat_names),
+            summary=np.array([[summary[f][s] for s in stat_names] for f in result["features"]]) if summary else np.empty((0, 0)),
+        )
+        return
 
-    print(f"Analyzing {args.file1}...")
-    res1 = analyze_audio(args.file1)
-    
-    print(f"Analyzing {args.file2}...")
-    res2 = analyze_audio(args.file2)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        header = ["name", "before_path", "after_path"]
+        for feature in result["features"]:
+            header += [f"{feature}_before", f"{feature}_after", f"{feature}_delta"]
+        writer.writerow(header)
+        for i, name in enumerate(result["names"]):
+            row = [name, result["before_paths"][i], result["after_paths"][i]]
+            for j in range(len(result["features"])):
+                row += [result["before"][i, j], result["after"][i, j], round(float(result["delta"][i, j]), 6)]
+            writer.writerow(row)
+
+def compare_two(file1: str, file2: str, cache=None) -> None:
+    """Prints the side-by-side feature table of two files."""
+    from analysis_cache import analyze_files
+
+    print(f"Analyzing {file1} and {file2}...")
+    features = analyze_files([file1, file2], cache=cache, workers=2)
+    res1, res2 = features[file1], features[file2]
 
     print("\nComparison:")
-    print(f"{'Feature':<30} | {'File 1':<20} | {'File 2':<20}")
-    print("-" * 76)
-    
+    print(f"{'Feature':<30} | {'File 1':<20} | {'File 2':<20} | {'Delta':<12}")
+    print("-" * 91)
+
     all_keys = set(res1.keys()) | set(res2.keys())
     for key in sorted(all_keys):
         val1 = res1.get(key, "N/A")
         val2 = res2.get(key, "N/A")
-        print(f"{key:<30} | {str(val1):<20} | {str(val2):<20}")
+        delta = ""
+        if isinstance(val1, (int, float)) and isinstance(val2, (int, float)):
+            delta = round(val2 - val1, 4)
+        print(f"{key:<30} | {str(val1):<20} | {str(val2):<20} | {str(delta):<12}")
+
+def compare_dirs(before_dir: str, after_dir: str, output: str = None, cache=None, workers: int = None,
+                 duration_limit: float = 30.0) -> dict:
+    """
+    Compares every matching before/after pair of two directories.
+
+    Returns:
+        dict: The compare_features() result with a 'summary' entry added.
+    """
+    from analysis_cache import analyze_files
+
+    pairs = pair_files(before_dir, after_dir)
+    print(f"Found {len(pairs)} before/after pairs.")
+    paths = [p for _, before, after in pairs for p in (before, after)]
+    features = analyze_files(paths, cache=cache, workers=workers, duration_limit=duration_limit)
+
+    result = compare_features(pairs, features)
+    result["summary"] = summarize(result)
+    if output:
+        write_results(output, result, result["summary"])
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare audio analysis of two files, or of before/after directories.")
+    parser.add_argument("file1", nargs="?", help="First audio file")
+    parser.add_argument("file2", nargs="?", help="Second audio file")
+    parser.add_argument("--before", help="Directory of original files (batch mode)")
+    parser.add_argument("--after", help="Directory of processed files, matched to --before by relative path")
+    parser.add_argument("--output", help="Write per-pair results to this .csv or .npz file (batch mode)")
+    parser.add_argument("--summary-json", help="Write the per-feature delta statistics to this JSON file (batch mode)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--duration-limit", type=float, default=30.0, help="Seconds analyzed per file")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the per-file analysis cache")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the analysis cache")
+    args = parser.parse_args()
+
+    batch = bool(args.before or args.after)
+    if batch and not (args.before and args.after):
+        parser.error("--before and --after must be given together")
+    if not batch and not (args.file1 and args.file2):
+        parser.error("give two files, or --before and --after directories")
+
+    # Imported after argument parsing so --help and usage errors stay instant
+    from analysis_cache import AnalysisCache, DEFAULT_ANALYSIS_CACHE_DIR
+    cache = None if args.no_cache else AnalysisCache(args.cache_dir or DEFAULT_ANALYSIS_CACHE_DIR)
+
+    if not batch:
+        compare_two(args.file1, args.file2, cache=cache)
+        return
+
+    for directory in (args.before, args.after):
+        if not os.path.isdir(directory):
+            print(f"Error: Directory '{directory}' not found.")
+            sys.exit(1)
+
+    result = compare_dirs(args.before, args.after, args.output, cache=cache, workers=args.workers,
+                          duration_limit=args.duration_limit)
+
+    print(f"\nCompared {len(result['names'])} pairs ({len(result['failed'])} failed).")
+    if result["summary"]:
+        print(f"{'Feature':<30} | {'Mean delta':<12} | {'Median':<12} | {'Std':<12} | {'Mean rel':<9}")
+        print("-" * 85)
+        for feature, stats in result["summary"].items():
+            print(f"{feature:<30} | {stats['mean']:<12} | {stats['median']:<12} | {stats['std']:<12} | {stats['mean_rel']:<9}")
+    for entry in result["failed"]:
+        print(f"  Failed: {entry['name']}: {entry['error']}")
+    if cache is not None:
+        print(f"Analysis cache: {cache.stats()}")
+    if args.output:
+        print(f"Results written to '{args.output}'")
+    if args.summary_json:
+        with open(args.summary_json, "w") as f:
+            json.dump({"pairs": len(result["names"]), "failed": result["failed"], "summary": result["summary"]}, f, indent=2)
 
 if __name__ == "__main__":
     main()
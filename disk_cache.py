@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get("FX_CACHE_DIR", ".cache")
+
+def hash_key(*parts) -> str:
+    """Returns a stable SHA-256 hex key for any JSON-serialisable parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class DiskCache:
+    """
+    Content-addressed cache stored as a plain directory of JSON files.
+
+    Each entry lives in <directory>/<key[:2]>/<key>.json and is written via a
+    temp file + rename, so concurrent processes never see partial entries.
+    A file's mtime is refreshed on every hit and doubles as its last-used
+    time for LRU and idle-age eviction. Counters are guarded by a lock, and
+    the entry count and size are a running tally (scanned once on start and
+    resynced on every eviction pass), so stats() never walks the directory.
+    """
+
+    def __init__(self, directory: str, max_entries: int = None, max_bytes: int = None, max_age_seconds: float = None,
+                 evict_every: int = 1):
+        """
+        Args:
+            directory: Cache directory (created if missing).
+            max_entries: Keep at most this many entries (least recently used go first).
+            max_bytes: Keep the total size of entries under this many bytes.
+            max_age_seconds: Drop entries not used for this many seconds.
+            evict_every: Apply the limits on every Nth put (eviction scans the
+                whole directory, so large caches should not do it on every write).
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.evict_every = max(1, evict_every)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        entries = self._entries()
+        self._count = len(entries)
+        self._bytes = sum(size for _, size, _ in entries)
+
+    def __getstate__(self):
+        # Locks cannot be pickled; worker processes get their own
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def count(self, hits: int = 0, misses: int = 0) -> None:
+        """Adjusts the hit/miss counters (e.g. for lookups done in another process)."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str):
+        """Returns the cached value for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            if self.max_age_seconds is not None and time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                self._remove(path)
+                self.count(misses=1)
+                return None
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.count(misses=1)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.count(hits=1)
+        return entry["value"]
+
+    def put(self, key: str, value) -> None:
+        """Stores a JSON-serialisable value under key and applies the eviction policy."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"key": key, "created_at": time.time(), "value": value}
+        # Unique per process and thread, so concurrent writers never share a temp file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        size = os.path.getsize(tmp_path)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = None
+        os.replace(tmp_path, path)
+        with self._lock:
+            if replaced is None:
+                self._count += 1
+            self._bytes += size - (replaced or 0)
+            self._puts += 1
+            evict = self._puts % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self.evictions += 1
+            self._count -= 1
+            self._bytes -= size
+
+    def _entries(self) -> list:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self) -> int:
+        """
+        Applies the age, count and size limits.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        if self.max_entries is None and self.max_bytes is None and self.max_age_seconds is None:
+            return 0
+
+        before = self.evictions
+        entries = sorted(self._entries())
+        now = time.time()
+
+        if self.max_age_seconds is not None:
+            kept = []
+            for mtime, size, path in entries:
+                if now - mtime > self.max_age_seconds:
+                    self._remove(path)
+                else:
+                    kept.append((mtime, size, path))
+            entries = kept
+
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (
+            (self.max_entries is not None and len(entries) > self.max_entries)
+            or (self.max_bytes is not None and total_bytes > self.max_bytes)
+        ):
+            _, size, path = entries.pop(0)
+            self._remove(path)
+            total_bytes -= size
+
+        # The scan also sees entries written or removed by other processes
+        with self._lock:
+            self._count = len(entries)
+            self._bytes = total_bytes
+        return self.evictions - before
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    def stats(self) -> dict:
+        """Returns hit/miss/eviction counters for this process plus the tracked size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": self._count,
+                "bytes": self._bytes,
+            }
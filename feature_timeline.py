@@ -0,0 +1,259 @@
+import csv
+import librosa
+import numpy as np
+import soundfile as sf
+from audio_analyzer import N_FFT, HOP_LENGTH, feature_summary
+from audio_buffer import AudioBuffer
+from instrumentation import span
+
+# Columns of FeatureTimeline.values (per-window means, except the local tempo)
+FIELDS = ("rms", "spectral_centroid", "zero_crossing_rate", "spectral_bandwidth", "tempo_bpm")
+
+# Autocorrelation window of the tempogram (librosa.feature.tempo's ac_size)
+AC_SIZE_SECONDS = 8.0
+
+def tempogram_length(sr: int) -> int:
+    """Tempogram lags for a sample rate, matching librosa.feature.tempo."""
+    return int(librosa.time_to_frames(AC_SIZE_SECONDS, sr=sr, hop_length=HOP_LENGTH))
+
+def tempo_from_tempogram(tempogram: np.ndarray, sr: int, start_bpm: float = 120.0, std_bpm: float = 1.0,
+                         max_tempo: float = 320.0) -> float:
+    """
+    Picks the tempo of a time-averaged tempogram the way librosa.feature.tempo does.
+
+    Args:
+        tempogram: Autocorrelation tempogram averaged over frames, one value per lag.
+        sr: Sample rate of the analysed signal.
+
+    Returns:
+        float: Tempo in BPM.
+    """
+    bpms = librosa.tempo_frequencies(len(tempogram), hop_length=HOP_LENGTH, sr=sr)
+    with np.errstate(divide="ignore"):
+        logprior = -0.5 * ((np.log2(bpms) - np.log2(start_bpm)) / std_bpm) ** 2
+    logprior[:int(np.argmax(bpms < max_tempo))] = -np.inf
+    return float(bpms[np.argmax(np.log1p(1e6 * tempogram) + logprior)])
+
+class FeatureTimeline:
+    """
+    Per-window analysis features of a whole file.
+
+    values holds one row of FIELDS per window; the per-frame sums needed for
+    the file-level means are kept alongside, so summary() returns the same
+    dict as extract_features() without keeping any frame-level data.
+    """
+
+    def __init__(self, sample_rate: int, window_seconds: float, total_samples: int, starts: np.ndarray,
+                 frames: np.ndarray, values: np.ndarray, sums: np.ndarray, tempogram: np.ndarray):
+        """
+        Args:
+            sample_rate: Sample rate of the analysed signal.
+            window_seconds: Nominal window length.
+            total_samples: Length of the analysed signal in samples.
+            starts: First STFT frame of each window.
+            frames: Number of STFT frames in each window.
+            values: (windows, len(FIELDS)) float32 per-window features.
+            sums: Sum over all frames of rms, centroid, zcr and bandwidth (float64).
+            tempogram: Sum over all frames of the autocorrelation tempogram.
+        """
+        self.sample_rate = int(sample_rate)
+        self.window_seconds = float(window_seconds)
+        self.total_samples = int(total_samples)
+        self.starts = starts
+        self.frames = frames
+        self.values = values
+        self.sums = sums
+        self.tempogram = tempogram
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def times(self) -> np.ndarray:
+        """Start time of each window in seconds."""
+        return self.starts * HOP_LENGTH / self.sample_rate
+
+    @property
+    def duration(self) -> float:
+        return self.total_samples / self.sample_rate
+
+    def column(self, name: str) -> np.ndarray:
+        """Returns one feature over time."""
+        return self.values[:, FIELDS.index(name)]
+
+    def summary(self) -> dict:
+        """Returns the whole-file feature dict (same keys and rounding as extract_features)."""
+        n_frames = int(self.frames.sum())
+        avg_rms, avg_centroid, avg_zcr, avg_bw = (self.sums / max(n_frames, 1)).tolist()
+        tempo = tempo_from_tempogram(self.tempogram / max(n_frames, 1), self.sample_rate)
+        return feature_summary(self.duration, self.sample_rate, tempo, avg_rms, avg_centroid, avg_zcr, avg_bw)
+
+    def save(self, path: str) -> None:
+        """Writes the timeline as a .npz archive, or as CSV (one row per window) for a .csv path."""
+        if path.lower().endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["start_seconds", "frames"] + list(FIELDS))
+                for start, frames, row in zip(self.times, self.frames, self.values):
+                    writer.writerow([round(float(start), 3), int(frames)] + [round(float(v), 6) for v in row])
+            return
+        np.savez_compressed(path, sample_rate=self.sample_rate, window_seconds=self.window_seconds,
+                            total_samples=self.total_samples, starts=self.starts, frames=self.frames,
+                            values=self.values, sums=self.sums, tempogram=self.tempogram, fields=np.array(FIELDS))
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureTimeline":
+        """Reads a timeline written by save() as .npz."""
+        with np.load(path) as data:
+            return cls(int(data["sample_rate"]), float(data["window_seconds"]), int(data["total_samples"]),
+                       data["starts"], data["frames"], data["values"], data["sums"], data["tempogram"])
+
+class TimelineBuilder:
+    """
+    Incremental timeline analyzer fed with consecutive mono blocks.
+
+    Windows are cut on the STFT frame grid of the whole signal, and each one
+    is analysed with half a frame of real context on both sides, so every
+    frame comes out exactly as in a one-shot analysis. Only the current
+    window (plus that context) is held, so memory is bounded by the window
+    length and the cost is linear in the signal length.
+    """
+
+    def __init__(self, sample_rate: int, window_seconds: float = 10.0):
+        self.sample_rate = int(sample_rate)
+        self.window_seconds = float(window_seconds)
+        self.window_frames = max(1, int(round(window_seconds * sample_rate / HOP_LENGTH)))
+        self.total_samples = 0
+        self._pad = N_FFT // 2
+        # Leading zero padding of the centred frames; _buffer[0] is sample -pad
+        self._buffer = np.zeros(self._pad, dtype=np.float32)
+        self._buffer_start = -self._pad
+        self._first_sample = None
+        self._next_frame = 0
+        self._rows = []
+        self._starts = []
+        self._frames = []
+        self._sums = np.zeros(4)
+        self._tempogram = np.zeros(tempogram_length(sample_rate))
+
+    def _segment_end(self, end_frame: int) -> int:
+        """Sample index just past the last frame before end_frame."""
+        return (end_frame - 1) * HOP_LENGTH + N_FFT - self._pad
+
+    def feed(self, block: np.ndarray) -> None:
+        """Adds the next mono float32 block and analyses every window it completes."""
+        if len(block) == 0:
+            return
+        if self._first_sample is None:
+            self._first_sample = block[0]
+        self.total_samples += len(block)
+        self._buffer = np.concatenate([self._buffer, block.astype(np.float32, copy=False)])
+
+        while True:
+            end_frame = self._next_frame + self.window_frames
+            end = self._segment_end(end_frame)
+            if self._buffer_start + len(self._buffer) < end:
+                break
+            self._analyze_window(self._buffer[:end - self._buffer_start], end_frame, last=False)
+
+    def finish(self) -> FeatureTimeline:
+        """Analyses the final partial window and returns the timeline."""
+        n_frames = 1 + self.total_samples // HOP_LENGTH
+        if self.total_samples and self._next_frame < n_frames:
+            # Trailing zero padding of the centred frames
+            end = self._segment_end(n_frames)
+            tail = np.zeros(end - self._buffer_start - len(self._buffer), dtype=np.float32)
+            self._analyze_window(np.concatenate([self._buffer, tail]), n_frames, last=True)
+
+        values = np.array(self._rows, dtype=np.float32).reshape(len(self._rows), len(FIELDS))
+        return FeatureTimeline(self.sample_rate, self.window_seconds, self.total_samples,
+                               np.array(self._starts, dtype=np.int64), np.array(self._frames, dtype=np.int64),
+                               values, self._sums.copy(), self._tempogram.copy())
+
+    def _rms_zcr(self, segment: np.ndarray, n_frames: int, last: bool) -> tuple:
+        """Per-frame RMS and ZCR of a segment padded like audio_analyzer._framed_rms_zcr."""
+        starts = np.arange(n_frames) * HOP_LENGTH
+        energy = np.zeros(len(segment) + 1)
+        np.cumsum(np.square(segment, dtype=np.float64), out=energy[1:])
+        rms = np.sqrt(np.maximum(energy[starts + N_FFT] - energy[starts], 0.0) / N_FFT)
+
+        # ZCR pads with edge values instead of zeros, so no crossings come from the padding
+        edges = segment
+        lead = -self._buffer_start
+        trail = self._buffer_start + len(segment) - self.total_samples if last else 0
+        if lead > 0 or trail > 0:
+            edges = segment.copy()
+            if lead > 0:
+                edges[:lead] = self._first_sample
+            if trail > 0:
+                edges[len(segment) - trail:] = segment[len(segment) - trail - 1]
+        crossings = np.zeros(len(segment) + 1)
+        np.cumsum(librosa.zero_crossings(edges, pad=False), dtype=np.float64, out=crossings[1:])
+        zcr = (crossings[starts + N_FFT] - crossings[starts + 1]) / N_FFT
+        return rms, zcr
+
+    def _analyze_window(self, segment: np.ndarray, end_frame: int, last: bool) -> None:
+        sr = self.sample_rate
+        n_frames = end_frame - self._next_frame
+        with span("timeline_window"):
+            # The segment already carries the centring context, so no further padding
+            S = np.abs(librosa.stft(segment, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+            rms, zcr = self._rms_zcr(segment, n_frames, last)
+            cent = librosa.feature.spectral_centroid(S=S, sr=sr)[0]
+            spec_bw = librosa.feature.spectral_bandwidth(S=S, sr=sr, centroid=cent[None, :])[0]
+
+            # Local tempo from this window's onset envelope
+            mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr)
+            onset_env = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr)
+            tempogram = librosa.feature.tempogram(onset_envelope=onset_env, sr=sr, hop_length=HOP_LENGTH,
+                                                  win_length=len(self._tempogram)).mean(axis=1)
+
+        self._rows.append((rms.mean(), cent.mean(), zcr.mean(), spec_bw.mean(), tempo_from_tempogram(tempogram, sr)))
+        self._starts.append(self._next_frame)
+        self._frames.append(n_frames)
+        self._sums += (rms.sum(), cent.sum(dtype=np.float64), zcr.sum(), spec_bw.sum(dtype=np.float64))
+        self._tempogram += tempogram * n_frames
+
+        # Keep the context the next window's first frames need
+        next_start = end_frame * HOP_LENGTH - self._pad
+        self._buffer = self._buffer[next_start - self._buffer_start:].copy()
+        self._buffer_start = next_start
+        self._next_frame = end_frame
+
+def timeline_from_signal(y: np.ndarray, sr: int, window_seconds: float = 10.0) -> FeatureTimeline:
+    """Builds the timeline of an in-memory mono signal, one window at a time."""
+    builder = TimelineBuilder(sr, window_seconds)
+    step = builder.window_frames * HOP_LENGTH
+    for start in range(0, len(y), step):
+        builder.feed(y[start:start + step])
+    return builder.finish()
+
+def timeline_from_buffer(buffer: AudioBuffer, window_seconds: float = 10.0) -> FeatureTimeline:
+    """Builds the timeline of a decoded AudioBuffer, down-mixing one window at a time."""
+    builder = TimelineBuilder(buffer.sample_rate, window_seconds)
+    step = builder.window_frames * HOP_LENGTH
+    for start in range(0, buffer.frames, step):
+        builder.feed(AudioBuffer(buffer.samples[start:start + step], buffer.sample_rate).mono())
+    return builder.finish()
+
+def analyze_timeline(file_path: str, window_seconds: float = 10.0) -> FeatureTimeline:
+    """
+    Streams an audio file block by block into a FeatureTimeline.
+
+    Memory stays bounded by one window regardless of the file length.
+
+    Args:
+        file_path: Path to the audio file.
+        window_seconds: Length of each analysis window.
+
+    Returns:
+        FeatureTimeline: Per-window features; .summary() gives the analysis dict.
+    """
+    info = sf.info(file_path)
+    builder = TimelineBuilder(info.samplerate, window_seconds)
+    blocksize = builder.window_frames * HOP_LENGTH
+    for block in sf.blocks(file_path, blocksize=blocksize, dtype="float32", always_2d=True):
+        with span("decode"):
+            mono = block[:, 0] if block.shape[1] == 1 else np.mean(block, axis=1, dtype=np.float32)
+        builder.feed(mono)
+    return builder.finish()
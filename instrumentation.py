@@ -0,0 +1,162 @@
+import csv
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    if sys.platform != "darwin":
+        max_rss *= 1024
+    return round(max_rss / 2 ** 20, 1)
+
+class Recorder:
+    """
+    Collects stage timings and counters for one run.
+
+    Spans with the same name are aggregated (count, total, max), so per-block
+    spans in streaming renders stay cheap. Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.values = {}
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            stage["count"] += 1
+            stage["total_seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+
+    def add(self, name: str, amount: float = 1):
+        """Increments a counter (e.g. LLM token counts)."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name: str, value):
+        """Stores a single value (e.g. the input path or chain length)."""
+        with self._lock:
+            self.values[name] = value
+
+    def report(self) -> dict:
+        wall = time.perf_counter() - self.started
+        with self._lock:
+            stages = {
+                name: {
+                    "count": s["count"],
+                    "total_seconds": round(s["total_seconds"], 6),
+                    "mean_seconds": round(s["total_seconds"] / s["count"], 6),
+                    "max_seconds": round(s["max_seconds"], 6),
+                }
+                for name, s in self.stages.items()
+            }
+            report = {
+                "wall_seconds": round(wall, 6),
+                "stages": stages,
+                "counters": dict(self.counters),
+                "values": dict(self.values),
+                "peak_rss_mb": peak_rss_mb(),
+            }
+
+        # Realtime factor: seconds of audio processed per wall-clock second
+        audio_seconds = report["counters"].get("audio_seconds")
+        if audio_seconds:
+            report["realtime_factor"] = round(audio_seconds / wall, 3) if wall else None
+            dsp = stages.get("dsp")
+            if dsp and dsp["total_seconds"]:
+                report["dsp_realtime_factor"] = round(audio_seconds / dsp["total_seconds"], 3)
+        return report
+
+    def write(self, path: str):
+        """Writes the report as JSON, or as CSV when the path ends in .csv."""
+        report = self.report()
+        if not path.lower().endswith(".csv"):
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            return
+
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "name", "count", "total_seconds", "mean_seconds", "max_seconds", "value"])
+            for name, s in report["stages"].items():
+                writer.writerow(["stage", name, s["count"], s["total_seconds"], s["mean_seconds"], s["max_seconds"], ""])
+            for name, value in report["counters"].items():
+                writer.writerow(["counter", name, "", "", "", "", value])
+            for name, value in report["values"].items():
+                writer.writerow(["value", name, "", "", "", "", value])
+            for name in ("wall_seconds", "peak_rss_mb", "realtime_factor", "dsp_realtime_factor"):
+                if report.get(name) is not None:
+                    writer.writerow(["run", name, "", "", "", "", report[name]])
+
+# Process-wide recorder used by the pipeline modules
+recorder = Recorder()
+
+def span(name: str):
+    """Times a pipeline stage on the process-wide recorder."""
+    return recorder.span(name)
+
+@contextmanager
+def profiled(kind: str = None, output_path: str = None):
+    """
+    Optionally profiles the enclosed block.
+
+    Args:
+        kind: None (no profiling), 'cprofile' or 'pyinstrument'.
+        output_path: Where to write the profile (.prof for cProfile, .html for
+            pyinstrument); printed to stdout when omitted.
+    """
+    if not kind:
+        yield
+        return
+
+    if kind == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            if output_path:
+                with open(output_path, "w") as f:
+                    f.write(profiler.output_html())
+            else:
+                print(profiler.output_text(unicode=True))
+        return
+
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        if output_path:
+            profiler.dump_stats(output_path)
+        else:
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
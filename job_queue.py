@@ -0,0 +1,527 @@
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+from llm_cache import LLMCache, DEFAULT_LLM_CACHE_DIR
+
+DEFAULT_QUEUE_PATH = "outputs/jobs.sqlite"
+
+# Job states, in pipeline order
+STATES = ("pending", "analyzing", "awaiting_llm", "rendering", "done", "failed")
+ACTIVE_STATES = ("analyzing", "awaiting_llm", "rendering")
+
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    input TEXT NOT NULL,
+    output TEXT NOT NULL UNIQUE,
+    text TEXT,
+    effects_config TEXT,
+    audio_features TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    not_before REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    error_kind TEXT,
+    audio_seconds REAL,
+    timings TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, not_before);
+"""
+
+class LeaseLost(Exception):
+    """Raised when a worker's lease on a job has expired and another worker took it."""
+
+class JobQueue:
+    """
+    Durable render-job queue in a SQLite file.
+
+    Jobs move through pending -> analyzing -> awaiting_llm -> rendering ->
+    done, or to failed. A worker claims a job under a lease, which it keeps
+    renewing while it works. If the worker dies (crash, OOM kill, lost
+    node), the lease expires and the next claim picks the job up again.
+    The analysis features and the generated chain are stored as soon as
+    they exist, so a resumed job skips the steps that already finished.
+    Claims use BEGIN IMMEDIATE, so any number of processes, on one host or
+    on several hosts sharing the file (with working POSIX locks), can pull
+    from the same queue.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        """
+        Args:
+            path: SQLite file (created if missing).
+            max_attempts: Claims per job before it fails for good.
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Autocommit; multi-statement changes use explicit transactions
+        self._conn = sqlite3.connect(path, timeout=60.0, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def enqueue(self, input_path: str, output_path: str, text: str = None, effects_config: dict = None) -> bool:
+        """
+        Adds a job unless one for the same output already exists.
+
+        Returns:
+            bool: True if a new job was added.
+        """
+        cursor = self._execute(
+            "INSERT OR IGNORE INTO jobs (input, output, text, effects_config, created_at) VALUES (?, ?, ?, ?, ?)",
+            (os.path.abspath(input_path), os.path.abspath(output_path), text,
+             json.dumps(effects_config) if effects_config is not None else None, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def claim(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> dict:
+        """
+        Leases the next runnable job: pending, or active with an expired lease.
+
+        The job resumes at the first step whose result is not stored yet.
+        Jobs whose lease expired on their last attempt are failed instead.
+
+        Returns:
+            dict: The job row, or None if nothing is runnable.
+        """
+        now = time.time()
+        placeholders = ", ".join("?" * len(ACTIVE_STATES))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Crash loops (e.g. an OOM kill on every attempt) end here
+                self._conn.execute(
+                    f"UPDATE jobs SET state = 'failed', error = 'Lease expired on the last attempt', "
+                    f"error_kind = 'lease_expired', finished_at = ? "
+                    f"WHERE state IN ({placeholders}) AND lease_expires < ? AND attempts >= ?",
+                    (now, *ACTIVE_STATES, now, self.max_attempts)
+                )
+                row = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE (state = 'pending' AND not_before <= ?) "
+                    f"OR (state IN ({placeholders}) AND lease_expires < ?) ORDER BY id LIMIT 1",
+                    (now, *ACTIVE_STATES, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                if row["effects_config"]:
+                    state = "rendering"
+                elif row["audio_features"] or not row["text"]:
+                    state = "awaiting_llm"
+                else:
+                    state = "analyzing"
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "started_at = COALESCE(started_at, ?), error = NULL, error_kind = NULL WHERE id = ?",
+                    (state, worker, now + lease_seconds, now, row["id"])
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        job = dict(row)
+        job.update(state=state, worker=worker, attempts=row["attempts"] + 1, started_at=now)
+        for key in ("effects_config", "audio_features", "timings"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+    def advance(self, job: dict, state: str, lease_seconds: float = DEFAULT_LEASE_SECONDS, **fields) -> None:
+        """
+        Moves a leased job to its next state, storing step results (JSON-encoded) with it.
+
+        Raises:
+            LeaseLost: If the job is no longer leased by this worker.
+        """
+        columns = ["state = ?", "lease_expires = ?"]
+        params = [state, time.time() + lease_seconds]
+        for key, value in fields.items():
+            columns.append(f"{key} = ?")
+            params.append(json.dumps(value) if key in ("effects_config", "audio_features", "timings") else value)
+        if state in ("done", "failed"):
+            columns.append("finished_at = ?")
+            params.append(time.time())
+        cursor = self._execute(f"UPDATE jobs SET {', '.join(columns)} WHERE id = ? AND worker = ? AND state = ?",
+                               (*params, job["id"], job["worker"], job["state"]))
+        if cursor.rowcount != 1:
+            raise LeaseLost(f"Job {job['id']} is no longer leased by {job['worker']}")
+        job["state"] = state
+        job.update(fields)
+
+    def renew(self, job: dict, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extends a lease; returns False if the job was taken over meanwhile."""
+        placeholders = ", ".join("?" * len(ACTIVE_STATES))
+        cursor = self._execute(f"UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND state IN ({placeholders})",
+                               (time.time() + lease_seconds, job["id"], job["worker"], *ACTIVE_STATES))
+        return cursor.rowcount == 1
+
+    def fail(self, job: dict, error: str, kind: str, retry_delay: float = None) -> bool:
+        """
+        Records a failure; the job goes back to pending while it has attempts left.
+
+        Args:
+            retry_delay: Seconds before the retry may be claimed (default: exponential backoff).
+
+        Returns:
+            bool: True if the job will be retried.
+        """
+        retry = job["attempts"] < self.max_attempts
+        if retry_delay is None:
+            retry_delay = min(300.0, 5.0 * 2 ** (job["attempts"] - 1))
+        try:
+            if retry:
+                self.advance(job, "pending", error=error, error_kind=kind, not_before=time.time() + retry_delay)
+            else:
+                self.advance(job, "failed", error=error, error_kind=kind)
+        except LeaseLost:
+            return False
+        return retry
+
+    def requeue(self, states: tuple = ("failed",)) -> int:
+        """Puts jobs in the given states back to pending with fresh attempts; returns how many."""
+        placeholders = ", ".join("?" * len(states))
+        cursor = self._execute(
+            f"UPDATE jobs SET state = 'pending', attempts = 0, not_before = 0, worker = NULL, lease_expires = NULL "
+            f"WHERE state IN ({placeholders})", tuple(states)
+        )
+        return cursor.rowcount
+
+    def needs_llm(self) -> int:
+        """Number of unfinished jobs that still need an LLM call."""
+        return self._execute("SELECT COUNT(*) FROM jobs WHERE effects_config IS NULL "
+                             "AND state NOT IN ('done', 'failed')").fetchone()[0]
+
+    def counts(self) -> dict:
+        rows = self._execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        counts = {state: 0 for state in STATES}
+        counts.update({row["state"]: row["n"] for row in rows})
+        return counts
+
+    def report(self, slowest: int = 10) -> dict:
+        """
+        Summarises the queue: state counts, throughput, slowest jobs and failure breakdown.
+
+        Throughput covers the span from the first job start to the last
+        finish, so it reflects all workers together.
+        """
+        done = [dict(row) for row in self._execute(
+            "SELECT id, input, output, attempts, audio_seconds, timings, started_at, finished_at FROM jobs "
+            "WHERE state = 'done'").fetchall()]
+        report = {"counts": self.counts(), "throughput": None, "slowest": [], "failures": {}}
+
+        if done:
+            first = self._execute("SELECT MIN(started_at) FROM jobs WHERE started_at IS NOT NULL").fetchone()[0]
+            last = max(job["finished_at"] for job in done)
+            span_seconds = max(last - first, 1e-9)
+            audio_seconds = sum(job["audio_seconds"] or 0.0 for job in done)
+            report["throughput"] = {
+                "span_seconds": round(span_seconds, 3),
+                "jobs_per_minute": round(60 * len(done) / span_seconds, 2),
+                "audio_seconds_per_second": round(audio_seconds / span_seconds, 2),
+                "retried_jobs": sum(job["attempts"] > 1 for job in done),
+            }
+            for job in done:
+                job["timings"] = json.loads(job["timings"]) if job["timings"] else {}
+                job["seconds"] = round(sum(job["timings"].values()), 3)
+            report["slowest"] = [
+                {key: job[key] for key in ("id", "input", "seconds", "audio_seconds", "attempts", "timings")}
+                for job in sorted(done, key=lambda job: -job["seconds"])[:slowest]
+            ]
+
+        for row in self._execute(
+            "SELECT error_kind, COUNT(*) AS n, MAX(error) AS example FROM jobs "
+            "WHERE error_kind IS NOT NULL GROUP BY error_kind ORDER BY n DESC").fetchall():
+            report["failures"][row["error_kind"]] = {"count": row["n"], "example": row["example"]}
+        return report
+
+class Heartbeat:
+    """Renews a job's lease from a background thread while the worker runs it."""
+
+    def __init__(self, queue: JobQueue, job: dict, lease_seconds: float):
+        self.queue = queue
+        self.job = job
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            if not self.queue.renew(self.job, self.lease_seconds):
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def temp_output_path(output_path: str, token: str) -> str:
+    """A hidden temp path next to the output, keeping its extension so the format is detected."""
+    directory, name = os.path.split(output_path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.{token}.tmp{ext}")
+
+def process_job(queue: JobQueue, job: dict, lease_seconds: float = DEFAULT_LEASE_SECONDS, cache=None,
+                analysis_cache=None, stream: bool = False) -> dict:
+    """
+    Runs one leased job from its current state to done.
+
+    The output is rendered to a temp file and renamed into place, so a
+    crash never leaves a partial output and a re-run simply replaces it.
+
+    Args:
+        stream: Render block by block (and analyze only the analysis window),
+            for files too long to hold in memory.
+
+    Returns:
+        dict: Per-step timings.
+    """
+    from audio_analyzer import analyze_audio, analyze_buffer
+    from audio_buffer import AudioBuffer
+    from audio_processor import compile_chain
+    from chain_generator import generate_effects_config
+
+    timings = {}
+    t = time.perf_counter()
+    buffer = None
+    if not stream:
+        buffer = AudioBuffer.from_file(job["input"])
+        timings["decode"] = round(time.perf_counter() - t, 4)
+        t = time.perf_counter()
+
+    if job["state"] == "analyzing":
+        if buffer is None:
+            features = analyze_audio(job["input"], cache=analysis_cache)
+        else:
+            features = analyze_buffer(buffer, cache=analysis_cache)
+        timings["analysis"] = round(time.perf_counter() - t, 4)
+        t = time.perf_counter()
+        # A failed analysis is stored as {} so the resumed job prompts from the text alone
+        queue.advance(job, "awaiting_llm", lease_seconds, audio_features={} if "error" in features else features)
+
+    if job["state"] == "awaiting_llm":
+        effects_config, _ = generate_effects_config(job["text"], job["audio_features"] or None, cache=cache)
+        timings["llm"] = round(time.perf_counter() - t, 4)
+        t = time.perf_counter()
+        queue.advance(job, "rendering", lease_seconds, effects_config=effects_config)
+
+    chain = compile_chain(job["effects_config"])
+    for warning in chain.warnings:
+        print(f"Warning: job {job['id']}: {warning}")
+    os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+    tmp_path = temp_output_path(job["output"], uuid.uuid4().hex[:8])
+    try:
+        if buffer is None:
+            chain.render_file_streaming(job["input"], tmp_path)
+            audio_seconds = None
+        else:
+            chain.render_buffer(buffer, tmp_path)
+            audio_seconds = buffer.duration
+        os.replace(tmp_path, job["output"])
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    timings["render"] = round(time.perf_counter() - t, 4)
+
+    if audio_seconds is None:
+        import soundfile as sf
+        audio_seconds = sf.info(job["output"]).duration
+    queue.advance(job, "done", lease_seconds, timings=timings, audio_seconds=round(audio_seconds, 3),
+                  error=None, error_kind=None)
+    return timings
+
+def run_worker(queue_path: str, worker_id: str = None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+               max_attempts: int = DEFAULT_MAX_ATTEMPTS, poll_seconds: float = 2.0, exit_when_idle: bool = True,
+               max_jobs: int = None, cache_dir: str = DEFAULT_LLM_CACHE_DIR, no_cache: bool = False,
+               stream: bool = False, verbose: bool = False) -> dict:
+    """
+    Pulls and runs jobs until the queue is drained (or forever with exit_when_idle=False).
+
+    Returns:
+        dict: Counts of jobs done, retried and failed by this worker.
+    """
+    from analysis_cache import AnalysisCache
+
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(queue_path, max_attempts)
+    cache = None if no_cache else LLMCache(cache_dir)
+    analysis_cache = None if no_cache else AnalysisCache()
+    stats = {"worker": worker_id, "done": 0, "retried": 0, "failed": 0, "lost": 0}
+
+    try:
+        while max_jobs is None or stats["done"] + stats["failed"] < max_jobs:
+            job = queue.claim(worker_id, lease_seconds)
+            if job is None:
+                counts = queue.counts()
+                if exit_when_idle and not any(counts[state] for state in ("pending",) + ACTIVE_STATES):
+                    break
+                # Retries in backoff or jobs leased by other workers may still show up
+                time.sleep(poll_seconds)
+                continue
+
+            if verbose:
+                print(f"[{worker_id}] job {job['id']} ({job['state']}, attempt {job['attempts']}): {job['input']}")
+            with Heartbeat(queue, job, lease_seconds) as heartbeat:
+                try:
+                    process_job(queue, job, lease_seconds, cache, analysis_cache, stream)
+                    stats["done"] += 1
+                    continue
+                except LeaseLost:
+                    stats["lost"] += 1
+                    continue
+                except Exception as e:
+                    stage = job["state"]
+                    error = f"{type(e).__name__}: {e}"
+                    kind = "out_of_memory" if isinstance(e, MemoryError) else f"{stage}:{type(e).__name__}"
+            if heartbeat.lost:
+                stats["lost"] += 1
+                continue
+            retried = queue.fail(job, error, kind)
+            stats["retried" if retried else "failed"] += 1
+            print(f"Warning: job {job['id']} failed in {stage} ({'will retry' if retried else 'giving up'}): {error}")
+    finally:
+        queue.close()
+    return stats
+
+def _worker_process(kwargs: dict) -> dict:
+    return run_worker(**kwargs)
+
+def print_report(report: dict) -> None:
+    counts = report["counts"]
+    print("Jobs: " + ", ".join(f"{counts[state]} {state}" for state in STATES))
+    if report["throughput"]:
+        t = report["throughput"]
+        print(f"Throughput: {t['jobs_per_minute']} jobs/min, {t['audio_seconds_per_second']}x realtime "
+              f"over {t['span_seconds']}s ({t['retried_jobs']} jobs needed retries)")
+    if report["slowest"]:
+        print("Slowest jobs:")
+        for job in report["slowest"]:
+            steps = ", ".join(f"{k} {v}s" for k, v in job["timings"].items())
+            print(f"  #{job['id']:<6} {job['seconds']:>8}s  {job['input']}  ({steps})")
+    if report["failures"]:
+        print("Failures by kind:")
+        for kind, entry in report["failures"].items():
+            print(f"  {kind:<36} {entry['count']:>5}  e.g. {entry['example']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Text-to-Audio FX durable job queue: enqueue, run workers, report.")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="SQLite queue file (share it between hosts to scale out)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("enqueue", help="Add render jobs (existing outputs in the queue are skipped)")
+    source = p.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input-dir", help="Directory of input audio files")
+    source.add_argument("--manifest", help="Text file with one input path per line")
+    source.add_argument("--csv", help="CSV with 'file' and 'text' columns (optional 'output')")
+    p.add_argument("--text", help="Description applied to every file (with --input-dir/--manifest)")
+    p.add_argument("--chain-file", help="Apply this saved effects config instead of querying the LLM")
+    p.add_argument("--output-dir", default="outputs", help="Directory for rendered files")
+
+    p = sub.add_parser("worker", help="Pull and run jobs until the queue is drained")
+    p.add_argument("--processes", type=int, default=1, help="Worker processes to start on this host")
+    p.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="Lease length; renewed while a job runs")
+    p.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Attempts per job before it fails for good")
+    p.add_argument("--max-jobs", type=int, default=None, help="Stop each process after this many jobs")
+    p.add_argument("--forever", action="store_true", help="Keep polling for new jobs instead of exiting when drained")
+    p.add_argument("--stream", action="store_true", help="Render block by block (for files too long to hold in memory)")
+    p.add_argument("--no-cache", action="store_true", help="Disable the on-disk LLM response and analysis caches")
+    p.add_argument("--cache-dir", default=DEFAULT_LLM_CACHE_DIR, help="Directory of the LLM response cache")
+    p.add_argument("--verbose", action="store_true", help="Print every claimed job")
+
+    p = sub.add_parser("report", help="Throughput, slowest jobs and failure breakdown")
+    p.add_argument("--slowest", type=int, default=10, help="Number of slowest jobs to list")
+    p.add_argument("--json", help="Also write the report to this JSON file")
+
+    p = sub.add_parser("requeue", help="Put failed jobs back to pending with fresh attempts")
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        from batch import collect_jobs
+
+        if not args.csv and not args.text and not args.chain_file:
+            parser.error("--text or --chain-file is required with --input-dir/--manifest")
+        effects_config = None
+        if args.chain_file:
+            with open(args.chain_file) as f:
+                effects_config = json.load(f)
+        queue = JobQueue(args.queue)
+        try:
+            jobs = collect_jobs(args)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        added = sum(queue.enqueue(job["input"], job["output"], job["text"], effects_config) for job in jobs)
+        print(f"Enqueued {added} new jobs ({len(jobs) - added} already queued) in '{args.queue}'")
+        print("Jobs: " + ", ".join(f"{n} {state}" for state, n in queue.counts().items()))
+
+    elif args.command == "worker":
+        queue = JobQueue(args.queue)
+        counts = queue.counts()
+        needs_llm = queue.needs_llm()
+        queue.close()
+        # Check for API key
+        if needs_llm and not os.environ.get("GROQ_API_KEY") and os.environ.get("FX_LLM_BACKEND") != "mock":
+            print("Error: GROQ_API_KEY environment variable is not set.")
+            print("Please export GROQ_API_KEY='your_api_key'")
+            sys.exit(1)
+
+        print(f"Starting {args.processes} worker(s) on {sum(counts[s] for s in ('pending',) + ACTIVE_STATES)} open jobs...")
+        kwargs = {"queue_path": args.queue, "lease_seconds": args.lease_seconds, "max_attempts": args.max_attempts,
+                  "exit_when_idle": not args.forever, "max_jobs": args.max_jobs, "cache_dir": args.cache_dir,
+                  "no_cache": args.no_cache, "stream": args.stream, "verbose": args.verbose}
+        start = time.perf_counter()
+        if args.processes == 1:
+            results = [run_worker(**kwargs)]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=args.processes) as pool:
+                results = list(pool.map(_worker_process, [kwargs] * args.processes))
+        totals = {key: sum(r[key] for r in results) for key in ("done", "retried", "failed", "lost")}
+        print(f"Workers finished in {time.perf_counter() - start:.1f}s: {totals['done']} done, "
+              f"{totals['retried']} retried, {totals['failed']} failed, {totals['lost']} leases lost")
+
+    elif args.command == "report":
+        report = JobQueue(args.queue).report(args.slowest)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+
+    elif args.command == "requeue":
+        print(f"Requeued {JobQueue(args.queue).requeue()} failed jobs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import math
+import os
+from disk_cache import DiskCache, DEFAULT_CACHE_DIR, hash_key
+
+DEFAULT_LLM_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "llm")
+
+class LLMCache(DiskCache):
+    """
+    On-disk cache of LLM effect-chain responses.
+
+    Entries are keyed by a hash of (model, temperature, full prompt), where
+    the prompt is a string or the complete message list (system prefix
+    included), so a repeated job with the same description and features never
+    touches the network. Each entry stores the raw response and the parsed config.
+    """
+
+    def __init__(self, directory: str = DEFAULT_LLM_CACHE_DIR, max_entries: int = 10000,
+                 max_bytes: int = 100 * 1024 * 1024, max_age_seconds: float = 30 * 24 * 3600):
+        super().__init__(directory, max_entries=max_entries, max_bytes=max_bytes, max_age_seconds=max_age_seconds)
+
+    @staticmethod
+    def key_for(prompt: str, model: str, temperature: float) -> str:
+        return hash_key("llm", model, float(temperature), prompt)
+
+    def lookup(self, prompt: str, model: str, temperature: float):
+        """
+        Returns:
+            tuple: (effects_config, raw_response) on a hit, or None on a miss.
+        """
+        entry = self.get(self.key_for(prompt, model, temperature))
+        if entry is None:
+            return None
+        return entry["effects_config"], entry["response"]
+
+    def store(self, prompt: str, model: str, temperature: float, response_text: str, effects_config: dict) -> None:
+        self.put(self.key_for(prompt, model, temperature), {
+            "model": model,
+            "temperature": temperature,
+            "response": response_text,
+            "effects_config": effects_config,
+        })
+
+# Bucket widths for the semantic cache mode: features are snapped to these
+# grids before the prompt is built, so near-identical analyses share a key.
+DEFAULT_BUCKET_WIDTHS = {
+    "duration_seconds": 5.0,
+    "tempo_bpm": 5.0,
+    "avg_loudness_rms": 0.005,
+    "spectral_centroid_brightness": 250.0,
+    "zero_crossing_rate": 0.01,
+    "spectral_bandwidth": 250.0,
+}
+
+def quantize_features(audio_features: dict, bucket_widths: dict = None, scale: float = 1.0) -> dict:
+    """
+    Snaps numeric analysis features to configurable bucket grids.
+
+    Args:
+        audio_features: Analysis dict from analyze_audio (None passes through).
+        bucket_widths: Feature name -> bucket width (default: DEFAULT_BUCKET_WIDTHS).
+            Features without a width are copied unchanged.
+        scale: Multiplier applied to every width (e.g. 2.0 for coarser buckets,
+            0 to disable bucketing).
+
+    Returns:
+        dict: A copy of the features with bucketed values.
+    """
+    if not audio_features:
+        return audio_features
+    widths = DEFAULT_BUCKET_WIDTHS if bucket_widths is None else bucket_widths
+
+    quantized = dict(audio_features)
+    for key, width in widths.items():
+        value = quantized.get(key)
+        width = width * scale
+        if not isinstance(value, (int, float)) or width <= 0:
+            continue
+        # Round to the width's own precision to keep the prompt text stable
+        decimals = max(0, -int(math.floor(math.log10(width)))) + 1
+        quantized[key] = round(round(value / width) * width, decimals)
+    return quantized
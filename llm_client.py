@@ -1,6 +1,27 @@
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 import requests
+from requests.adapters import HTTPAdapter
 import json
+from instrumentation import recorder, span
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+DEFAULT_TEMPERATURE = 0.5
+GROQ_API_URL = os.environ.get("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class LLMRequestError(Exception):
+    """Raised when a Groq API request fails after all retries."""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 def get_api_key():
     """Retrieves the Groq API key from environment variables."""
@@ -9,43 +30,267 @@ def get_api_key():
         raise ValueError("GROQ_API_KEY environment variable not set. Please set it to use the tool.")
     return api_key
 
-def query_llama(prompt: str, model: str = "llama-3.3-70b-versatile") -> str:
+class GroqClient:
+    """
+    Pooled, thread-safe Groq chat-completions client.
+
+    A single requests.Session keeps connections alive, a semaphore caps the
+    number of in-flight requests, and 429/5xx responses or network errors are
+    retried with jittered exponential backoff (honouring Retry-After).
+    query_many() overlaps round-trips on a thread pool.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = GROQ_API_URL, max_concurrency: int = 4,
+                 max_retries: int = 4, timeout: float = 60.0, backoff_base: float = 0.5, backoff_max: float = 30.0):
+        """
+        Args:
+            api_key: Groq API key (default: GROQ_API_KEY from the environment).
+            base_url: Chat-completions endpoint (override for a local stub server).
+            max_concurrency: Maximum number of requests in flight at once.
+            max_retries: Retries after the first attempt for retryable failures.
+            timeout: Per-request timeout in seconds (connect and read).
+            backoff_base: First backoff ceiling in seconds; doubles per attempt.
+            backoff_max: Upper bound for any single wait, including Retry-After.
+        """
+        self.api_key = api_key or get_api_key()
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform over [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response) -> float:
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(self.backoff_max, max(0.0, delay))
+
+    def chat(self, payload: dict) -> dict:
+        """
+        Posts a chat-completions payload and returns the decoded JSON response.
+
+        Raises:
+            LLMRequestError: On a non-retryable status or when retries run out.
+        """
+        with span("llm_request"):
+            result = self._post_with_retries(payload).json()
+        recorder.add("llm_requests")
+        # Token accounting from the response's usage field
+        for key, value in (result.get("usage") or {}).items():
+            if key.endswith("_tokens") and isinstance(value, (int, float)):
+                recorder.add(key, value)
+        return result
+
+    def _post_with_retries(self, payload: dict, stream: bool = False):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._semaphore:
+                    response = self.session.post(self.base_url, json=payload, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = LLMRequestError(f"API request failed: {e}")
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code == 200:
+                    return response
+                error = LLMRequestError(
+                    f"API request failed with status {response.status_code}: {response.text}",
+                    status_code=response.status_code
+                )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    raise error
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+
+            if attempt == self.max_retries:
+                raise error
+            recorder.add("llm_retries")
+            time.sleep(delay)
+
+    def _payload(self, prompt, model: str, temperature: float, stream: bool = False) -> dict:
+        # A plain string is sent as a single user message
+        if isinstance(prompt, list):
+            messages = prompt
+        else:
+            messages = [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        return {
+            "messages": messages,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": 1024,
+            "top_p": 1,
+            "stream": stream,
+            "stop": None
+        }
+
+    def query(self, prompt, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE) -> str:
+        """Sends one prompt (string or message list) and returns the content of the model's response."""
+        result = self.chat(self._payload(prompt, model, temperature))
+        return result["choices"][0]["message"]["content"]
+
+    def query_stream(self, prompt, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE):
+        """
+        Sends one prompt with "stream": True and yields content deltas as they arrive.
+
+        Retries apply only until the response starts; the time to the first
+        token and to the end of the stream are recorded as separate stages.
+        """
+        start = time.perf_counter()
+        response = self._post_with_retries(self._payload(prompt, model, temperature, stream=True), stream=True)
+        recorder.add("llm_requests")
+        first = True
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                # Groq reports usage on the final chunk under x_groq
+                usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage") or {}
+                for key, value in usage.items():
+                    if key.endswith("_tokens") and isinstance(value, (int, float)):
+                        recorder.add(key, value)
+                for choice in chunk.get("choices", []):
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        if first:
+                            recorder.record("llm_first_token", time.perf_counter() - start)
+                            first = False
+                        yield content
+        finally:
+            response.close()
+            recorder.record("llm_stream", time.perf_counter() - start)
+
+    def query_many(self, prompts: list, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE,
+                   return_exceptions: bool = False) -> list:
+        """
+        Sends several prompts concurrently (bounded by max_concurrency).
+
+        Args:
+            prompts: Prompt strings or message lists.
+            model: The model identifier.
+            temperature: Sampling temperature.
+            return_exceptions: Return failures in place of their results instead of raising.
+
+        Returns:
+            list: Response contents in the same order as prompts.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="groq")
+        futures = [self._executor.submit(self.query, prompt, model, temperature) for prompt in prompts]
+
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.session.close()
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_client() -> GroqClient:
+    """
+    Returns the shared process-wide client, creating it on first use.
+
+    With FX_LLM_BACKEND=mock the client is a MockLLMClient that replays known
+    chains offline (no API key or network needed).
+    """
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None and os.environ.get("FX_LLM_BACKEND") == "mock":
+            from mock_llm import MockLLMClient
+            _default_client = MockLLMClient()
+        elif _default_client is None:
+            _default_client = GroqClient(
+                max_concurrency=int(os.environ.get("GROQ_MAX_CONCURRENCY", 4)),
+                timeout=float(os.environ.get("GROQ_TIMEOUT", 60.0))
+            )
+        return _default_client
+
+def set_client(client) -> None:
+    """
+    Replaces the shared client (e.g. with a MockLLMClient for offline runs).
+
+    Args:
+        client: Any object with GroqClient's query()/query_many()/close() methods,
+            or None to go back to a lazily created GroqClient.
+    """
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+def query_llama(prompt, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE) -> str:
     """
     Sends a prompt to the Groq API and returns the response content.
-    
+
     Args:
-        prompt: The full prompt string to send.
+        prompt: The full prompt string, or a list of chat messages (see
+            prompt_manager.build_messages).
         model: The model identifier (default: llama-3.3-70b-versatile).
-        
+        temperature: Sampling temperature (default: 0.5).
+
     Returns:
         The content of the model's response.
     """
-    api_key = get_api_key()
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "messages": [
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "model": model,
-        "temperature": 0.5,
-        "max_tokens": 1024,
-        "top_p": 1,
-        "stream": False,
-        "stop": None
-    }
-    
-    response = requests.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=data)
-    
-    if response.status_code != 200:
-        raise Exception(f"API request failed with status {response.status_code}: {response.text}")
-        
-    result = response.json()
-    return result["choices"][0]["message"]["content"]
+    return get_client().query(prompt, model=model, temperature=temperature)
+
+def query_llama_stream(prompt, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE):
+    """
+    Streams the response to a prompt through the shared client.
+
+    Yields:
+        str: Content deltas in arrival order.
+    """
+    return get_client().query_stream(prompt, model=model, temperature=temperature)
+
+def query_many(prompts: list, model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE,
+               return_exceptions: bool = False) -> list:
+    """
+    Sends several prompts concurrently through the shared client.
+
+    Returns:
+        list: Response contents in the same order as prompts.
+    """
+    return get_client().query_many(prompts, model=model, temperature=temperature, return_exceptions=return_exceptions)
@@ -8,83 +8,295 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from llm_client import query_llama
-from prompt_manager import build_prompt
-from audio_processor import apply_pedalboard_effects
-from audio_analyzer import analyze_audio
+# Only lightweight modules are imported up front; librosa (audio_analyzer),
+# pedalboard (audio_processor) and requests (llm_client) are imported where
+# they are first needed, after the arguments have been validated.
+from llm_cache import LLMCache, DEFAULT_LLM_CACHE_DIR, quantize_features
+from instrumentation import recorder, span, profiled
 
-def main():
-    parser = argparse.ArgumentParser(description="Text-to-Audio FX: Enrich audio based on text description.")
-    parser.add_argument("--input", required=True, help="Path to input audio file")
-    parser.add_argument("--text", required=True, help="Description of the desired effect")
-    parser.add_argument("--output", required=True, help="Path to save output audio file")
-    parser.add_argument("--verbose", action="store_true", help="Print debug info")
-    
-    args = parser.parse_args()
-    
-    if not os.path.exists(args.input):
-        print(f"Error: Input file '{args.input}' not found.")
-        sys.exit(1)
-        
-    # Check for API key
-    if not os.environ.get("GROQ_API_KEY"):
+def require_api_key():
+    """Exits with an error if a request is about to reach Groq without an API key."""
+    if not os.environ.get("GROQ_API_KEY") and os.environ.get("FX_LLM_BACKEND") != "mock":
         print("Error: GROQ_API_KEY environment variable is not set.")
         print("Please export GROQ_API_KEY='your_api_key'")
         sys.exit(1)
 
-    # 0. Analyze Audio
+def analyze_step(args, buffer) -> dict:
+    """Runs the audio analysis and returns the features (or None on failure)."""
+    from audio_analyzer import analyze_audio, analyze_buffer
+    from analysis_cache import AnalysisCache
+
     print(f"Analyzing audio: '{args.input}'...")
-    audio_features = analyze_audio(args.input)
+    cache = None if args.no_cache else AnalysisCache()
+    duration_limit = None if args.full_analysis else 30.0
+    if args.timeline:
+        from feature_timeline import analyze_timeline, timeline_from_buffer
+        try:
+            timeline = analyze_timeline(args.input) if buffer is None else timeline_from_buffer(buffer)
+            timeline.save(args.timeline)
+            print(f"Feature timeline ({len(timeline)} windows) saved to '{args.timeline}'")
+            audio_features = timeline.summary()
+        except Exception as e:
+            audio_features = {"error": str(e)}
+    # --stream never holds the whole file, so it only decodes the analysis window
+    elif buffer is None:
+        audio_features = analyze_audio(args.input, duration_limit, cache=cache)
+    else:
+        audio_features = analyze_buffer(buffer, duration_limit, cache=cache)
     if "error" in audio_features:
         print(f"Warning: Audio analysis failed: {audio_features['error']}")
-        audio_features = None
-    else:
-        print("Audio Analysis Results:")
-        for k, v in audio_features.items():
-            print(f"  - {k}: {v}")
+        return None
+
+    print("Audio Analysis Results:")
+    for k, v in audio_features.items():
+        print(f"  - {k}: {v}")
+
+    if args.bucket_features:
+        audio_features = quantize_features(audio_features, scale=args.bucket_scale)
+        if args.verbose:
+            print(f"Bucketed features: {audio_features}")
+    return audio_features
+
+def generate_step(args, audio_features: dict, on_chain=None) -> dict:
+    """
+    Builds the prompt and returns the effects config from the cache or the LLM.
+
+    With --stream-llm, on_chain is called with the effect chain as soon as it
+    has streamed in.
+    """
+    from llm_client import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+    from chain_generator import config_for_prompt, config_for_prompt_streaming
+    from prompt_manager import build_messages, build_prompt, estimate_tokens
 
     # 1. Generate Prompt
     print(f"Generating prompt for: '{args.text}'...")
-    prompt = build_prompt(args.text, audio_features)
-    
-    # 2. Query LLM
-    print("Querying Llama 3 via Groq...")
-    try:
-        response_text = query_llama(prompt)
+    with span("prompt_build"):
+        prompt = build_messages(args.text, audio_features, compact=args.compact_prompt, few_shot=args.few_shot)
+    if args.verbose:
+        system_tokens = estimate_tokens(prompt[0]["content"])
+        print(f"Prompt: ~{estimate_tokens(prompt)} tokens (static system prefix ~{system_tokens}); "
+              f"single-string layout: ~{estimate_tokens(build_prompt(args.text, audio_features))}")
+
+    # 2. Query LLM (or reuse a cached answer)
+    cache = None if args.no_cache else LLMCache(args.cache_dir)
+    cached = None
+    if cache is not None and not args.refresh:
+        cached = cache.lookup(prompt, DEFAULT_MODEL, DEFAULT_TEMPERATURE)
+
+    if cached is not None:
+        print("Using cached effect chain (no LLM call).")
+        effects_config, response_text = cached
+    else:
+        # Only a cache miss needs the API key
+        require_api_key()
+        print("Querying Llama 3 via Groq...")
+        # 3. Parse JSON (retrying once with a repair prompt if no JSON object can be extracted);
+        # the cache was already consulted above, so it is only written to here
+        try:
+            with span("llm"):
+                if args.stream_llm:
+                    effects_config, response_text = config_for_prompt_streaming(prompt, cache=cache, refresh=True,
+                                                                                on_chain=on_chain)
+                else:
+                    effects_config, response_text = config_for_prompt(prompt, cache=cache, refresh=True)
+        except json.JSONDecodeError as e:
+            print(f"Error parsing JSON from LLM: {e}")
+            print("Raw response was:", e.doc)
+            sys.exit(1)
+        except Exception as e:
+            print(f"Error querying LLM: {e}")
+            sys.exit(1)
+
         if args.verbose:
             print("Raw LLM Response:")
             print(response_text)
+
+    if args.verbose and cache is not None:
+        print(f"LLM cache: {cache.stats()}")
+    return effects_config
+
+def retrieval_step(args, index) -> dict:
+    """Answers from the local retrieval index when a stored description is close enough (else None)."""
+    with span("retrieval"):
+        hit = index.lookup(args.text)
+    if args.verbose:
+        print(f"Retrieval index: {index.stats()}")
+    if hit is None:
+        print("No close match in the retrieval index; asking the LLM.")
+        return None
+    effects_config, score, matched_text = hit
+    print(f"Using the stored chain for '{matched_text}' (similarity {score}; no LLM call).")
+    return effects_config
+
+def candidates_step(args, audio_features: dict, buffer) -> dict:
+    """Generates --candidates chains, scores them on an excerpt and returns the winner."""
+    from disk_cache import DiskCache
+    from nbest import best_of_n, target_direction, DEFAULT_SCORE_CACHE_DIR
+
+    require_api_key()
+    print(f"Generating {args.candidates} candidate chains and scoring them on a {args.excerpt_seconds:g}s excerpt...")
+    cache = None if args.no_cache else LLMCache(args.cache_dir)
+    score_cache = None if args.no_cache else DiskCache(DEFAULT_SCORE_CACHE_DIR, max_entries=10000)
+    try:
+        with span("candidates"):
+            effects_config, rows, timings = best_of_n(buffer, args.text, audio_features, n=args.candidates,
+                                                      excerpt_seconds=args.excerpt_seconds, cache=cache,
+                                                      score_cache=score_cache, refresh=args.refresh,
+                                                      compact=args.compact_prompt, few_shot=args.few_shot)
     except Exception as e:
-        print(f"Error querying LLM: {e}")
+        print(f"Error generating candidates: {e}")
         sys.exit(1)
-        
-    # 3. Parse JSON
-    print("Parsing parameters...")
+
+    direction = target_direction(args.text)
+    print(f"Target direction: {direction or 'none (no keyword matched; keeping the first candidate on ties)'}")
+    print(f"{'#':<3} | {'Score':<7} | {'Effects':<50} | {'Note':<12}")
+    print("-" * 80)
+    for row in rows:
+        types = ", ".join(str(e.get("type")) for e in row["effects_config"].get("effect_chain", []))
+        note = f"same as #{row['duplicate_of']}" if row["duplicate_of"] is not None else ("cached" if row["cached"] else "")
+        print(f"{row['index']:<3} | {row['score']:<7} | {types[:50]:<50} | {note:<12}")
+    print(f"LLM {timings['llm']}s, scoring {timings['scoring']}s; winner: #{rows[0]['index']}")
+    return effects_config
+
+def main():
+    parser = argparse.ArgumentParser(description="Text-to-Audio FX: Enrich audio based on text description.")
+    parser.add_argument("--input", required=True, help="Path to input audio file")
+    parser.add_argument("--text", help="Description of the desired effect (required unless --chain-file is given)")
+    parser.add_argument("--output", required=True, help="Path to save output audio file")
+    parser.add_argument("--verbose", action="store_true", help="Print debug info")
+    parser.add_argument("--chain-file", help="Apply a saved effects config (JSON) instead of querying the LLM")
+    parser.add_argument("--save-chain", help="Write the effects config used to this JSON file")
+    parser.add_argument("--skip-analysis", action="store_true", help="Do not analyze the input; prompt from the text alone")
+    parser.add_argument("--full-analysis", action="store_true", help="Analyze the whole file window by window instead of its first 30 seconds")
+    parser.add_argument("--timeline", help="Write the per-window feature timeline to this .npz or .csv file (implies --full-analysis)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk LLM response, analysis and score caches")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached LLM responses but store the fresh one")
+    parser.add_argument("--cache-dir", default=DEFAULT_LLM_CACHE_DIR, help="Directory of the LLM response cache")
+    parser.add_argument("--bucket-features", action="store_true", help="Quantize analysis features before prompting so similar takes share cache entries")
+    parser.add_argument("--bucket-scale", type=float, default=1.0, help="Multiplier on the feature bucket widths (with --bucket-features)")
+    parser.add_argument("--no-optimize", action="store_true", help="Render every stage as written instead of dropping no-ops and fusing EQ runs")
+    parser.add_argument("--stream", action="store_true", help="Render block by block with flat memory use (for long files)")
+    parser.add_argument("--block-size", type=int, default=None, help="Frames per block in --stream mode (default: 65536)")
+    parser.add_argument("--compact-prompt", action="store_true", help="Minified few-shot examples without their reasons (fewer prompt tokens)")
+    parser.add_argument("--few-shot", type=int, default=None, help="Send only the K few-shot examples most similar to --text (default: all, in the cached system prefix)")
+    parser.add_argument("--stream-llm", action="store_true", help="Stream the LLM response and start rendering as soon as the effect chain arrives")
+    parser.add_argument("--retrieval", action="store_true", help="Answer close paraphrases of known descriptions from the local retrieval index and store accepted results in it")
+    parser.add_argument("--retrieval-threshold", type=float, default=None, help="Similarity needed for a retrieval hit (default: 0.5)")
+    parser.add_argument("--candidates", type=int, default=1, help="Generate N candidate chains, score them on an excerpt and keep the best")
+    parser.add_argument("--excerpt-seconds", type=float, default=10.0, help="Excerpt length used to score --candidates")
+    parser.add_argument("--metrics", help="Write stage timings, token counts and peak memory to this file (.json or .csv)")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="Profile the whole run")
+    parser.add_argument("--profile-output", help="Where to write the profile (default: print a summary)")
+
+    args = parser.parse_args()
+
+    if not args.chain_file and not args.text:
+        parser.error("--text is required unless --chain-file is given")
+    if args.candidates > 1 and (args.stream or args.stream_llm or args.chain_file):
+        parser.error("--candidates cannot be combined with --stream, --stream-llm or --chain-file")
+
     try:
-        # cleanup markdown code blocks if present (despite instruction)
-        cleaned_response = response_text.strip()
-        if cleaned_response.startswith("```json"):
-            cleaned_response = cleaned_response[7:]
-        if cleaned_response.endswith("```"):
-            cleaned_response = cleaned_response[:-3]
-        
-        effects_config = json.loads(cleaned_response)
-        
-        if args.verbose:
-            print("Parsed Config:")
-            print(json.dumps(effects_config, indent=2))
-            
-    except json.JSONDecodeError as e:
-        print(f"Error parsing JSON from LLM: {e}")
-        print("Raw response was:", response_text)
+        with profiled(args.profile, args.profile_output):
+            run(args)
+    finally:
+        if args.metrics:
+            recorder.set("input", args.input)
+            recorder.write(args.metrics)
+            print(f"Metrics written to '{args.metrics}'")
+
+def run(args):
+    """Runs the pipeline for parsed command-line arguments."""
+    if not os.path.exists(args.input):
+        print(f"Error: Input file '{args.input}' not found.")
         sys.exit(1)
 
+    if args.chain_file:
+        print(f"Loading effect chain from '{args.chain_file}'...")
+        try:
+            with open(args.chain_file) as f:
+                effects_config = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading chain file: {e}")
+            sys.exit(1)
+
+    from audio_buffer import AudioBuffer
+    from audio_processor import apply_pedalboard_effects_to_buffer, apply_pedalboard_effects_streaming, DEFAULT_BLOCK_SIZE
+
+    # 0. Decode once; the buffer is shared by analysis and rendering
+    buffer = None
+    if not args.stream:
+        try:
+            with span("decode"):
+                buffer = AudioBuffer.from_file(args.input)
+        except Exception as e:
+            print(f"Error: Could not decode '{args.input}': {e}")
+            sys.exit(1)
+
+    index = None
+    if args.retrieval and not args.chain_file:
+        from retrieval_index import RetrievalIndex, DEFAULT_THRESHOLD
+        threshold = DEFAULT_THRESHOLD if args.retrieval_threshold is None else args.retrieval_threshold
+        index = RetrievalIndex(threshold=threshold)
+
+    # With --stream-llm the render starts as soon as the effect chain has streamed in
+    early_render = None
+    retrieved = retrieval_step(args, index) if index is not None else None
+    if retrieved is not None:
+        effects_config = retrieved
+    elif not args.chain_file:
+        audio_features = None if args.skip_analysis else analyze_step(args, buffer)
+
+        def start_early_render(effect_chain):
+            nonlocal early_render
+            from concurrent.futures import ThreadPoolExecutor
+
+            print("Effect chain received; rendering while the rest of the response arrives...")
+            executor = ThreadPoolExecutor(max_workers=1)
+            early_render = (effect_chain, executor.submit(apply_pedalboard_effects_to_buffer, buffer, args.output,
+                                                          {"effect_chain": effect_chain}, not args.no_optimize))
+            executor.shutdown(wait=False)
+
+        if args.stream_llm and buffer is not None:
+            on_chain = start_early_render
+        else:
+            on_chain = None
+        if args.candidates > 1:
+            effects_config = candidates_step(args, audio_features, buffer)
+        else:
+            effects_config = generate_step(args, audio_features, on_chain)
+
+    if args.verbose:
+        print("Parsed Config:")
+        print(json.dumps(effects_config, indent=2))
+
+    if args.save_chain:
+        with open(args.save_chain, "w") as f:
+            json.dump(effects_config, f, indent=2)
+        print(f"Effect chain saved to '{args.save_chain}'")
+
+    optimize = not args.no_optimize
+    if args.verbose and optimize:
+        from audio_processor import compile_chain
+        from chain_optimizer import describe
+        print(f"Chain optimizer: {describe(compile_chain(effects_config).optimization)}")
+
     # 4. Apply Effects
     print(f"Applying effects to '{args.input}'...")
     try:
-        success = apply_pedalboard_effects(args.input, args.output, effects_config)
+        # Always wait for an early render so a re-render never races it for the output file
+        early_success = early_render[1].result() if early_render is not None else None
+        # The streamed chain can belong to a candidate the parser later rejected; reuse it only if it is final
+        if early_render is not None and early_render[0] == effects_config.get("effect_chain"):
+            success = early_success
+        elif args.stream:
+            success = apply_pedalboard_effects_streaming(args.input, args.output, effects_config,
+                                                         block_size=args.block_size or DEFAULT_BLOCK_SIZE, optimize=optimize)
+        else:
+            success = apply_pedalboard_effects_to_buffer(buffer, args.output, effects_config, optimize=optimize)
         if success:
             print(f"Successfully saved to '{args.output}'")
+            if index is not None and retrieved is None and index.add(args.text, effects_config):
+                print(f"Stored the chain in the retrieval index ({len(index)} entries)")
             if "reason" in effects_config:
                 print(f"Effect Reasoning: {effects_config['reason']}")
     except Exception as e:
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import re
+import time
+from instrumentation import recorder, span
+from prompt_manager import estimate_tokens
+from reference_cases import replay_cases
+
+# The last 'Input: "..."' before the final 'Output:' is the current request
+_USER_TEXT_RE = re.compile(r'Input: "(.*)"\s*Output:\s*$', re.DOTALL)
+
+def user_text_from_prompt(prompt: str) -> str:
+    """Extracts the current request's description from a build_prompt() prompt."""
+    tail = prompt[prompt.rfind('Input: "'):] if 'Input: "' in prompt else prompt
+    match = _USER_TEXT_RE.search(tail)
+    return match.group(1) if match else prompt.strip()
+
+class MockLLMClient:
+    """
+    Offline stand-in for GroqClient that replays known effect chains.
+
+    A request whose description matches a replay case (case-insensitive)
+    gets that case's chain; any other request gets a case picked by a hash
+    of the description, so results are reproducible across runs. Responses
+    have the Groq shape, including an approximate 'usage' field.
+    """
+
+    def __init__(self, latency: float = 0.0, cases: list = None):
+        """
+        Args:
+            latency: Seconds to sleep per request, to simulate the network.
+            cases: (input, effects_config) pairs (default: replay_cases()).
+        """
+        self.latency = latency
+        self.cases = cases if cases is not None else replay_cases()
+        self._by_text = {text.strip().lower(): config for text, config in self.cases}
+        self.requests = 0
+
+    def respond(self, user_text: str) -> str:
+        """Returns the raw response text replayed for a description."""
+        config = self._by_text.get(user_text.strip().lower())
+        if config is None:
+            digest = hashlib.sha256(user_text.encode("utf-8")).digest()
+            config = self.cases[int.from_bytes(digest[:4], "big") % len(self.cases)][1]
+        return json.dumps(config)
+
+    def chat(self, payload: dict) -> dict:
+        """Answers a chat-completions payload like GroqClient.chat()."""
+        messages = payload["messages"]
+        prompt = messages[-1]["content"]
+        with span("llm_request"):
+            if self.latency:
+                time.sleep(self.latency)
+            content = self.respond(user_text_from_prompt(prompt))
+        self.requests += 1
+
+        usage = {"prompt_tokens": estimate_tokens(messages), "completion_tokens": estimate_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        recorder.add("llm_requests")
+        for key, value in usage.items():
+            recorder.add(key, value)
+        return {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage}
+
+    def query(self, prompt, model: str = None, temperature: float = None) -> str:
+        messages = prompt if isinstance(prompt, list) else [{"role": "user", "content": prompt}]
+        data = {"messages": messages, "model": model, "temperature": temperature}
+        return self.chat(data)["choices"][0]["message"]["content"]
+
+    def query_stream(self, prompt, model: str = None, temperature: float = None, chunk_size: int = 16):
+        """Yields the replayed response in small chunks, like a streamed completion."""
+        content = self.query(prompt, model, temperature)
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
+
+    def query_many(self, prompts: list, model: str = None, temperature: float = None,
+                   return_exceptions: bool = False) -> list:
+        return [self.query(prompt, model, temperature) for prompt in prompts]
+
+    def close(self):
+        pass
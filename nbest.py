@@ -0,0 +1,229 @@
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from audio_analyzer import extract_features
+from audio_buffer import AudioBuffer
+from audio_processor import compile_chain
+from chain_generator import parse_or_repair
+from disk_cache import DiskCache, DEFAULT_CACHE_DIR, hash_key
+from llm_client import query_many, DEFAULT_MODEL
+from preview import excerpt_of, init_worker, process_excerpt
+from prompt_manager import build_messages
+
+DEFAULT_SCORE_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, "scores")
+
+# Sampling temperature for candidates: higher than the default so the N calls differ
+CANDIDATE_TEMPERATURE = 0.9
+
+# Word stems in the request -> expected direction of each feature change
+KEYWORD_DIRECTIONS = {
+    "bright": {"spectral_centroid_brightness": 1.0},
+    "crisp": {"spectral_centroid_brightness": 1.0},
+    "air": {"spectral_centroid_brightness": 1.0, "spectral_bandwidth": 0.5},
+    "thin": {"spectral_centroid_brightness": 1.0},
+    "dark": {"spectral_centroid_brightness": -1.0},
+    "muffl": {"spectral_centroid_brightness": -1.0, "spectral_bandwidth": -0.5},
+    "underwater": {"spectral_centroid_brightness": -1.0, "spectral_bandwidth": -1.0},
+    "warm": {"spectral_centroid_brightness": -0.5},
+    "deep": {"spectral_centroid_brightness": -1.0},
+    "giant": {"spectral_centroid_brightness": -1.0},
+    "bass": {"spectral_centroid_brightness": -1.0},
+    "boom": {"spectral_centroid_brightness": -1.0},
+    "telephone": {"spectral_bandwidth": -1.0},
+    "phone": {"spectral_bandwidth": -1.0},
+    "radio": {"spectral_bandwidth": -1.0},
+    "lofi": {"spectral_bandwidth": -1.0},
+    "loud": {"avg_loudness_rms": 1.0},
+    "punch": {"avg_loudness_rms": 1.0},
+    "power": {"avg_loudness_rms": 1.0},
+    "quiet": {"avg_loudness_rms": -1.0},
+    "distant": {"avg_loudness_rms": -1.0, "spectral_centroid_brightness": -0.5},
+    "faint": {"avg_loudness_rms": -1.0},
+    "distort": {"zero_crossing_rate": 1.0},
+    "grit": {"zero_crossing_rate": 1.0},
+    "crunch": {"zero_crossing_rate": 1.0},
+    "broken": {"zero_crossing_rate": 1.0},
+    "nois": {"zero_crossing_rate": 1.0},
+    "robot": {"zero_crossing_rate": 0.5},
+    "malfunction": {"zero_crossing_rate": 1.0},
+    "smooth": {"zero_crossing_rate": -1.0},
+    "clean": {"zero_crossing_rate": -1.0},
+}
+
+def target_direction(user_text: str) -> dict:
+    """
+    Derives the intended direction of feature changes from the request's wording.
+
+    Returns:
+        dict: Feature name -> weight in [-1, 1] (empty if no keyword matched).
+    """
+    direction = {}
+    for word in re.findall(r"[a-z]+", user_text.lower().replace("lo-fi", "lofi")):
+        for stem, changes in KEYWORD_DIRECTIONS.items():
+            if word.startswith(stem):
+                for feature, weight in changes.items():
+                    direction[feature] = direction.get(feature, 0.0) + weight
+    scale = max((abs(w) for w in direction.values()), default=0.0)
+    return {feature: w / scale for feature, w in direction.items() if w} if scale else {}
+
+def feature_deltas(before: dict, after: dict) -> dict:
+    """Relative change of every numeric feature present in both analyses."""
+    deltas = {}
+    for key, old in before.items():
+        new = after.get(key)
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and not isinstance(old, bool):
+            deltas[key] = (new - old) / max(abs(old), 1e-9)
+    return deltas
+
+def score_candidate(deltas: dict, direction: dict, peak: float) -> float:
+    """
+    Scores a render: movement along the target direction, minus a clipping penalty.
+
+    Each feature's relative change is clipped to [-1, 1] so one runaway
+    feature cannot dominate.
+    """
+    score = sum(weight * float(np.clip(deltas.get(feature, 0.0), -1.0, 1.0)) for feature, weight in direction.items())
+    if peak > 1.0:
+        score -= min(1.0, peak - 1.0)
+    return round(score, 4)
+
+def generate_candidates(user_text: str, audio_features: dict = None, n: int = 4,
+                        temperature: float = CANDIDATE_TEMPERATURE, cache=None, refresh: bool = False,
+                        compact: bool = False, few_shot: int = None) -> list:
+    """
+    Asks for n candidate chains through concurrent calls.
+
+    Args:
+        cache: Optional DiskCache (e.g. the LLMCache) holding the candidate set.
+
+    Returns:
+        list: The parsed effects configs (failed or unparseable candidates dropped).
+
+    Raises:
+        RuntimeError: If no candidate could be obtained.
+    """
+    messages = build_messages(user_text, audio_features, compact=compact, few_shot=few_shot)
+    key = hash_key("nbest", DEFAULT_MODEL, float(temperature), n, messages)
+    if cache is not None and not refresh:
+        hit = cache.get(key)
+        if hit is not None:
+            return hit["candidates"]
+
+    configs = []
+    errors = []
+    for response in query_many([messages] * n, temperature=temperature, return_exceptions=True):
+        try:
+            if isinstance(response, Exception):
+                raise response
+            configs.append(parse_or_repair(messages, response, temperature=temperature)[0])
+        except Exception as e:
+            errors.append(str(e))
+    if not configs:
+        raise RuntimeError(f"No usable candidate chain: {errors[0] if errors else 'no responses'}")
+
+    if cache is not None:
+        cache.put(key, {"candidates": configs})
+    return configs
+
+def _score_worker(effects_config: dict) -> tuple:
+    processed, sample_rate, warnings = process_excerpt(effects_config)
+    mono = processed.mean(axis=0, dtype=np.float32) if processed.shape[0] > 1 else processed[0]
+    peak = float(np.max(np.abs(processed))) if processed.size else 0.0
+    return extract_features(np.ascontiguousarray(mono), sample_rate), peak, warnings
+
+def _input_identity(path: str):
+    if not path:
+        return None
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+def rank_candidates(buffer: AudioBuffer, user_text: str, candidates: list, excerpt_seconds: float = 10.0,
+                    start: float = None, workers: int = None, score_cache: DiskCache = None) -> list:
+    """
+    Renders every distinct candidate on one excerpt in parallel and scores it.
+
+    Candidates that compile to the same chain are rendered once. With a
+    score_cache, scores of (input file, excerpt, chain) survive across runs.
+
+    Returns:
+        list: One row per candidate (index, effects_config, score, deltas,
+            peak, warnings, cached, duplicate_of), best first.
+    """
+    start, excerpt = excerpt_of(buffer, excerpt_seconds, start)
+    direction = target_direction(user_text)
+    identity = _input_identity(buffer.path)
+
+    chains = [compile_chain(config) for config in candidates]
+    first_index = {}
+    for i, chain in enumerate(chains):
+        first_index.setdefault(chain, i)
+
+    results = {}
+    misses = []
+    for chain, i in first_index.items():
+        key = hash_key("score", identity, round(start, 3), excerpt_seconds, chain.stages) if identity else None
+        hit = score_cache.get(key) if score_cache is not None and key else None
+        if hit is not None:
+            results[chain] = (hit["features"], hit["peak"], hit["warnings"], True)
+        else:
+            misses.append((chain, key))
+
+    if misses:
+        with ProcessPoolExecutor(max_workers=min(len(misses), workers or os.cpu_count() or 1),
+                                 initializer=init_worker, initargs=(excerpt, buffer.sample_rate, buffer.subtype)) as pool:
+            futures = [(chain, key, pool.submit(_score_worker, chain.to_config())) for chain, key in misses]
+            # The dry excerpt is analysed here while the workers render
+            before = extract_features(np.ascontiguousarray(excerpt.mean(axis=1, dtype=np.float32)), buffer.sample_rate)
+            for chain, key, future in futures:
+                features, peak, warnings = future.result()
+                results[chain] = (features, peak, warnings, False)
+                if score_cache is not None and key:
+                    score_cache.put(key, {"features": features, "peak": peak, "warnings": warnings})
+    else:
+        before = extract_features(np.ascontiguousarray(excerpt.mean(axis=1, dtype=np.float32)), buffer.sample_rate)
+
+    rows = []
+    for i, (config, chain) in enumerate(zip(candidates, chains)):
+        features, peak, warnings, cached = results[chain]
+        deltas = feature_deltas(before, features)
+        rows.append({
+            "index": i,
+            "effects_config": config,
+            "score": score_candidate(deltas, direction, peak),
+            "deltas": {k: round(v, 4) for k, v in deltas.items()},
+            "peak": round(peak, 4),
+            "warnings": warnings,
+            "cached": cached,
+            "duplicate_of": first_index[chain] if first_index[chain] != i else None,
+        })
+    # Stable sort: ties keep the LLM's order
+    return sorted(rows, key=lambda row: -row["score"])
+
+def best_of_n(buffer: AudioBuffer, user_text: str, audio_features: dict = None, n: int = 4, output_path: str = None,
+              excerpt_seconds: float = 10.0, workers: int = None, cache=None, score_cache: DiskCache = None,
+              refresh: bool = False, compact: bool = False, few_shot: int = None) -> tuple:
+    """
+    Generates n candidates, scores them on an excerpt and renders the winner at full length.
+
+    Returns:
+        tuple: (winning effects_config, ranked rows, timings dict)
+    """
+    timings = {}
+    t = time.perf_counter()
+    candidates = generate_candidates(user_text, audio_features, n, cache=cache, refresh=refresh,
+                                     compact=compact, few_shot=few_shot)
+    timings["llm"] = round(time.perf_counter() - t, 4)
+
+    t = time.perf_counter()
+    rows = rank_candidates(buffer, user_text, candidates, excerpt_seconds, workers=workers, score_cache=score_cache)
+    timings["scoring"] = round(time.perf_counter() - t, 4)
+
+    best = rows[0]["effects_config"]
+    if output_path:
+        t = time.perf_counter()
+        compile_chain(best).render_buffer(buffer, output_path)
+        timings["render"] = round(time.perf_counter() - t, 4)
+    return best, rows, timings
@@ -0,0 +1,214 @@
+import argparse
+import copy
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import soundfile as sf
+
+from audio_buffer import AudioBuffer
+from audio_analyzer import loudest_window
+from audio_processor import EFFECT_REGISTRY, EFFECT_ALIASES, compile_chain, output_subtype
+
+# Per-worker excerpt, set once by init_worker instead of pickled per task
+_excerpt = None
+_sample_rate = None
+_subtype = None
+
+def init_worker(excerpt: np.ndarray, sample_rate: int, subtype: str):
+    """Process-pool initializer: stores the excerpt that process_excerpt() renders in this worker."""
+    global _excerpt, _sample_rate, _subtype
+    _excerpt, _sample_rate, _subtype = excerpt, sample_rate, subtype
+
+def process_excerpt(effects_config: dict) -> tuple:
+    """
+    Renders a config on this worker's excerpt (set up by init_worker).
+
+    Returns:
+        tuple: ((channels, frames) processed audio, sample rate, chain warnings)
+    """
+    chain = compile_chain(effects_config)
+    return chain.process(_excerpt.T, _sample_rate), _sample_rate, list(chain.warnings)
+
+def _render_variant(effects_config: dict, output_path: str) -> tuple:
+    start = time.perf_counter()
+    processed, _, warnings = process_excerpt(effects_config)
+    sf.write(output_path, processed.T, _sample_rate, subtype=output_subtype(_subtype, output_path))
+    return time.perf_counter() - start, warnings
+
+def excerpt_of(buffer: AudioBuffer, excerpt_seconds: float, start: float = None) -> tuple:
+    """
+    Cuts the preview excerpt from a decoded buffer.
+
+    Returns:
+        tuple: (start seconds, contiguous (frames, channels) excerpt)
+    """
+    if start is None:
+        start = loudest_window(buffer.mono(), buffer.sample_rate, excerpt_seconds)
+    first = int(start * buffer.sample_rate)
+    return start, np.ascontiguousarray(buffer.samples[first:first + int(excerpt_seconds * buffer.sample_rate)])
+
+def parse_grid(spec: str) -> tuple:
+    """
+    Parses a grid axis like 'reverb.room_size=0.2:0.9:4' or 'distortion.drive_db=5'.
+
+    With only a count, the values span the registry range for that param.
+
+    Returns:
+        tuple: (effect_type, param, values)
+    """
+    target, _, values = spec.partition("=")
+    effect_type, _, param = target.partition(".")
+    effect_type = EFFECT_ALIASES.get(effect_type.lower(), effect_type.lower())
+    spec_entry = EFFECT_REGISTRY.get(effect_type)
+    if spec_entry is None or param not in spec_entry.ranges:
+        raise ValueError(f"Unknown grid parameter '{target}'")
+
+    parts = values.split(":")
+    if len(parts) == 1:
+        low, high = spec_entry.ranges[param]
+        count = int(parts[0])
+    elif len(parts) == 3:
+        low, high, count = float(parts[0]), float(parts[1]), int(parts[2])
+    else:
+        raise ValueError(f"Grid values must be 'count' or 'low:high:count', got '{values}'")
+    return effect_type, param, [round(float(v), 4) for v in np.linspace(low, high, count)]
+
+def _set_param(effects_config: dict, effect_type: str, param: str, value: float) -> None:
+    chain = effects_config.setdefault("effect_chain", [])
+    for effect in chain:
+        name = str(effect.get("type", "")).lower()
+        if EFFECT_ALIASES.get(name, name) == effect_type:
+            effect.setdefault("params", {})[param] = value
+            return
+    chain.append({"type": effect_type, "params": {param: value}})
+
+def expand_grid(base_config: dict, grid_specs: list) -> list:
+    """
+    Builds the cartesian product of grid axes applied to a base config.
+
+    Returns:
+        list: (label, effects_config) pairs.
+    """
+    axes = [parse_grid(spec) for spec in grid_specs]
+    variants = []
+    for values in itertools.product(*[axis[2] for axis in axes]):
+        config = copy.deepcopy(base_config)
+        label_parts = []
+        for (effect_type, param, _), value in zip(axes, values):
+            _set_param(config, effect_type, param, value)
+            label_parts.append(f"{effect_type}.{param}={value}")
+        variants.append(("_".join(label_parts), config))
+    return variants
+
+def load_configs(paths: list) -> list:
+    """Loads (label, effects_config) pairs from JSON files holding a config or a list of configs."""
+    variants = []
+    for path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if isinstance(data, list):
+            variants.extend((f"{stem}_{i}", config) for i, config in enumerate(data))
+        else:
+            variants.append((stem, data))
+    return variants
+
+def render_previews(input_path: str, variants: list, output_dir: str, excerpt_seconds: float = 10.0,
+                    start: float = None, workers: int = None) -> dict:
+    """
+    Renders every variant on one shared excerpt, in parallel.
+
+    Args:
+        input_path: Source audio file.
+        variants: (label, effects_config) pairs.
+        output_dir: Directory for the rendered previews and index.json.
+        excerpt_seconds: Excerpt length.
+        start: Excerpt start in seconds (default: the loudest window).
+        workers: Number of worker processes (default: CPU count).
+
+    Returns:
+        dict: The index written to <output_dir>/index.json.
+    """
+    buffer = AudioBuffer.from_file(input_path)
+    start, excerpt = excerpt_of(buffer, excerpt_seconds, start)
+
+    os.makedirs(output_dir, exist_ok=True)
+    ext = os.path.splitext(input_path)[1] or ".wav"
+    entries = []
+    wall_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(excerpt, buffer.sample_rate, buffer.subtype)) as pool:
+        futures = []
+        for i, (label, config) in enumerate(variants):
+            safe_label = "".join(c if c.isalnum() or c in "._=-" else "_" for c in label)
+            output_path = os.path.join(output_dir, f"{i:03d}_{safe_label}{ext}")
+            futures.append(pool.submit(_render_variant, config, output_path))
+            entries.append({"label": label, "file": os.path.basename(output_path), "effects_config": config})
+
+        for entry, future in zip(entries, futures):
+            try:
+                render_time, warnings = future.result()
+                entry.update({"status": "done", "render_seconds": round(render_time, 4), "warnings": warnings})
+            except Exception as e:
+                entry.update({"status": "failed", "error": str(e)})
+
+    index = {
+        "input": input_path,
+        "excerpt_start_seconds": round(start, 3),
+        "excerpt_seconds": round(len(excerpt) / buffer.sample_rate, 3),
+        "sample_rate": buffer.sample_rate,
+        "wall_time_seconds": round(time.perf_counter() - wall_start, 3),
+        "variants": entries,
+    }
+    with open(os.path.join(output_dir, "index.json"), "w") as f:
+        json.dump(index, f, indent=2)
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Render many effect chain variants on a short excerpt, in parallel.")
+    parser.add_argument("--input", required=True, help="Path to input audio file")
+    parser.add_argument("--configs", nargs="*", default=[], help="JSON files, each an effects config or a list of them")
+    parser.add_argument("--base-config", help="JSON effects config the --grid axes are applied to (default: empty chain)")
+    parser.add_argument("--grid", action="append", default=[],
+                        help="Grid axis 'effect.param=low:high:count' or 'effect.param=count' (repeatable)")
+    parser.add_argument("--excerpt-seconds", type=float, default=10.0, help="Length of the preview excerpt")
+    parser.add_argument("--start", type=float, default=None, help="Excerpt start in seconds (default: loudest section)")
+    parser.add_argument("--output-dir", default="outputs/preview", help="Directory for previews and index.json")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Input file '{args.input}' not found.")
+        sys.exit(1)
+
+    variants = load_configs(args.configs)
+    if args.grid:
+        base_config = {"effect_chain": []}
+        if args.base_config:
+            with open(args.base_config) as f:
+                base_config = json.load(f)
+        try:
+            variants.extend(expand_grid(base_config, args.grid))
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+
+    if not variants:
+        print("Error: Nothing to render; pass --configs and/or --grid.")
+        sys.exit(1)
+
+    print(f"Rendering {len(variants)} variants...")
+    index = render_previews(args.input, variants, args.output_dir, args.excerpt_seconds, args.start, args.workers)
+    failed = [v for v in index["variants"] if v["status"] != "done"]
+    print(f"Rendered {len(index['variants']) - len(failed)} previews of {index['excerpt_seconds']}s "
+          f"(from {index['excerpt_start_seconds']}s) in {index['wall_time_seconds']}s.")
+    print(f"Index written to '{os.path.join(args.output_dir, 'index.json')}'")
+    for v in failed:
+        print(f"  Failed: {v['label']}: {v['error']}")
+
+if __name__ == "__main__":
+    main()
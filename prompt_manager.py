@@ -1,4 +1,6 @@
 import json
+import re
+from functools import lru_cache
 
 SYSTEM_INSTRUCTION = """
 You are an expert audio engineer. Your task is to translate natural language descriptions of audio effects and environments into specific parameters for a digital audio processing chain.
@@ -165,3 +167,89 @@ def build_prompt(user_text: str, audio_features: dict = None) -> str:
     prompt += f"# Current Task\n{audio_context}Input: \"{user_text}\"\nOutput:"
     
     return prompt
+
+def estimate_tokens(prompt) -> int:
+    """
+    Rough token count (~4 characters per token) of a prompt string or message list.
+
+    The API's own usage counts are recorded per request; this estimate lets
+    prompt layouts be compared offline.
+    """
+    if isinstance(prompt, list):
+        return sum(estimate_tokens(message["content"]) + 4 for message in prompt)
+    return (len(prompt) + 3) // 4
+
+def _format_example(example: dict, compact: bool) -> str:
+    if compact:
+        # Minified, and without the prose "reason" (the instruction's own example already shows that field)
+        output = {k: v for k, v in example["output"].items() if k != "reason"}
+        return f"Input: \"{example['input']}\"\nOutput: {json.dumps(output, separators=(',', ':'))}\n"
+    return f"Input: \"{example['input']}\"\nOutput: {json.dumps(example['output'])}\n\n"
+
+# Filler words ignored when matching descriptions (also used by retrieval_index)
+STOPWORDS = {"a", "an", "and", "the", "it", "is", "of", "in", "on", "to", "from", "with", "like", "make", "sound", "sounds"}
+
+def _words(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower())) - STOPWORDS
+
+def select_examples(user_text: str, k: int) -> list:
+    """
+    Picks the k few-shot examples whose descriptions share the most words
+    with the request (Jaccard similarity; ties keep the original order).
+    """
+    words = _words(user_text)
+
+    def similarity(example):
+        other = _words(example["input"])
+        return len(words & other) / len(words | other) if words | other else 0.0
+
+    ranked = sorted(FEW_SHOT_EXAMPLES, key=similarity, reverse=True)[:k]
+    return [ex for ex in FEW_SHOT_EXAMPLES if ex in ranked]
+
+@lru_cache(maxsize=8)
+def system_message(compact: bool = False, include_examples: bool = True) -> str:
+    """
+    The static prompt prefix, built once per layout.
+
+    It is byte-for-byte identical across calls, so it can be sent as the
+    system message and benefit from provider-side prompt caching.
+    """
+    instruction = SYSTEM_INSTRUCTION.strip() if compact else SYSTEM_INSTRUCTION
+    if not include_examples:
+        return instruction
+    sep = "\n" if compact else "\n\n"
+    return f"{instruction}{sep}# Examples\n" + "".join(_format_example(ex, compact) for ex in FEW_SHOT_EXAMPLES)
+
+def build_messages(user_text: str, audio_features: dict = None, compact: bool = False, few_shot: int = None) -> list:
+    """
+    Builds the chat messages: a static system prefix and a per-request user message.
+
+    Args:
+        user_text: Description of the desired effect.
+        audio_features: Optional analysis dict.
+        compact: Encode the examples as minified JSON without their "reason"
+            and trim whitespace.
+        few_shot: None sends every example in the (cacheable) system message;
+            an integer k instead sends only the k examples most similar to the
+            request, in the user message (0 sends none).
+
+    Returns:
+        list: [{"role": "system", ...}, {"role": "user", ...}]
+    """
+    system = system_message(compact, few_shot is None)
+
+    user = ""
+    if few_shot:
+        user += "# Examples\n" + "".join(_format_example(ex, compact) for ex in select_examples(user_text, few_shot))
+        user += "\n" if compact else ""
+
+    if audio_features:
+        user += "# Current Task\nAudio Analysis:\n"
+        for key, value in audio_features.items():
+            user += f"- {key}: {value}\n"
+        user += "\n"
+    else:
+        user += "# Current Task\n"
+    user += f"Input: \"{user_text}\"\nOutput:"
+
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
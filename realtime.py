@@ -0,0 +1,392 @@
+import argparse
+import json
+import os
+import queue
+import stat
+import sys
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+import numpy as np
+
+# Raw PCM sample formats (ffmpeg names) and their full-scale value
+PCM_FORMATS = {
+    "f32le": ("<f4", 1.0),
+    "s16le": ("<i2", 32768.0),
+    "s32le": ("<i4", 2147483648.0),
+}
+
+DEFAULT_BLOCK_SIZE = 512
+DEFAULT_CROSSFADE_SECONDS = 0.05
+
+def log(message: str) -> None:
+    """Status output goes to stderr; stdout carries the audio."""
+    print(message, file=sys.stderr, flush=True)
+
+class LiveChain:
+    """
+    One compiled chain's own processors, fed consecutive blocks with reset=False.
+
+    The processors are built (and warmed up with a block of silence) by
+    whichever thread creates the LiveChain, so the audio thread only ever
+    runs ready plugins.
+    """
+
+    def __init__(self, chain, sample_rate: int, channels: int, block_size: int, label: str = ""):
+        """
+        Args:
+            chain: CompiledChain to run.
+            sample_rate: Stream sample rate.
+            channels: Stream channel count.
+            block_size: Frames per block (for the warm-up).
+            label: Short description for status messages.
+        """
+        self.chain = chain
+        self.sample_rate = sample_rate
+        self.label = label
+        self.processors = chain.build_processors()
+        # The first call allocates plugin buffers; keep that off the audio path
+        self.process(np.zeros((channels, block_size), dtype=np.float32))
+        for processor in self.processors:
+            processor.reset()
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Processes a (channels, frames) float32 block, carrying state into the next one."""
+        for processor in self.processors:
+            block = processor(block, self.sample_rate, reset=False)
+        return block
+
+class ChainSwitcher:
+    """
+    Runs the current chain and swaps in new ones with a linear crossfade.
+
+    A new chain is offered from any thread and picked up at the next block
+    boundary. During the crossfade both chains process the block and the
+    output ramps from the old result to the new one; the input is the same
+    for both, so a linear ramp keeps the level steady. Offers arriving
+    mid-fade wait for it to finish, and only the newest one is kept.
+    """
+
+    def __init__(self, sample_rate: int, crossfade_seconds: float = DEFAULT_CROSSFADE_SECONDS):
+        self.fade_frames = max(1, int(round(crossfade_seconds * sample_rate)))
+        self.current = None
+        self.swaps = 0
+        self._old = None
+        self._fade_pos = None
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def offer(self, live: LiveChain) -> None:
+        with self._lock:
+            self._pending = live
+
+    @staticmethod
+    def _run(live: LiveChain, block: np.ndarray) -> np.ndarray:
+        # No chain yet means dry passthrough
+        return block if live is None else live.process(block)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        if self._fade_pos is None and self._pending is not None:
+            with self._lock:
+                pending, self._pending = self._pending, None
+            self._old, self.current = self.current, pending
+            self._fade_pos = 0
+            self.swaps += 1
+
+        out = self._run(self.current, block)
+        if self._fade_pos is not None:
+            old = self._run(self._old, block)
+            ramp = (self._fade_pos + np.arange(1, block.shape[1] + 1, dtype=np.float32)) / self.fade_frames
+            np.minimum(ramp, 1.0, out=ramp)
+            out = old + (out - old) * ramp
+            self._fade_pos += block.shape[1]
+            if self._fade_pos >= self.fade_frames:
+                self._old = None
+                self._fade_pos = None
+        return out
+
+class BlockStats:
+    """Per-block processing time against the block deadline."""
+
+    def __init__(self, block_size: int, sample_rate: int, recent: int = 4096):
+        self.deadline = block_size / sample_rate
+        self.blocks = 0
+        self.underruns = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self._recent = deque(maxlen=recent)
+
+    def record(self, seconds: float) -> None:
+        self.blocks += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+        if seconds > self.deadline:
+            self.underruns += 1
+        self._recent.append(seconds)
+
+    def summary(self) -> dict:
+        recent = np.array(self._recent) if self._recent else np.zeros(1)
+        return {
+            "blocks": self.blocks,
+            "deadline_ms": round(self.deadline * 1000, 3),
+            "mean_ms": round(self.total / max(self.blocks, 1) * 1000, 3),
+            "p99_ms": round(float(np.percentile(recent, 99)) * 1000, 3),
+            "max_ms": round(self.worst * 1000, 3),
+            "load": round(self.total / max(self.blocks, 1) / self.deadline, 3),
+            "underruns": self.underruns,
+        }
+
+class ChainLoader:
+    """
+    Turns chain requests into LiveChains on a background thread.
+
+    A request is an effects_config dict or a text description. Descriptions
+    go to the LLM (with features of the most recent input audio, if any),
+    so a slow answer only delays the swap, never the audio.
+    """
+
+    def __init__(self, switcher: ChainSwitcher, sample_rate: int, channels: int, block_size: int,
+                 cache=None, recent_audio=None, verbose: bool = False):
+        self.switcher = switcher
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.cache = cache
+        self.recent_audio = recent_audio
+        self.verbose = verbose
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, request) -> None:
+        self._requests.put(request)
+
+    def _features(self) -> dict:
+        if self.recent_audio is None:
+            return None
+        from audio_analyzer import extract_features
+
+        y = self.recent_audio.snapshot()
+        if len(y) < self.sample_rate:
+            return None
+        return extract_features(y, self.sample_rate)
+
+    def _load(self, request) -> LiveChain:
+        from audio_processor import compile_chain
+
+        start = time.perf_counter()
+        if isinstance(request, dict):
+            effects_config, label = request, "chain"
+        else:
+            from chain_generator import generate_effects_config
+
+            effects_config, _ = generate_effects_config(request, self._features(), cache=self.cache)
+            label = f"'{request}'"
+        chain = compile_chain(effects_config)
+        for warning in chain.warnings:
+            log(f"Warning: {warning}")
+        live = LiveChain(chain, self.sample_rate, self.channels, self.block_size, label)
+        if self.verbose:
+            log(f"Loaded {label} {chain!r} in {time.perf_counter() - start:.2f}s")
+        return live
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            try:
+                self.switcher.offer(self._load(request))
+            except Exception as e:
+                log(f"Warning: could not load chain ({type(e).__name__}: {e}); keeping the current one")
+
+class RecentAudio:
+    """Ring buffer of the last few seconds of mono input, for analysis-aware prompts."""
+
+    def __init__(self, seconds: float, sample_rate: int):
+        self._data = np.zeros(max(1, int(seconds * sample_rate)), dtype=np.float32)
+        self._pos = 0
+        self._filled = 0
+
+    def write(self, block: np.ndarray) -> None:
+        mono = block.mean(axis=0) if block.shape[0] > 1 else block[0]
+        n = min(len(mono), len(self._data))
+        mono = mono[-n:]
+        end = self._pos + n
+        if end <= len(self._data):
+            self._data[self._pos:end] = mono
+        else:
+            split = len(self._data) - self._pos
+            self._data[self._pos:] = mono[:split]
+            self._data[:end - len(self._data)] = mono[split:]
+        self._pos = end % len(self._data)
+        self._filled = min(self._filled + n, len(self._data))
+
+    def snapshot(self) -> np.ndarray:
+        """The buffered audio in time order (a copy)."""
+        if self._filled < len(self._data):
+            return self._data[:self._filled].copy()
+        return np.concatenate([self._data[self._pos:], self._data[:self._pos]])
+
+def parse_control_line(line: str):
+    """
+    Interprets one control line: inline JSON, a chain file path, or a text description.
+
+    Returns:
+        dict | str: An effects_config or a description, or None for blank lines.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("{"):
+        return json.loads(line)
+    if line.lower().endswith(".json") and os.path.isfile(line):
+        with open(line) as f:
+            return json.load(f)
+    return line
+
+def watch_control(path: str, loader: ChainLoader) -> None:
+    """
+    Feeds control lines to the loader forever.
+
+    A FIFO is reopened whenever its writer closes; a regular file is
+    followed from its end, so only appended lines are applied.
+    """
+    while True:
+        with open(path) as f:
+            fifo = stat.S_ISFIFO(os.fstat(f.fileno()).st_mode)
+            if not fifo:
+                f.seek(0, os.SEEK_END)
+            while True:
+                line = f.readline()
+                if not line:
+                    if fifo:
+                        break
+                    time.sleep(0.25)
+                    continue
+                try:
+                    request = parse_control_line(line)
+                except (OSError, json.JSONDecodeError) as e:
+                    log(f"Warning: ignoring control line ({e})")
+                    continue
+                if request is not None:
+                    loader.submit(request)
+
+def run_stream(infile, outfile, sample_rate: int, channels: int, pcm_format: str = "f32le",
+               block_size: int = DEFAULT_BLOCK_SIZE, switcher: ChainSwitcher = None, stats: BlockStats = None,
+               recent_audio: RecentAudio = None, stats_every: float = None) -> BlockStats:
+    """
+    Pumps raw interleaved PCM from infile to outfile through the switcher, one block at a time.
+
+    Args:
+        infile: Binary stream of input PCM (e.g. sys.stdin.buffer).
+        outfile: Binary stream for the output PCM.
+        stats_every: Log the block statistics every this many seconds of audio.
+
+    Returns:
+        BlockStats: Per-block timing of the audio path.
+    """
+    dtype, scale = PCM_FORMATS[pcm_format]
+    frame_bytes = np.dtype(dtype).itemsize * channels
+    switcher = switcher or ChainSwitcher(sample_rate)
+    stats = stats or BlockStats(block_size, sample_rate)
+    report_blocks = int(stats_every * sample_rate / block_size) if stats_every else 0
+    block = np.zeros((channels, block_size), dtype=np.float32)
+
+    while True:
+        data = infile.read(block_size * frame_bytes)
+        frames = len(data) // frame_bytes
+        if frames == 0:
+            break
+        start = time.perf_counter()
+
+        # 1. Decode into a (channels, frames) float32 block; a short final block is zero-padded
+        interleaved = np.frombuffer(data, dtype=dtype, count=frames * channels).reshape(frames, channels)
+        block[:, :frames] = interleaved.T
+        if scale != 1.0:
+            block[:, :frames] *= 1.0 / scale
+        block[:, frames:] = 0.0
+        if recent_audio is not None:
+            recent_audio.write(block[:, :frames])
+
+        # 2. Process through the current (or crossfading) chain
+        out = switcher.process(block)[:, :frames]
+
+        # 3. Encode
+        if scale != 1.0:
+            out = np.clip(np.rint(out * scale), -scale, scale - 1)
+        pcm = np.ascontiguousarray(out.T, dtype=dtype).tobytes()
+        stats.record(time.perf_counter() - start)
+
+        outfile.write(pcm)
+        outfile.flush()
+        if report_blocks and stats.blocks % report_blocks == 0:
+            s = stats.summary()
+            log(f"[realtime] {stats.blocks * block_size / sample_rate:.0f}s: mean {s['mean_ms']} ms, "
+                f"p99 {s['p99_ms']} ms of {s['deadline_ms']} ms, {s['underruns']} underruns, {switcher.swaps} swaps")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Text-to-Audio FX real-time mode: raw PCM in on stdin, processed PCM out on stdout.")
+    parser.add_argument("--sample-rate", type=int, default=48000, help="Stream sample rate")
+    parser.add_argument("--channels", type=int, default=2, help="Stream channel count")
+    parser.add_argument("--format", choices=sorted(PCM_FORMATS), default="f32le", help="Raw PCM sample format (ffmpeg name)")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="Frames per processing block")
+    parser.add_argument("--text", help="Initial effect description (loaded in the background; dry until ready)")
+    parser.add_argument("--chain-file", help="Initial effects config JSON")
+    parser.add_argument("--control", help="File or FIFO with one new chain per line: a chain file, inline JSON or a description")
+    parser.add_argument("--crossfade-ms", type=float, default=DEFAULT_CROSSFADE_SECONDS * 1000, help="Crossfade length on chain swaps")
+    parser.add_argument("--analysis-seconds", type=float, default=10.0, help="Recent input analysed for LLM prompts (0 disables)")
+    parser.add_argument("--stats-every", type=float, default=None, help="Log block timing every N seconds of audio")
+    parser.add_argument("--stats-json", help="Write the final block timing summary to this file")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk LLM response cache")
+    parser.add_argument("--verbose", action="store_true", help="Log chain loads and swaps")
+
+    args = parser.parse_args()
+
+    # Check for API key (only descriptions need the LLM)
+    if (args.text or args.control) and not os.environ.get("GROQ_API_KEY") and os.environ.get("FX_LLM_BACKEND") != "mock":
+        log("Warning: GROQ_API_KEY is not set; only chain files and inline JSON can be loaded.")
+
+    from llm_cache import LLMCache
+
+    # Hand the GIL over more often, so a background load stalls the audio thread less
+    sys.setswitchinterval(0.001)
+
+    switcher = ChainSwitcher(args.sample_rate, args.crossfade_ms / 1000)
+    recent_audio = RecentAudio(args.analysis_seconds, args.sample_rate) if args.analysis_seconds > 0 else None
+    loader = ChainLoader(switcher, args.sample_rate, args.channels, args.block_size,
+                         cache=None if args.no_cache else LLMCache(), recent_audio=recent_audio, verbose=args.verbose)
+    if args.chain_file:
+        try:
+            with open(args.chain_file) as f:
+                loader.submit(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            log(f"Error reading chain file: {e}")
+            sys.exit(1)
+    if args.text:
+        loader.submit(args.text)
+    if args.control:
+        threading.Thread(target=watch_control, args=(args.control, loader), daemon=True).start()
+
+    stats = BlockStats(args.block_size, args.sample_rate)
+    try:
+        run_stream(sys.stdin.buffer, sys.stdout.buffer, args.sample_rate, args.channels, args.format,
+                   args.block_size, switcher, stats, recent_audio, args.stats_every)
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+
+    summary = dict(stats.summary(), swaps=switcher.swaps)
+    log(f"[realtime] {summary['blocks']} blocks: mean {summary['mean_ms']} ms, p99 {summary['p99_ms']} ms, "
+        f"max {summary['max_ms']} ms against a {summary['deadline_ms']} ms deadline "
+        f"(load {summary['load']:.0%}), {summary['underruns']} underruns, {summary['swaps']} chain swaps")
+    if args.stats_json:
+        with open(args.stats_json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
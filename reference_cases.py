@@ -0,0 +1,58 @@
+from prompt_manager import FEW_SHOT_EXAMPLES
+
+# Reference descriptions and the chains expected for them: compared against
+# the LLM by test_fx_generation.py, replayed by the mock LLM and used to seed
+# the retrieval index.
+TEST_CASES = [
+    {
+        "input": "A giant speaking in a massive, echoing cave.",
+        "reasoning": "To simulate a giant, we need to emphasize low frequencies (LowShelf boost). For the cave, we need a large Reverb with long decay (high room_size). A small Delay helps simulate reflections.",
+        "expected_pedalboard_inputs": [
+            {"type": "low_shelf", "params": {"cutoff_frequency_hz": 200, "gain_db": 6.0}},
+            {"type": "reverb", "params": {"room_size": 0.9, "wet_level": 0.5}},
+            {"type": "delay", "params": {"delay_seconds": 0.3}}
+        ]
+    },
+    {
+        "input": "A broken radio transmission from a spaceship.",
+        "reasoning": "Radio requires bandwidth limiting (HighShelf cut, LowShelf cut). 'Broken' implies Distortion. 'Spaceship' might suggest some background ambience or slight Reverb/Delay, but the radio effect is dominant.",
+        "expected_pedalboard_inputs": [
+            {"type": "high_shelf", "params": {"cutoff_frequency_hz": 3000, "gain_db": -12.0}},
+            {"type": "low_shelf", "params": {"cutoff_frequency_hz": 300, "gain_db": -12.0}},
+            {"type": "distortion", "params": {"drive_db": 15.0}}
+        ]
+    },
+    {
+        "input": "An underwater announcement.",
+        "reasoning": "Water absorbs high frequencies, so aggressive HighShelf cut. LowShelf boost to make it muddy. Reverb with high damping to simulate density.",
+        "expected_pedalboard_inputs": [
+            {"type": "high_shelf", "params": {"cutoff_frequency_hz": 600, "gain_db": -20.0}},
+            {"type": "low_shelf", "params": {"cutoff_frequency_hz": 1000, "gain_db": 6.0}},
+            {"type": "reverb", "params": {"room_size": 0.4, "damping": 0.9}}
+        ]
+    },
+    {
+        "input": "A robot malfunction.",
+        "reasoning": "Robotic sounds often use Chorus or Phaser for modulation. 'Malfunction' implies Distortion or rapid stuttering (short Delay).",
+        "expected_pedalboard_inputs": [
+            {"type": "phaser", "params": {"rate_hz": 5.0, "depth": 0.8}},
+            {"type": "distortion", "params": {"drive_db": 10.0}},
+            {"type": "delay", "params": {"delay_seconds": 0.05, "feedback": 0.7}}
+        ]
+    }
+]
+
+def replay_cases() -> list:
+    """
+    Returns known (input, effects_config) pairs.
+
+    Combines the prompt's few-shot examples with the chains expected by
+    TEST_CASES.
+    """
+    cases = [(ex["input"], ex["output"]) for ex in FEW_SHOT_EXAMPLES]
+    for case in TEST_CASES:
+        cases.append((case["input"], {
+            "effect_chain": case["expected_pedalboard_inputs"],
+            "reason": case["reasoning"]
+        }))
+    return cases
@@ -0,0 +1,388 @@
+import argparse
+import json
+import os
+import socketserver
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+import numpy as np
+from audio_buffer import AudioBuffer
+from audio_analyzer import analyze_buffer, extract_features
+from audio_processor import compile_chain
+from chain_generator import generate_effects_config
+from llm_cache import LLMCache, DEFAULT_LLM_CACHE_DIR
+from analysis_cache import AnalysisCache
+
+STAGES = ("queued", "decode", "analysis", "llm", "compile", "render")
+FINAL_STATES = ("done", "failed")
+
+def warm_up() -> float:
+    """
+    Imports and exercises the heavy dependencies so the first job is fast.
+
+    Runs a dummy analysis (triggering librosa's numba compilation) and a
+    dummy render through every registry effect.
+
+    Returns:
+        float: Seconds spent warming up.
+    """
+    start = time.perf_counter()
+    sr = 22050
+    t = np.arange(3 * sr) / sr
+    y = (0.3 * np.sin(2 * np.pi * 220 * t) + 0.01 * np.random.default_rng(0).standard_normal(len(t))).astype(np.float32)
+    extract_features(y, sr)
+
+    from audio_processor import EFFECT_REGISTRY
+    # Unoptimized, so every plugin class is loaded even with its no-op defaults
+    chain = compile_chain({"effect_chain": [{"type": name, "params": {}} for name in EFFECT_REGISTRY]}, optimize=False)
+    chain.process(y[None, :], sr)
+    return time.perf_counter() - start
+
+class StageStats:
+    """Thread-safe per-stage latency samples (bounded)."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self._samples = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            samples = self._samples.setdefault(stage, [])
+            samples.append(seconds)
+            if len(samples) > self.max_samples:
+                del samples[0]
+
+    def summary(self) -> dict:
+        with self._lock:
+            result = {}
+            for stage, samples in self._samples.items():
+                if not samples:
+                    continue
+                arr = np.array(samples)
+                result[stage] = {
+                    "count": len(arr),
+                    "mean_ms": round(float(arr.mean()) * 1000, 2),
+                    "p50_ms": round(float(np.percentile(arr, 50)) * 1000, 2),
+                    "p95_ms": round(float(np.percentile(arr, 95)) * 1000, 2),
+                    "max_ms": round(float(arr.max()) * 1000, 2),
+                }
+            return result
+
+class Job:
+    """A render job whose status changes are observable as an event stream."""
+
+    def __init__(self, request: dict):
+        self.id = uuid.uuid4().hex[:12]
+        self.request = request
+        self.state = "queued"
+        self.error = None
+        self.timings = {}
+        self.result = {}
+        self.events = []
+        self.created_at = time.time()
+        self.created_perf = time.perf_counter()
+        self._cond = threading.Condition()
+        self._emit()
+
+    def _emit(self):
+        self.events.append({"job": self.id, "state": self.state, "time": round(time.time(), 3),
+                            "timings": dict(self.timings), "error": self.error})
+
+    def update(self, state: str, **fields):
+        with self._cond:
+            self.state = state
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self._emit()
+            self._cond.notify_all()
+
+    def wait_for_event(self, index: int, timeout: float = 15.0) -> list:
+        """Blocks until there are events past index (or timeout) and returns them."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > index, timeout=timeout)
+            return self.events[index:]
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "state": self.state, "error": self.error, "timings": self.timings,
+                "request": self.request, "result": self.result}
+
+class RenderService:
+    """
+    Bounded worker pool that runs decode -> analysis -> LLM -> render jobs.
+
+    Finished jobs stay queryable for job_ttl seconds, and at most
+    max_finished are kept; metrics come from running counters, so neither
+    memory nor /metrics grows with the daemon's history.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 64, cache: LLMCache = None, upload_dir: str = "inputs/uploads",
+                 analysis_cache: AnalysisCache = None, job_ttl: float = 3600.0, max_finished: int = 1000):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.cache = cache
+        self.analysis_cache = analysis_cache
+        self.upload_dir = upload_dir
+        self.stats = StageStats()
+        self.jobs = {}
+        self.job_ttl = job_ttl
+        self.max_finished = max_finished
+        self._finished = OrderedDict()
+        self._states = Counter()
+        self.completed = 0
+        self.failed = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+
+    def submit(self, request: dict) -> Job:
+        if not request.get("input") or not request.get("output"):
+            raise ValueError("'input' and 'output' are required")
+        if not request.get("text") and not request.get("effects_config"):
+            raise ValueError("Either 'text' or 'effects_config' is required")
+        with self._lock:
+            if self._pending >= self.max_queue:
+                raise OverflowError("Job queue is full")
+            self._pending += 1
+            self._prune()
+            job = Job(request)
+            self.jobs[job.id] = job
+            self._states[job.state] += 1
+        self._executor.submit(self._run, job)
+        return job
+
+    def _prune(self):
+        """Forgets finished jobs past the TTL or beyond max_finished (caller holds the lock)."""
+        cutoff = time.time() - self.job_ttl
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at >= cutoff and len(self._finished) <= self.max_finished:
+                break
+            del self._finished[job_id]
+            self.jobs.pop(job_id, None)
+
+    def _transition(self, job: Job, state: str, **fields):
+        """Moves a job to a new state, keeping the per-state counters in step."""
+        with self._lock:
+            self._states[job.state] -= 1
+            if state in FINAL_STATES:
+                self._finished[job.id] = time.time()
+                self._prune()
+            else:
+                self._states[state] += 1
+        job.update(state, **fields)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            states = {state: n for state, n in self._states.items() if n}
+            retained = len(self.jobs)
+        return {
+            "workers": self.workers,
+            "queue_depth": states.get("queued", 0),
+            "in_progress": sum(n for state, n in states.items() if state != "queued"),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retained_jobs": retained,
+            "stage_latency": self.stats.summary(),
+            # Running tallies kept by DiskCache; a scrape never walks the cache directories
+            "llm_cache": self.cache.stats() if self.cache is not None else None,
+            "analysis_cache": self.analysis_cache.stats() if self.analysis_cache is not None else None,
+        }
+
+    def _stage(self, job: Job, stage: str, started: float) -> float:
+        elapsed = time.perf_counter() - started
+        job.timings[stage] = round(elapsed, 4)
+        self.stats.record(stage, elapsed)
+        return time.perf_counter()
+
+    def _run(self, job: Job):
+        request = job.request
+        t = self._stage(job, "queued", job.created_perf)
+        try:
+            self._transition(job, "decode")
+            buffer = AudioBuffer.from_file(request["input"])
+            t = self._stage(job, "decode", t)
+
+            effects_config = request.get("effects_config")
+            if effects_config is None:
+                self._transition(job, "analysis")
+                audio_features = analyze_buffer(buffer, cache=self.analysis_cache)
+                if "error" in audio_features:
+                    audio_features = None
+                t = self._stage(job, "analysis", t)
+                job.result["audio_features"] = audio_features
+
+                self._transition(job, "llm")
+                effects_config = generate_effects_config(request["text"], audio_features, cache=self.cache,
+                                                         refresh=bool(request.get("refresh")),
+                                                         compact=bool(request.get("compact_prompt")),
+                                                         few_shot=request.get("few_shot"))[0]
+                t = self._stage(job, "llm", t)
+
+            self._transition(job, "compile")
+            chain = compile_chain(effects_config)
+            t = self._stage(job, "compile", t)
+            job.result["effects_config"] = effects_config
+            job.result["warnings"] = list(chain.warnings)
+
+            self._transition(job, "render")
+            os.makedirs(os.path.dirname(os.path.abspath(request["output"])), exist_ok=True)
+            chain.render_buffer(buffer, request["output"])
+            self._stage(job, "render", t)
+            job.result["audio_seconds"] = round(buffer.duration, 3)
+
+            with self._lock:
+                self.completed += 1
+                self._pending -= 1
+            self._transition(job, "done")
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+                self._pending -= 1
+            self._transition(job, "failed", error=str(e))
+
+    def save_upload(self, name: str, data: bytes) -> str:
+        os.makedirs(self.upload_dir, exist_ok=True)
+        name = os.path.basename(name or "upload.wav")
+        path = os.path.join(self.upload_dir, f"{uuid.uuid4().hex[:8]}_{name}")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API:
+        POST /jobs              {"input", "output", "text" | "effects_config"} -> job
+        POST /upload?name=x.wav raw audio body -> {"path"}
+        GET  /jobs/<id>         job status
+        GET  /jobs/<id>/events  newline-delimited JSON status stream until the job finishes
+        GET  /metrics           queue depth, counters and per-stage latency
+        GET  /health
+    """
+
+    service = None
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if parts == ["health"]:
+            return self._send_json(200, {"status": "ok"})
+        if parts == ["metrics"]:
+            return self._send_json(200, self.service.metrics())
+        if len(parts) >= 2 and parts[0] == "jobs":
+            job = self.service.jobs.get(parts[1])
+            if job is None:
+                return self._send_json(404, {"error": "Unknown job"})
+            if len(parts) == 3 and parts[2] == "events":
+                return self._stream_events(job)
+            return self._send_json(200, job.to_dict())
+        self._send_json(404, {"error": "Not found"})
+
+    def _stream_events(self, job: Job):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        index = 0
+        while True:
+            events = job.wait_for_event(index)
+            for event in events:
+                line = (json.dumps(event) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+            index += len(events)
+            if events and events[-1]["state"] in FINAL_STATES:
+                break
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/upload":
+            name = parse_qs(url.query).get("name", ["upload.wav"])[0]
+            path = self.service.save_upload(name, self._read_body())
+            return self._send_json(201, {"path": path})
+        if url.path == "/jobs":
+            try:
+                job = self.service.submit(json.loads(self._read_body() or b"{}"))
+            except (ValueError, json.JSONDecodeError) as e:
+                return self._send_json(400, {"error": str(e)})
+            except OverflowError as e:
+                return self._send_json(503, {"error": str(e)})
+            return self._send_json(202, job.to_dict())
+        self._send_json(404, {"error": "Not found"})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser(description="Text-to-Audio FX render service with warm imports and a JSON job API.")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind (TCP mode)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind (TCP mode)")
+    parser.add_argument("--socket", help="Serve on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=2, help="Concurrent render jobs")
+    parser.add_argument("--max-queue", type=int, default=64, help="Maximum queued + running jobs before rejecting (503)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk LLM response and analysis caches")
+    parser.add_argument("--cache-dir", default=DEFAULT_LLM_CACHE_DIR, help="Directory of the LLM response cache")
+    parser.add_argument("--job-ttl", type=float, default=3600.0, help="Seconds a finished job stays queryable")
+    parser.add_argument("--max-finished-jobs", type=int, default=1000, help="Finished jobs kept for status queries")
+    parser.add_argument("--upload-dir", default="inputs/uploads", help="Where uploaded audio is stored")
+    parser.add_argument("--verbose", action="store_true", help="Log every HTTP request")
+    args = parser.parse_args()
+
+    print("Warming up analysis and DSP modules...")
+    print(f"Warm-up took {warm_up():.2f}s")
+
+    cache = None if args.no_cache else LLMCache(args.cache_dir)
+    analysis_cache = None if args.no_cache else AnalysisCache()
+    RenderRequestHandler.service = RenderService(args.workers, args.max_queue, cache, args.upload_dir, analysis_cache,
+                                                 job_ttl=args.job_ttl, max_finished=args.max_finished_jobs)
+
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, RenderRequestHandler)
+        where = f"unix:{args.socket}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), RenderRequestHandler)
+        where = f"http://{args.host}:{args.port}"
+    server.verbose = args.verbose
+
+    print(f"Render service listening on {where} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
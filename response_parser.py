@@ -0,0 +1,230 @@
+import json
+
+class JSONObjectExtractor:
+    """
+    Incrementally finds the first balanced JSON object in streamed text.
+
+    Text before the object (prose, a ```json fence) and after it is ignored.
+    The scan is a single pass over each chunk that only tracks nesting depth
+    and string/escape state, so feeding tokens as they arrive is cheap.
+
+    While scanning, the top-level "effect_chain" array is decoded as soon as
+    its closing bracket arrives, so callers can start rendering before the
+    rest of the object (typically the long "reason") has been received.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._reset(0)
+
+    def _reset(self, pos: int):
+        """Clears the scan state (not the text) and resumes scanning at pos."""
+        self.result = None
+        self.effect_chain = None
+        self._pos = pos
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._key = None
+        self._chain_start = None
+
+    @property
+    def done(self) -> bool:
+        return self.result is not None
+
+    @property
+    def start(self) -> int:
+        """Offset in text of the candidate object being scanned (or accepted), else None."""
+        return self._start
+
+    def feed(self, chunk: str) -> dict:
+        """
+        Adds text and scans it.
+
+        Returns:
+            dict: The decoded object once it has closed, else None.
+        """
+        self.text += chunk
+        # A rejected candidate restarts the scan; loop rather than recurse
+        while not self.done and self._scan():
+            pass
+        return self.result
+
+    def _scan(self) -> bool:
+        """Scans the unread text; returns True if a rejected candidate needs a rescan."""
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._last_string = (self._string_start, i + 1)
+                continue
+
+            if self._start is None:
+                if c == "{":
+                    self._start = i
+                    self._depth = 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c == ":" and self._depth == 1 and self._last_string is not None:
+                self._key = text[self._last_string[0] + 1:self._last_string[1] - 1]
+            elif c in "{[":
+                if c == "[" and self._depth == 1 and self._key == "effect_chain":
+                    self._chain_start = i
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if c == "]" and self._depth == 1 and self._chain_start is not None:
+                    self._close_chain(text[self._chain_start:i + 1])
+                elif self._depth == 0:
+                    self._pos = i + 1
+                    return not self._close_object(text, i)
+            elif c == "," and self._depth == 1:
+                self._key = None
+                self._last_string = None
+        self._pos = len(text)
+        return False
+
+    def _close_chain(self, chain_text: str):
+        self._chain_start = None
+        try:
+            self.effect_chain = json.loads(chain_text)
+        except json.JSONDecodeError:
+            self.effect_chain = None
+
+    def _close_object(self, text: str, end: int) -> bool:
+        """Decodes a balanced candidate; on failure resets to rescan after its opening brace."""
+        try:
+            candidate = json.loads(text[self._start:end + 1])
+        except json.JSONDecodeError:
+            candidate = None
+        if isinstance(candidate, dict):
+            self.result = candidate
+            return True
+        # Balanced but not valid JSON (e.g. '{placeholder}' in prose): rescan after its opening brace
+        self._reset(self._start + 1)
+        return False
+
+def _strip_fence(text: str) -> str:
+    cleaned = text.strip()
+    if cleaned.startswith("```"):
+        cleaned = cleaned[3:]
+        if cleaned.lower().startswith("json"):
+            cleaned = cleaned[4:]
+    if cleaned.endswith("```"):
+        cleaned = cleaned[:-3]
+    return cleaned.strip()
+
+def extract_json(response_text: str) -> dict:
+    """
+    Returns the first JSON object in an LLM response.
+
+    Well-formed responses (optionally fenced) are decoded directly; otherwise
+    the text is scanned for the first balanced object, so leading prose or
+    trailing commentary no longer fails the parse.
+
+    Raises:
+        json.JSONDecodeError: If the response contains no decodable object.
+    """
+    cleaned = _strip_fence(response_text)
+    try:
+        result = json.loads(cleaned)
+        if isinstance(result, dict):
+            return result
+    except json.JSONDecodeError:
+        pass
+
+    extractor = JSONObjectExtractor()
+    result = extractor.feed(response_text)
+    if result is None:
+        raise json.JSONDecodeError("No complete JSON object found in response", response_text,
+                                   extractor.start or 0)
+    return result
+
+def check_effect_chain(effect_chain) -> list:
+    """
+    Checks the shape of an effect_chain: a list of {"type": str, "params": dict}.
+
+    Returns:
+        list: The chain, unchanged.
+
+    Raises:
+        ValueError: If the chain does not have that shape.
+    """
+    if not isinstance(effect_chain, list):
+        raise ValueError(f"'effect_chain' must be a list, got {type(effect_chain).__name__}")
+    for i, effect in enumerate(effect_chain):
+        if not isinstance(effect, dict) or not isinstance(effect.get("type"), str):
+            raise ValueError(f"Effect {i} must be an object with a string 'type'")
+        if not isinstance(effect.get("params", {}), dict):
+            raise ValueError(f"Effect {i} ('{effect['type']}') has non-object 'params'")
+    return effect_chain
+
+def parse_stream(chunks, on_chain=None) -> tuple:
+    """
+    Consumes streamed response text and extracts the config as it arrives.
+
+    Args:
+        chunks: Iterable of text deltas.
+        on_chain: Optional callback receiving the checked effect_chain list as
+            soon as it is complete, before the rest of the response arrives.
+            It is called at most once, for the first candidate object with a
+            chain; that candidate can still be rejected later (e.g. prose like
+            '{"effect_chain": [...] ...}' that never becomes valid JSON).
+
+    Returns:
+        tuple: (effects_config, full_response_text, early_chain_final), where
+            early_chain_final is None if on_chain was not called, else whether
+            it received exactly effects_config["effect_chain"]. When it is
+            False, anything started from the early chain must be redone.
+
+    Raises:
+        json.JSONDecodeError: If the stream contains no decodable object.
+    """
+    extractor = JSONObjectExtractor()
+    checked = False
+    early_chain = None
+    for chunk in chunks:
+        extractor.feed(chunk)
+        if on_chain is not None and not checked and extractor.effect_chain is not None:
+            checked = True
+            try:
+                early_chain = check_effect_chain(extractor.effect_chain)
+            except ValueError:
+                pass
+            else:
+                on_chain(early_chain)
+        # Keep draining so the full text (and usage) is still collected
+
+    effects_config = extractor.result
+    if effects_config is None:
+        effects_config = extract_json(extractor.text)
+    early_chain_final = None if early_chain is None else effects_config.get("effect_chain") == early_chain
+    return effects_config, extractor.text, early_chain_final
+
+REPAIR_INSTRUCTION = (
+    "The output above could not be parsed as JSON. Reply again with ONLY the JSON object "
+    "(an \"effect_chain\" list and a \"reason\"), with no markdown, prose or expressions."
+)
+
+def repair_prompt(prompt, response_text: str):
+    """
+    Builds a follow-up prompt showing the unparseable answer and asking for bare JSON.
+
+    A message list gets the answer and the instruction appended as new turns.
+    """
+    if isinstance(prompt, list):
+        return prompt + [{"role": "assistant", "content": response_text},
+                         {"role": "user", "content": REPAIR_INSTRUCTION}]
+    return f"{prompt} {response_text.strip()}\n\n{REPAIR_INSTRUCTION}\nOutput:"
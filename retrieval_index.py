@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import numpy as np
+from disk_cache import DEFAULT_CACHE_DIR
+from prompt_manager import STOPWORDS
+from reference_cases import replay_cases
+
+DEFAULT_INDEX_PATH = os.path.join(DEFAULT_CACHE_DIR, "retrieval_index.jsonl")
+
+# Cosine similarity above which a stored chain is returned without an LLM call
+DEFAULT_THRESHOLD = 0.5
+
+# Hashed feature space of the char n-gram vectors (no vocabulary to refit)
+N_FEATURES = 2 ** 18
+
+def normalize_text(text: str) -> str:
+    """Lowercases a description and drops filler words ("make it sound like a ...")."""
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    kept = [w for w in words if w not in STOPWORDS]
+    return " ".join(kept or words)
+
+class RetrievalIndex:
+    """
+    Local (description -> effects_config) index with char n-gram TF-IDF similarity.
+
+    Descriptions are hashed into char 3-5-gram counts, so adding an entry
+    never refits a vocabulary: it updates the document frequencies and
+    marks the weighted matrix stale, which is rebuilt from the stored counts
+    on the next query. The index is seeded with the few-shot examples and
+    the TEST_CASES chains; accepted results are appended to a JSONL file
+    and replayed on load.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, seed: bool = True, threshold: float = DEFAULT_THRESHOLD):
+        """
+        Args:
+            path: JSONL file of accepted entries (None keeps the index in memory).
+            seed: Start from the few-shot examples and TEST_CASES.
+            threshold: Default similarity needed for lookup() to return a chain.
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.path = path
+        self.threshold = threshold
+        self.entries = []
+        self._vectorizer = HashingVectorizer(analyzer="char_wb", ngram_range=(3, 5), n_features=N_FEATURES,
+                                             alternate_sign=False, norm=None)
+        self._by_key = {}
+        self._rows = []
+        self._df = np.zeros(N_FEATURES)
+        self._matrix = None
+        self._idf = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Running aggregates, so a long-lived process does not keep every latency
+        self._lookup_total = 0.0
+        self._lookup_max = 0.0
+
+        if seed:
+            for text, effects_config in replay_cases():
+                self._add(text, effects_config, "seed")
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from an interrupted write
+                        continue
+                    self._add(entry["text"], entry["effects_config"], entry.get("source", "accepted"))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _add(self, text: str, effects_config: dict, source: str) -> bool:
+        key = normalize_text(text)
+        if not key:
+            return False
+        entry = {"text": text, "effects_config": effects_config, "source": source}
+        i = self._by_key.get(key)
+        if i is not None:
+            # Same description: the newest chain wins, the vector is unchanged
+            self.entries[i] = entry
+            return True
+        row = self._vectorizer.transform([key]).tocsr()
+        self._df[row.indices] += 1
+        self._by_key[key] = len(self.entries)
+        self.entries.append(entry)
+        self._rows.append(row)
+        self._matrix = None
+        return True
+
+    def add(self, text: str, effects_config: dict, source: str = "accepted") -> bool:
+        """
+        Adds (or replaces) an entry and appends it to the index file.
+
+        Returns:
+            bool: False if the description has no indexable words.
+        """
+        with self._lock:
+            if not self._add(text, effects_config, source):
+                return False
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # One short append per entry, so concurrent processes do not clobber each other
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"text": text, "effects_config": effects_config, "source": source}) + "\n")
+        return True
+
+    def _weighted(self):
+        """The L2-normalised TF-IDF matrix of all entries and the IDF vector (rebuilt when stale)."""
+        if self._matrix is None:
+            from scipy.sparse import diags, vstack
+            from sklearn.preprocessing import normalize
+
+            # Smoothed IDF, as in sklearn's TfidfTransformer
+            self._idf = diags(np.log((1 + len(self._rows)) / (1 + self._df)) + 1.0)
+            self._matrix = normalize(vstack(self._rows).tocsr() @ self._idf)
+        return self._matrix, self._idf
+
+    def search(self, text: str, k: int = 1) -> list:
+        """
+        Returns the k most similar entries as (score, entry) pairs, best first.
+        """
+        from sklearn.preprocessing import normalize
+
+        key = normalize_text(text)
+        with self._lock:
+            if not key or not self._rows:
+                return []
+            matrix, idf = self._weighted()
+        query = normalize(self._vectorizer.transform([key]) @ idf)
+        scores = (matrix @ query.T).toarray().ravel()
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [(float(scores[i]), self.entries[i]) for i in best]
+
+    def lookup(self, text: str, threshold: float = None) -> tuple:
+        """
+        Returns the stored chain for a description if a close enough entry exists.
+
+        Returns:
+            tuple: (effects_config, score, matched_text), or None below the threshold.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        start = time.perf_counter()
+        results = self.search(text)
+        elapsed = time.perf_counter() - start
+        hit = bool(results) and results[0][0] >= threshold
+        with self._lock:
+            self._lookup_total += elapsed
+            self._lookup_max = max(self._lookup_max, elapsed)
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not hit:
+            return None
+        score, entry = results[0]
+        # A copy, so callers can edit the config without touching the index
+        return json.loads(json.dumps(entry["effects_config"])), round(score, 4), entry["text"]
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and lookup latency for this process plus the index size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self.entries),
+                "mean_lookup_ms": round(self._lookup_total / max(lookups, 1) * 1000, 3),
+                "max_lookup_ms": round(self._lookup_max * 1000, 3),
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description="Text-to-Audio FX retrieval index: query it, add accepted chains, inspect it.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="JSONL file of accepted entries")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("query", help="Show the closest stored descriptions")
+    p.add_argument("text", help="Effect description")
+    p.add_argument("-k", type=int, default=3, help="Number of matches to show")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Similarity needed for a hit")
+
+    p = sub.add_parser("add", help="Store an accepted chain for a description")
+    p.add_argument("text", help="Effect description")
+    p.add_argument("chain_file", help="Effects config JSON")
+
+    sub.add_parser("list", help="List every entry")
+
+    args = parser.parse_args()
+    index = RetrievalIndex(args.index)
+
+    if args.command == "query":
+        for score, entry in index.search(args.text, args.k):
+            mark = "hit " if score >= args.threshold else "    "
+            types = ", ".join(str(e.get("type")) for e in entry["effects_config"].get("effect_chain", []))
+            print(f"{mark}{score:.3f}  [{entry['source']}] {entry['text']}  ->  {types}")
+
+    elif args.command == "add":
+        with open(args.chain_file) as f:
+            effects_config = json.load(f)
+        if index.add(args.text, effects_config):
+            print(f"Stored chain for '{args.text}' ({len(index)} entries)")
+        else:
+            print("Error: The description has no indexable words.")
+
+    elif args.command == "list":
+        for entry in index.entries:
+            print(f"[{entry['source']}] {entry['text']}")
+        print(f"{len(index)} entries")
+
+if __name__ == "__main__":
+    main()
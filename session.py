@@ -0,0 +1,329 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+from llm_cache import LLMCache, DEFAULT_LLM_CACHE_DIR
+
+# Subtypes from widest to narrowest; the mixdown uses the widest of its stems
+_SUBTYPE_ORDER = ("DOUBLE", "FLOAT", "PCM_32", "PCM_24", "PCM_16", "PCM_U8", "PCM_S8")
+
+def load_manifest(path: str) -> dict:
+    """
+    Reads a session manifest and resolves its paths against the manifest's directory.
+
+    Manifest format (JSON):
+        {
+          "output": "mix.wav",
+          "sample_rate": 48000,              (optional, default: highest stem rate)
+          "stems_dir": "stems/",             (optional, also write each processed stem)
+          "stems": [
+            {"name": "dialogue", "file": "dx.wav", "text": "..."},
+            {"name": "music", "file": "music.wav", "chain_file": "music_chain.json", "gain_db": -3},
+            {"name": "fx", "file": "fx.wav", "chain": {"effect_chain": [...]}}
+          ],
+          "master": {"text": "..."}          (optional, or "chain"/"chain_file")
+        }
+
+    A stem without text or chain is mixed dry.
+
+    Raises:
+        ValueError: If the manifest is malformed.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    def resolve(p):
+        return p if p is None or os.path.isabs(p) else os.path.join(base_dir, p)
+
+    with open(path) as f:
+        manifest = json.load(f)
+    if not manifest.get("stems"):
+        raise ValueError("Manifest has no 'stems'")
+
+    names = set()
+    for i, stem in enumerate(manifest["stems"]):
+        if "file" not in stem:
+            raise ValueError(f"Stem {i} has no 'file'")
+        stem["file"] = resolve(stem["file"])
+        stem.setdefault("name", os.path.splitext(os.path.basename(stem["file"]))[0])
+        if stem["name"] in names:
+            raise ValueError(f"Duplicate stem name '{stem['name']}'")
+        names.add(stem["name"])
+        stem["gain_db"] = float(stem.get("gain_db", 0.0))
+    for part in manifest["stems"] + [manifest.get("master") or {}]:
+        if "text" in part and ("chain" in part or "chain_file" in part):
+            raise ValueError(f"'{part.get('name', 'master')}' has both 'text' and a chain")
+        if part.get("chain_file"):
+            with open(resolve(part["chain_file"])) as f:
+                part["chain"] = json.load(f)
+
+    manifest["output"] = resolve(manifest.get("output"))
+    manifest["stems_dir"] = resolve(manifest.get("stems_dir"))
+    return manifest
+
+def needs_llm(manifest: dict) -> bool:
+    """True if any stem (or the master bus) is described by text."""
+    return any("text" in part for part in manifest["stems"] + [manifest.get("master") or {}])
+
+def mix_subtype(subtypes: list) -> str:
+    """Picks the widest subtype among the stems."""
+    known = [s for s in subtypes if s in _SUBTYPE_ORDER]
+    return min(known, key=_SUBTYPE_ORDER.index) if known else None
+
+def align(audio, sample_rate: int, target_rate: int, channels: int):
+    """
+    Brings (channels, frames) audio to the session's rate and channel count.
+
+    Mono is duplicated to every channel; other channel mismatches are errors.
+    Resampling uses soxr (which releases the GIL, like pedalboard).
+    """
+    import numpy as np
+
+    if sample_rate != target_rate:
+        import soxr
+        audio = soxr.resample(audio.T, sample_rate, target_rate).T
+    if audio.shape[0] != channels:
+        if audio.shape[0] != 1:
+            raise ValueError(f"Cannot mix {audio.shape[0]} channels into a {channels}-channel session")
+        audio = np.repeat(audio, channels, axis=0)
+    return audio
+
+def _prepare_stem(stem: dict, analyze: bool, analysis_cache=None) -> tuple:
+    from audio_buffer import AudioBuffer
+    from audio_analyzer import analyze_buffer
+
+    timings = {}
+    start = time.perf_counter()
+    buffer = AudioBuffer.from_file(stem["file"])
+    timings["decode"] = round(time.perf_counter() - start, 4)
+
+    features = None
+    if analyze:
+        start = time.perf_counter()
+        features = analyze_buffer(buffer, cache=analysis_cache)
+        timings["analysis"] = round(time.perf_counter() - start, 4)
+        if "error" in features:
+            features = None
+    return buffer, features, timings
+
+def _render_stem(stem: dict, buffer, effects_config: dict, sample_rate: int, channels: int, stems_dir: str = None,
+                 subtype: str = None) -> tuple:
+    import numpy as np
+    import soundfile as sf
+    from audio_processor import compile_chain, output_subtype
+
+    timings = {}
+    chain = compile_chain(effects_config)
+    start = time.perf_counter()
+    processed = chain.process(buffer.channels_first(), buffer.sample_rate)
+    timings["render"] = round(time.perf_counter() - start, 4)
+
+    start = time.perf_counter()
+    processed = align(processed, buffer.sample_rate, sample_rate, channels)
+    if stem["gain_db"]:
+        processed *= np.float32(10.0 ** (stem["gain_db"] / 20.0))
+    timings["align"] = round(time.perf_counter() - start, 4)
+
+    if stems_dir:
+        path = os.path.join(stems_dir, f"{stem['name']}.wav")
+        sf.write(path, processed.T, sample_rate, subtype=output_subtype(subtype, path))
+    return processed, list(chain.warnings), timings
+
+def render_session(manifest: dict, output_path: str = None, workers: int = None, cache=None, refresh: bool = False,
+                   analysis_cache=None, analyze: bool = True, verbose: bool = False) -> dict:
+    """
+    Renders every stem with its own chain, sums them and writes one mixdown.
+
+    Stems are decoded, analysed and rendered concurrently on a thread pool
+    (pedalboard, libsndfile and soxr release the GIL), so wall time scales
+    with cores rather than with the number of stems. Every text-described
+    stem (and the master bus) is sent to the LLM concurrently in one round.
+    Rendered stems are resampled to the session rate, mono stems are spread
+    to every channel, and shorter stems are zero-padded to the longest.
+    Each stem is added to the mix as soon as it finishes and then dropped.
+
+    Args:
+        manifest: A manifest from load_manifest().
+        output_path: Where to write the mixdown (default: manifest['output']).
+        workers: Number of threads (default: CPU count).
+        cache: Optional LLMCache consulted before every LLM call.
+        refresh: Ignore cached answers but store the fresh ones.
+        analysis_cache: Optional AnalysisCache for the stem analyses.
+        analyze: Put each stem's analysis features into its prompt.
+        verbose: Print per-stem progress.
+
+    Returns:
+        dict: Session summary with per-stem chains, timings and warnings.
+    """
+    import numpy as np
+    import soundfile as sf
+    from audio_processor import compile_chain, output_subtype
+    from chain_generator import configs_for_prompts
+    from prompt_manager import build_messages
+
+    output_path = output_path or manifest["output"]
+    if not output_path:
+        raise ValueError("No output path (set 'output' in the manifest or pass one)")
+    stems = manifest["stems"]
+    master = manifest.get("master") or {}
+    wall_start = time.perf_counter()
+    summary = {"stems": [{"name": s["name"], "file": s["file"], "gain_db": s["gain_db"], "timings": {}} for s in stems]}
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # 1. Decode (and analyze) every stem concurrently
+        print(f"Decoding {len(stems)} stems...")
+        futures = [pool.submit(_prepare_stem, stem, analyze and "text" in stem, analysis_cache) for stem in stems]
+        buffers, features = [], []
+        for entry, future in zip(summary["stems"], futures):
+            buffer, stem_features, timings = future.result()
+            buffers.append(buffer)
+            features.append(stem_features)
+            entry["timings"].update(timings)
+            entry.update({"sample_rate": buffer.sample_rate, "channels": buffer.channels, "subtype": buffer.subtype,
+                          "seconds": round(buffer.duration, 3)})
+
+        sample_rate = int(manifest.get("sample_rate") or max(b.sample_rate for b in buffers))
+        channels = max(b.channels for b in buffers)
+
+        # 2. One concurrent LLM round for every text-described stem and the master bus
+        configs = [stem.get("chain", {"effect_chain": []}) for stem in stems]
+        master_config = master.get("chain")
+        prompts, targets = [], []
+        for i, stem in enumerate(stems):
+            if "text" in stem:
+                prompts.append(build_messages(stem["text"], features[i]))
+                targets.append(i)
+        if "text" in master:
+            prompts.append(build_messages(master["text"]))
+            targets.append("master")
+        if prompts:
+            print(f"Generating {len(prompts)} chains...")
+            start = time.perf_counter()
+            for target, outcome in zip(targets, configs_for_prompts(prompts, cache=cache, refresh=refresh)):
+                if isinstance(outcome, Exception):
+                    name = "master bus" if target == "master" else f"stem '{stems[target]['name']}'"
+                    raise RuntimeError(f"Chain generation failed for {name}: {outcome}")
+                if target == "master":
+                    master_config = outcome[0]
+                else:
+                    configs[target] = outcome[0]
+            summary["llm_seconds"] = round(time.perf_counter() - start, 4)
+
+        # 3. Render the stems concurrently and sum them as they finish
+        print(f"Rendering {len(stems)} stems on {workers} threads...")
+        if manifest.get("stems_dir"):
+            os.makedirs(manifest["stems_dir"], exist_ok=True)
+        frames = max(int(round(b.frames * sample_rate / b.sample_rate)) for b in buffers)
+        mix = np.zeros((channels, frames), dtype=np.float32)
+        render_start = time.perf_counter()
+        futures = {
+            pool.submit(_render_stem, stem, buffers[i], configs[i], sample_rate, channels, manifest.get("stems_dir"),
+                        buffers[i].subtype): i
+            for i, stem in enumerate(stems)
+        }
+        buffers = None
+        for future in as_completed(futures):
+            i = futures[future]
+            processed, warnings, timings = future.result()
+            n = min(processed.shape[1], frames)
+            mix[:, :n] += processed[:, :n]
+            entry = summary["stems"][i]
+            entry["timings"].update(timings)
+            entry.update({"effects_config": configs[i], "warnings": warnings,
+                          "peak": round(float(np.max(np.abs(processed))) if processed.size else 0.0, 4)})
+            if verbose:
+                print(f"  [done] {entry['name']} ({timings['render']}s render)")
+        render_wall = time.perf_counter() - render_start
+
+    # 4. Master bus and mixdown
+    if master_config:
+        start = time.perf_counter()
+        chain = compile_chain(master_config)
+        mix = chain.process(mix, sample_rate)
+        summary["master"] = {"effects_config": master_config, "warnings": list(chain.warnings),
+                             "render_seconds": round(time.perf_counter() - start, 4)}
+
+    peak = float(np.max(np.abs(mix))) if mix.size else 0.0
+    if peak > 1.0:
+        print(f"Warning: Mixdown peaks at {20 * np.log10(peak):+.1f} dBFS and will clip in integer formats")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    subtype = mix_subtype([entry["subtype"] for entry in summary["stems"]])
+    sf.write(output_path, mix.T, sample_rate, subtype=output_subtype(subtype, output_path))
+
+    stem_render = sum(entry["timings"]["render"] + entry["timings"]["align"] for entry in summary["stems"])
+    summary.update({
+        "output": output_path,
+        "mix": {"sample_rate": sample_rate, "channels": channels, "seconds": round(frames / sample_rate, 3),
+                "peak": round(peak, 4)},
+        "workers": workers,
+        "render_wall_seconds": round(render_wall, 4),
+        # Summed stem render time over render wall time: ~1 when serial, up to the thread count
+        "render_parallelism": round(stem_render / render_wall, 2) if render_wall else None,
+        "wall_seconds": round(time.perf_counter() - wall_start, 4),
+    })
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Text-to-Audio FX session mode: render a multi-stem manifest to one mixdown.")
+    parser.add_argument("manifest", help="Session manifest (JSON) listing the stems, their text or chains, and the master bus")
+    parser.add_argument("--output", help="Path of the mixdown (default: the manifest's 'output')")
+    parser.add_argument("--stems-dir", help="Also write each processed, aligned stem to this directory")
+    parser.add_argument("--workers", type=int, default=None, help="Number of render threads (default: CPU count)")
+    parser.add_argument("--summary", help="Write the session summary (chains, timings) to this JSON file")
+    parser.add_argument("--skip-analysis", action="store_true", help="Prompt from each stem's text alone")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the on-disk LLM response and analysis caches")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached LLM responses but store fresh ones")
+    parser.add_argument("--cache-dir", default=DEFAULT_LLM_CACHE_DIR, help="Directory of the LLM response cache")
+    parser.add_argument("--verbose", action="store_true", help="Print debug info")
+    args = parser.parse_args()
+
+    try:
+        manifest = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Error reading manifest: {e}")
+        sys.exit(1)
+    if args.stems_dir:
+        manifest["stems_dir"] = args.stems_dir
+    missing = [stem["file"] for stem in manifest["stems"] if not os.path.exists(stem["file"])]
+    if missing:
+        print(f"Error: Stem file(s) not found: {', '.join(missing)}")
+        sys.exit(1)
+
+    # Check for API key
+    if needs_llm(manifest) and not os.environ.get("GROQ_API_KEY") and os.environ.get("FX_LLM_BACKEND") != "mock":
+        print("Error: GROQ_API_KEY environment variable is not set.")
+        print("Please export GROQ_API_KEY='your_api_key'")
+        sys.exit(1)
+
+    from analysis_cache import AnalysisCache
+    cache = None if args.no_cache else LLMCache(args.cache_dir)
+    analysis_cache = None if args.no_cache else AnalysisCache()
+    try:
+        summary = render_session(manifest, args.output, workers=args.workers, cache=cache, refresh=args.refresh,
+                                 analysis_cache=analysis_cache, analyze=not args.skip_analysis, verbose=args.verbose)
+    except Exception as e:
+        print(f"Error rendering session: {e}")
+        sys.exit(1)
+
+    for entry in summary["stems"]:
+        print(f"  {entry['name']:<20} {len(entry['effects_config'].get('effect_chain', []))} effects | "
+              f"render {entry['timings']['render']}s | peak {entry['peak']}")
+        for warning in entry["warnings"]:
+            print(f"    Warning: {warning}")
+    print(f"Mixdown ({summary['mix']['channels']}ch, {summary['mix']['sample_rate']} Hz, {summary['mix']['seconds']}s) "
+          f"saved to '{summary['output']}' in {summary['wall_seconds']:.1f}s "
+          f"(render parallelism {summary['render_parallelism']}x)")
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary written to '{args.summary}'")
+
+if __name__ == "__main__":
+    main()
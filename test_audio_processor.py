@@ -0,0 +1,46 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+sf = pytest.importorskip("soundfile")
+pytest.importorskip("pedalboard")
+
+from audio_processor import compile_chain
+
+SR = 44100
+
+TAIL_CHAIN = {"effect_chain": [
+    {"type": "reverb", "params": {"room_size": 0.8, "wet_level": 0.5}},
+    {"type": "delay", "params": {"delay_seconds": 0.25, "feedback": 0.5, "mix": 0.5}},
+]}
+
+def write_noise(path, seconds: float = 3.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    audio = (rng.standard_normal((int(seconds * SR), 2)) * 0.2).astype(np.float32)
+    sf.write(path, audio, SR, subtype="FLOAT")
+    return path
+
+def render(chain, input_path, output_path, streaming: bool, block_size: int = 4096):
+    if streaming:
+        chain.render_file_streaming(input_path, output_path, block_size=block_size)
+    else:
+        chain.render_file(input_path, output_path)
+    return sf.read(output_path, dtype="float32")[0]
+
+def test_streaming_matches_one_shot_with_tails(tmp_path):
+    """Reverb/delay tails carried across blocks, the final block included."""
+    input_path = write_noise(str(tmp_path / "in.wav"))
+    one_shot = render(compile_chain(TAIL_CHAIN, optimize=False), input_path, str(tmp_path / "a.wav"), False)
+    streamed = render(compile_chain(TAIL_CHAIN, optimize=False), input_path, str(tmp_path / "b.wav"), True)
+    assert streamed.shape == one_shot.shape
+    assert np.max(np.abs(streamed - one_shot)) < 1e-4
+
+def test_streaming_after_one_shot_starts_clean(tmp_path):
+    """A memoized chain must not carry one render's tail into the next streamed one."""
+    input_path = write_noise(str(tmp_path / "in.wav"))
+    silent_path = str(tmp_path / "silence.wav")
+    sf.write(silent_path, np.zeros((SR, 2), dtype=np.float32), SR, subtype="FLOAT")
+
+    chain = compile_chain(TAIL_CHAIN, optimize=False)
+    render(chain, input_path, str(tmp_path / "a.wav"), False)
+    streamed = render(chain, silent_path, str(tmp_path / "b.wav"), True)
+    assert np.max(np.abs(streamed)) == 0.0
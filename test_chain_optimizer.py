@@ -0,0 +1,48 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+pedalboard = pytest.importorskip("pedalboard")
+
+from audio_processor import CompiledChain, validate_chain
+from chain_optimizer import SOSCascade
+
+SR = 44100
+
+EQ_STAGES = [
+    ("high_shelf", pedalboard.HighShelfFilter),
+    ("low_shelf", pedalboard.LowShelfFilter),
+    ("peak", pedalboard.PeakFilter),
+]
+
+def noise(seconds: float = 1.0, channels: int = 2, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((channels, int(seconds * SR))) * 0.3).astype(np.float32)
+
+@pytest.mark.parametrize("effect_type,plugin_class", EQ_STAGES)
+@pytest.mark.parametrize("gain_db", [-12.0, 6.0])
+def test_biquad_matches_pedalboard(effect_type, plugin_class, gain_db):
+    params = {"cutoff_frequency_hz": 1500.0, "gain_db": gain_db, "q": 0.9}
+    audio = noise()
+    expected = plugin_class(**params)(audio, SR)
+    fused = SOSCascade(((effect_type, tuple(sorted(params.items()))),))(audio, SR)
+    assert np.max(np.abs(fused - expected)) < 1e-4
+
+def test_optimized_chain_matches_plain_one_shot_and_streamed():
+    config = {"effect_chain": [
+        {"type": "high_shelf", "params": {"cutoff_frequency_hz": 4000, "gain_db": -24.0}},
+        {"type": "low_shelf", "params": {"cutoff_frequency_hz": 400, "gain_db": -24.0}},
+        {"type": "peak", "params": {"cutoff_frequency_hz": 1000, "gain_db": 3.0, "q": 2.0}},
+        {"type": "reverb", "params": {"room_size": 0.7}},
+    ]}
+    stages, _ = validate_chain(config)
+    plain, optimized = CompiledChain(stages, optimize=False), CompiledChain(stages)
+    audio = noise(2.0)
+    reference = plain.process(audio, SR)
+    assert np.max(np.abs(optimized.process(audio, SR) - reference)) < 1e-4
+
+    optimized.reset()
+    block = 10000
+    streamed = np.concatenate([optimized.process(audio[:, i:i + block], SR, reset=False)
+                               for i in range(0, audio.shape[1], block)], axis=1)
+    assert np.max(np.abs(streamed - reference)) < 1e-4
@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+import pytest
+
+from disk_cache import DiskCache
+from llm_cache import LLMCache
+
+def age(cache, key: str, seconds: float) -> None:
+    """Backdates an entry's last-used time."""
+    then = time.time() - seconds
+    os.utime(cache._path(key), (then, then))
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    assert cache.get("aa01") is None
+    cache.put("aa01", {"x": 1})
+    assert cache.get("aa01") == {"x": 1}
+    assert cache.get("aa01") == {"x": 1}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (2, 1, 0.6667)
+    assert stats["entries"] == 1
+    assert stats["bytes"] == os.path.getsize(cache._path("aa01"))
+
+def test_max_entries_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_entries=2)
+    cache.put("aa01", 1)
+    cache.put("aa02", 2)
+    age(cache, "aa01", 20)
+    age(cache, "aa02", 10)
+    # A hit refreshes the mtime, so aa01 becomes the most recently used
+    assert cache.get("aa01") == 1
+    cache.put("aa03", 3)
+    assert cache.get("aa02") is None
+    assert cache.get("aa01") == 1 and cache.get("aa03") == 3
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 2
+
+def test_idle_entries_expire(tmp_path):
+    cache = DiskCache(str(tmp_path), max_age_seconds=60)
+    cache.put("aa01", 1)
+    cache.put("aa02", 2)
+    age(cache, "aa01", 120)
+    assert cache.get("aa01") is None
+    assert not os.path.exists(cache._path("aa01"))
+
+    age(cache, "aa02", 120)
+    cache.put("aa03", 3)
+    assert not os.path.exists(cache._path("aa02"))
+    assert cache.stats()["evictions"] == 2
+    assert cache.stats()["entries"] == 1
+
+def test_put_writes_through_a_temp_file(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path))
+    cache.put("aa01", "old")
+    seen = []
+
+    def failing_replace(src, dst):
+        seen.append((src, dst))
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        cache.put("aa01", "new")
+    monkeypatch.undo()
+
+    src, dst = seen[0]
+    assert dst == cache._path("aa01") and src.endswith(".tmp")
+    # The entry is never half-written: the old value survives a failed rename
+    assert cache.get("aa01") == "old"
+    with open(src) as f:
+        assert json.load(f)["value"] == "new"
+
+def test_stats_track_other_instances_after_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path), max_entries=100)
+    other = DiskCache(str(tmp_path))
+    other.put("aa01", 1)
+    cache.put("aa02", 2)
+    assert cache.stats()["entries"] == 2
+
+def test_llm_cache_round_trip(tmp_path):
+    cache = LLMCache(str(tmp_path))
+    messages = [{"role": "user", "content": "warm reverb"}]
+    assert cache.lookup(messages, "model", 0.5) is None
+    cache.store(messages, "model", 0.5, "raw", {"effect_chain": []})
+    assert cache.lookup(messages, "model", 0.5) == ({"effect_chain": []}, "raw")
+    assert cache.lookup(messages, "model", 0.7) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
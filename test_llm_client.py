@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+from llm_client import GroqClient, LLMRequestError
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Chat-completions stub: each path has a script of (status, headers) replies.
+
+    A 200 reply echoes the last user message back as the response content,
+    and a prompt starting with "fail" is always answered with a 400.
+    """
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = payload["messages"][-1]["content"]
+        with self.server.lock:
+            self.server.requests[self.path] = self.server.requests.get(self.path, 0) + 1
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+            script = self.server.scripts.get(self.path, [])
+            status, headers = script.pop(0) if script else (200, {})
+        if prompt.startswith("fail"):
+            status, headers = 400, {}
+        time.sleep(self.server.delay)
+
+        body = json.dumps({"choices": [{"message": {"content": prompt}}]} if status == 200
+                          else {"error": {"message": f"status {status}"}}).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.scripts = {}
+    server.requests = {}
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.delay = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_client(server, path: str, **kwargs) -> GroqClient:
+    # backoff_base=0 makes every jittered backoff zero, so only Retry-After waits
+    kwargs.setdefault("backoff_base", 0.0)
+    return GroqClient(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}{path}", timeout=5.0, **kwargs)
+
+def test_retry_after_is_honoured(stub):
+    stub.scripts["/retry-after"] = [(429, {"Retry-After": "0.3"})]
+    client = make_client(stub, "/retry-after")
+    start = time.perf_counter()
+    assert client.query("hello") == "hello"
+    assert time.perf_counter() - start >= 0.3
+    assert stub.requests["/retry-after"] == 2
+
+def test_server_error_is_retried_then_succeeds(stub):
+    stub.scripts["/flaky"] = [(503, {}), (500, {})]
+    client = make_client(stub, "/flaky")
+    assert client.query("hello") == "hello"
+    assert stub.requests["/flaky"] == 3
+
+def test_server_error_gives_up_after_max_retries(stub):
+    stub.scripts["/down"] = [(503, {})] * 5
+    client = make_client(stub, "/down", max_retries=2)
+    with pytest.raises(LLMRequestError) as excinfo:
+        client.query("hello")
+    assert excinfo.value.status_code == 503
+    assert stub.requests["/down"] == 3
+
+def test_client_error_is_not_retried(stub):
+    stub.scripts["/bad"] = [(401, {})]
+    client = make_client(stub, "/bad")
+    with pytest.raises(LLMRequestError) as excinfo:
+        client.query("hello")
+    assert excinfo.value.status_code == 401
+    assert stub.requests["/bad"] == 1
+
+def test_query_many_keeps_order_and_returns_exceptions(stub):
+    stub.delay = 0.05
+    client = make_client(stub, "/many", max_concurrency=2)
+    prompts = ["one", "two", "fail three", "four", "five"]
+    results = client.query_many(prompts, return_exceptions=True)
+    assert results[:2] == ["one", "two"]
+    assert isinstance(results[2], LLMRequestError) and results[2].status_code == 400
+    assert results[3:] == ["four", "five"]
+    assert stub.max_in_flight <= 2
+
+    with pytest.raises(LLMRequestError):
+        client.query_many(prompts)
+    client.close()
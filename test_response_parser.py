@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from response_parser import JSONObjectExtractor, extract_json, parse_stream
+
+CONFIG = {"effect_chain": [{"type": "reverb", "params": {"room_size": 0.5}}], "reason": "Adds space."}
+BODY = json.dumps(CONFIG)
+
+def chunked(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def test_prose_around_the_object():
+    assert extract_json(f"Here is the chain:\n{BODY}\nHope that helps!") == CONFIG
+
+def test_json_fence():
+    assert extract_json(f"```json\n{BODY}\n```") == CONFIG
+    assert extract_json(f"Sure:\n```json\n{BODY}\n```\nEnjoy.") == CONFIG
+
+def test_braces_in_prose_before_the_object():
+    text = f"Fill in {{placeholder}} and {{a: {{b}}}} values. {BODY}"
+    assert extract_json(text) == CONFIG
+
+def test_many_rejected_candidates_do_not_recurse():
+    assert extract_json("{a} " * 3000 + BODY) == CONFIG
+
+def test_strings_with_braces_and_escaped_quotes():
+    config = {"effect_chain": [], "reason": 'A "warm} {tone" with \\ and }]'}
+    assert extract_json(f"Result: {json.dumps(config)} done") == config
+
+def test_no_object_raises():
+    with pytest.raises(json.JSONDecodeError):
+        extract_json("no json here {at all")
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_chunk_boundaries_split_tokens(size):
+    text = 'Prefix {x} then ' + json.dumps({"effect_chain": [], "reason": 'quote \\" and {brace}'})
+    extractor = JSONObjectExtractor()
+    for chunk in chunked(text, size):
+        extractor.feed(chunk)
+    assert extractor.result == json.loads(text[text.index('{"'):])
+    assert extractor.start == text.index('{"')
+
+def test_on_chain_fires_once_before_the_reason():
+    text = f"Okay. {BODY} trailing {{\"effect_chain\": []}}"
+    received = []
+    fed = []
+
+    def chunks():
+        for chunk in chunked(text, 5):
+            fed.append(chunk)
+            yield chunk
+
+    def on_chain(chain):
+        received.append((chain, "".join(fed)))
+
+    effects_config, response_text, early_chain_final = parse_stream(chunks(), on_chain=on_chain)
+    assert effects_config == CONFIG and response_text == text
+    assert early_chain_final is True
+    assert len(received) == 1
+    chain, seen = received[0]
+    assert chain == CONFIG["effect_chain"]
+    # Delivered while the "reason" was still streaming
+    assert '"reason"' not in seen
+
+def test_on_chain_from_a_rejected_candidate_is_flagged():
+    text = f'Draft: {{"effect_chain": [] (not final)}} Final: {BODY}'
+    received = []
+    effects_config, _, early_chain_final = parse_stream(chunked(text, 4), on_chain=received.append)
+    assert received == [[]]
+    assert effects_config == CONFIG
+    assert early_chain_final is False
+
+def test_on_chain_not_called():
+    effects_config, _, early_chain_final = parse_stream(chunked(BODY, 8))
+    assert effects_config == CONFIG and early_chain_final is None